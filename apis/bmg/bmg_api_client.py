@@ -1,9 +1,24 @@
 import re
-import http.client
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Tuple
+from xml.etree.ElementTree import ParseError
+import aiohttp
 from fastapi import HTTPException
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
 
-from services.inapi.redis_cache import add_in100_to_cache
-from services.bmg.repository.mongo_db import BMGMongoRepository
+from services.inapi.redis_cache import add_in100_to_cache_async
+from services.bmg.repository.mongo_db import (
+    BMGMongoRepository,
+    IN100_KEY_FIELDS,
+    bmg_in100_key,
+)
 from apis.bmg.payloads.in100.request_in100 import (
     generate_request_in100_payload,
     In100Request,
@@ -24,9 +39,18 @@ from apis.bmg.payloads.benefit_card.save_proposal import (
     build_save_benefit_card_proposal_payload,
     SaveProposalRequest,
 )
-from apis.helpers.xml_to_dict import xml_to_dict
+from apis.helpers.xml_to_dict import xml_stream_to_dict
+from apis.http_clients import get_http_session
 from utils.api_credentials import get_credential
 
+logger = logging.getLogger(__name__)
+
+IN100_ENDPOINT = "ConsultaMargemIN100?wsdl=null"
+BENEFIT_CARD_ENDPOINT = "CartaoBeneficio?wsdl=null"
+
+BMG_RETRY_ATTEMPTS = int(os.getenv("BMG_RETRY_ATTEMPTS", "3"))
+XML_CHUNK_SIZE = 16 * 1024
+
 
 class BmgApiClient:
     def __init__(self):
@@ -35,29 +59,77 @@ class BmgApiClient:
         self.password = get_credential("BMG_BOT_PASSWORD")
         self.login_consig = get_credential("BMG_CONSIG_LOGIN")
         self.password_consig = get_credential("BMG_CONSIG_PASSWORD")
+        self.session = None
+
+    async def start_session(self):
+        """Usa a sessão HTTP compartilhada (pool com keep-alive) do BMG"""
+        if self.session is None or self.session.closed:
+            self.session = get_http_session("bmg")
+
+    async def _soap_request(
+        self, endpoint: str, payload: str, idempotent: bool = True
+    ) -> Tuple[int, Dict[str, Any]]:
+        """
+        Envia o envelope SOAP e converte a resposta em dict à medida que o
+        corpo é recebido.
+
+        Consultas são repetidas em erros de conexão e timeout. Operações que
+        gravam no BMG (idempotent=False) só são repetidas quando a conexão
+        nem chegou a ser estabelecida.
+        """
+        retry_on = (
+            (aiohttp.ClientError, asyncio.TimeoutError)
+            if idempotent
+            else (aiohttp.ClientConnectorError,)
+        )
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(BMG_RETRY_ATTEMPTS),
+            wait=wait_exponential(multiplier=0.5, max=4),
+            retry=retry_if_exception_type(retry_on),
+            reraise=True,
+        ):
+            with attempt:
+                await self.start_session()
+                async with self.session.post(
+                    f"{self.base_url}/{endpoint}",
+                    # Mesma codificação usada anteriormente pelo http.client
+                    data=payload.encode("latin-1"),
+                    headers={"SOAPAction": "add"},
+                ) as res:
+                    try:
+                        response = await xml_stream_to_dict(
+                            res.content.iter_chunked(XML_CHUNK_SIZE)
+                        )
+                    except ParseError as e:
+                        logger.error(
+                            f"Resposta inválida do BMG ({endpoint}, status "
+                            f"{res.status}): {str(e)}"
+                        )
+                        raise HTTPException(
+                            status_code=502,
+                            detail="Resposta inválida do BMG",
+                        )
+                    return res.status, response
 
-    def request_in100(self, data: In100Request):
+    async def request_in100(self, data: In100Request):
         repository = BMGMongoRepository()
 
-        user_data = repository.get_from_collection_by_cpf("cards", data.cpf)
+        user_data = await repository.get_from_collection_by_cpf(
+            "cards", data.cpf, projection={"_id": 1}
+        )
 
         if user_data:
-            repository.update_in_collection_by_id(
-                "cards", user_data["id"], data=data.model_dump()
+            await repository.update_in_collection_by_id(
+                "cards", user_data["id"], data=data.model_dump(), projection={"_id": 1}
             )
         else:
-            repository.add_to_collection("cards", data)
+            await repository.add_to_collection("cards", data.model_dump())
 
-        conn = http.client.HTTPSConnection("ws1.bmgconsig.com.br")
         payload = generate_request_in100_payload(data, self.login, self.password)
-        headers = {"Content-Type": "text/xml", "SOAPAction": "add"}
-        conn.request(
-            "POST", "/webservices/ConsultaMargemIN100?wsdl=null", payload, headers
+        status, response = await self._soap_request(
+            IN100_ENDPOINT, payload, idempotent=False
         )
-        res = conn.getresponse()
-        body = res.read()
-        response = xml_to_dict(body)
-        if res.status == 200:
+        if status == 200:
             response = response["Body"]["inserirSolicitacaoResponse"][
                 "inserirSolicitacaoReturn"
             ]
@@ -67,27 +139,22 @@ class BmgApiClient:
                 detail = response["Body"]["Fault"]
             else:
                 detail = response["Body"]
-            raise HTTPException(status_code=res.status, detail=detail)
+            raise HTTPException(status_code=status, detail=detail)
 
-    def single_consult_request(self, data: SingleConsultRequest):
-        conn = http.client.HTTPSConnection("ws1.bmgconsig.com.br")
+    async def single_consult_request(self, data: SingleConsultRequest):
         payload = build_single_consult_request_payload(data, self.login, self.password)
-        headers = {"Content-Type": "text/xml", "SOAPAction": "add"}
-        conn.request(
-            "POST", "/webservices/ConsultaMargemIN100?wsdl=null", payload, headers
-        )
-        res = conn.getresponse()
-        body = res.read()
-        response = xml_to_dict(body)
-        if res.status == 200:
+        status, response = await self._soap_request(IN100_ENDPOINT, payload)
+        if status == 200:
             response = response["Body"]["realizarConsultaAvulsaResponse"][
                 "realizarConsultaAvulsaReturn"
             ]
             repository = BMGMongoRepository()
-            user_data = repository.get_from_collection_by_cpf("cards", data.cpf)
+            user_data = await repository.get_from_collection_by_cpf(
+                "cards", data.cpf, projection=IN100_KEY_FIELDS
+            )
             if user_data and "benefit" in user_data:
-                redis_key = f"in100_bmg_{data.cpf}_{user_data['benefit']}"
-                add_in100_to_cache(redis_key, response)
+                redis_key = bmg_in100_key(data.cpf, user_data["benefit"])
+                await add_in100_to_cache_async(redis_key, response)
 
             return {"data": response}
 
@@ -96,19 +163,12 @@ class BmgApiClient:
                 detail = response["Body"]["Fault"]
             else:
                 detail = response["Body"]
-            raise HTTPException(status_code=res.status, detail=detail)
+            raise HTTPException(status_code=status, detail=detail)
 
-    def in100_consult_filter(self, data: In100ConsultFilter):
-        conn = http.client.HTTPSConnection("ws1.bmgconsig.com.br")
+    async def in100_consult_filter(self, data: In100ConsultFilter):
         payload = build_in100_consult_filter(data, self.login, self.password)
-        headers = {"Content-Type": "text/xml", "SOAPAction": "add"}
-        conn.request(
-            "POST", "/webservices/ConsultaMargemIN100?wsdl=null", payload, headers
-        )
-        res = conn.getresponse()
-        body = res.read()
-        response = xml_to_dict(body)
-        if res.status == 200:
+        status, response = await self._soap_request(IN100_ENDPOINT, payload)
+        if status == 200:
             response = response["Body"]["pesquisarResponse"]["pesquisarReturn"][
                 "pesquisarReturn"
             ]
@@ -118,10 +178,12 @@ class BmgApiClient:
 
             if response["consulta"]["agenciaPagadora"]:
                 repository = BMGMongoRepository()
-                user_data = repository.get_from_collection_by_cpf("cards", data.cpf)
+                user_data = await repository.get_from_collection_by_cpf(
+                    "cards", data.cpf, projection=IN100_KEY_FIELDS
+                )
                 if user_data and "benefit" in user_data:
-                    redis_key = f"in100_bmg_{data.cpf}_{user_data['benefit']}"
-                    add_in100_to_cache(redis_key, response)
+                    redis_key = bmg_in100_key(data.cpf, user_data["benefit"])
+                    await add_in100_to_cache_async(redis_key, response)
                 return {"data": response}
 
             request_number = response["numeroSolicitacao"]
@@ -131,26 +193,21 @@ class BmgApiClient:
                 request_number=request_number, token=token, cpf=data.cpf
             )
 
-            return self.single_consult_request(data=form_data)
+            return await self.single_consult_request(data=form_data)
 
         else:
             if "Fault" in response["Body"]:
                 detail = response["Body"]["Fault"]
             else:
                 detail = response["Body"]
-            raise HTTPException(status_code=res.status, detail=detail)
+            raise HTTPException(status_code=status, detail=detail)
 
-    def get_card_offer(self, data: OfferRequest):
-        conn = http.client.HTTPSConnection("ws1.bmgconsig.com.br")
+    async def get_card_offer(self, data: OfferRequest):
         payload = build_get_offer_payload(
             data, self.login, self.password, self.login_consig, self.password_consig
         )
-        headers = {"Content-Type": "text/xml", "SOAPAction": "add"}
-        conn.request("POST", "/webservices/CartaoBeneficio?wsdl=null", payload, headers)
-        res = conn.getresponse()
-        body = res.read()
-        response = xml_to_dict(body)
-        if res.status == 200:
+        status, response = await self._soap_request(BENEFIT_CARD_ENDPOINT, payload)
+        if status == 200:
             response: str = response["Body"]["geraScriptResponse"]["geraScriptReturn"]
 
             splited_response = response.split("||")
@@ -171,12 +228,15 @@ class BmgApiClient:
 
                     repository = BMGMongoRepository()
 
-                    user_data = repository.get_from_collection_by_cpf(
-                        "cards", data.customer.cpf
+                    user_data = await repository.get_from_collection_by_cpf(
+                        "cards", data.customer.cpf, projection={"_id": 1}
                     )
                     if user_data:
-                        response = repository.update_in_collection_by_id(
-                            "cards", user_data["id"], data=simulation_data
+                        response = await repository.update_in_collection_by_id(
+                            "cards",
+                            user_data["id"],
+                            data=simulation_data,
+                            include_in100=True,
                         )
 
                     return response
@@ -197,8 +257,8 @@ class BmgApiClient:
         else:
             repository = BMGMongoRepository()
 
-            user_data = repository.get_from_collection_by_cpf(
-                "cards", data.customer.cpf
+            user_data = await repository.get_from_collection_by_cpf(
+                "cards", data.customer.cpf, projection={"_id": 1}
             )
             if user_data:
                 simulation_data = {
@@ -207,23 +267,20 @@ class BmgApiClient:
                         "withdrawal_limit": 0,
                     }
                 }
-                response = repository.update_in_collection_by_id(
-                    "cards", user_data["id"], data=simulation_data
+                response = await repository.update_in_collection_by_id(
+                    "cards", user_data["id"], data=simulation_data, include_in100=True
                 )
 
             return {"data": response}
 
-    def save_benefit_card_proposal(self, data: SaveProposalRequest):
-        conn = http.client.HTTPSConnection("ws1.bmgconsig.com.br")
+    async def save_benefit_card_proposal(self, data: SaveProposalRequest):
         payload = build_save_benefit_card_proposal_payload(
             data, self.login, self.password, self.login_consig, self.password_consig
         )
-        headers = {"Content-Type": "text/xml", "SOAPAction": "add"}
-        conn.request("POST", "/webservices/CartaoBeneficio?wsdl=null", payload, headers)
-        res = conn.getresponse()
-        body = res.read()
-        response = xml_to_dict(body)
-        if res.status == 200:
+        status, response = await self._soap_request(
+            BENEFIT_CARD_ENDPOINT, payload, idempotent=False
+        )
+        if status == 200:
             response = response["Body"]["gravarPropostaCartaoResponse"][
                 "gravarPropostaCartaoReturn"
             ]
@@ -233,4 +290,4 @@ class BmgApiClient:
                 detail = response["Body"]["Fault"]
             else:
                 detail = response["Body"]
-            raise HTTPException(status_code=res.status, detail=detail)
+            raise HTTPException(status_code=status, detail=detail)
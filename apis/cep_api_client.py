@@ -1,6 +1,8 @@
 import aiohttp
 from typing import Dict, Any
 import logging
+from .single_flight import single_flight
+from .http_clients import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -12,12 +14,12 @@ class CepAPIClient:
 
     async def start_session(self):
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = get_http_session("cep")
 
     async def close_session(self):
-        if self.session and not self.session.closed:
-            await self.session.close()
+        """O pool é compartilhado e fechado pelo registro no desligamento"""
 
+    @single_flight("cep.address")
     async def fetch_address_by_cep(self, cep: str) -> Dict[str, Any]:
         await self.start_session()
         url = f"{self.base_url}{cep}/json/"
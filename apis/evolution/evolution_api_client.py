@@ -1,7 +1,7 @@
-import aiohttp
 import os
 import logging
 from typing import Dict, List, Any
+from apis.http_clients import get_http_session
 
 logger = logging.getLogger(__name__)
 
@@ -15,22 +15,19 @@ class EvolutionAPIClient:
 
     async def start_session(self):
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(
-                headers={"apikey": self.api_key, "Content-Type": "application/json"}
-            )
-            logger.info("Sessão da Evolution API iniciada")
+            self.session = get_http_session("evolution")
 
     async def close_session(self):
-        if self.session and not self.session.closed:
-            await self.session.close()
-            logger.info("Sessão da Evolution API fechada")
+        """O pool é compartilhado e fechado pelo registro no desligamento"""
 
     async def _request(self, method: str, endpoint: str, data: Dict = None) -> Dict:
         await self.start_session()
         url = f"{self.base_url}/{endpoint}"
 
         try:
-            async with self.session.request(method, url, json=data) as response:
+            async with self.session.request(
+                method, url, json=data, headers={"apikey": self.api_key}
+            ) as response:
                 response_text = await response.text()
                 try:
                     response_data = await response.json()
@@ -3,15 +3,25 @@ import os
 import logging
 import base64
 import traceback
-from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta
+import functools
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Dict, Any, List, Tuple
 import json
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from utils.api_credentials import get_credential
+from utils.api_credentials import get_credential, on_credentials_rotated
+from .single_flight import single_flight
+from .http_clients import get_http_session
+from .token_manager import forget_tokens, get_token_manager, token_key
+from .upstream_guard import get_upstream_guard
 
 load_dotenv()
 
+FACTA = "FACTA"
+
+# Token da FACTA vale 1h; renovado antes pelo gerenciador de tokens
+FACTA_TOKEN_TTL = 55 * 60
+
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s"
 )
@@ -78,12 +88,46 @@ class DadosPessoaisPayload(BaseModel):
         return {key: str(value) for key, value in data.items()}
 
 
+async def fetch_token(token_url: str, user: str, password: str) -> Tuple[str, float]:
+    """Login na FACTA: retorna o token e a validade em segundos."""
+    auth_string = base64.b64encode(f"{user}:{password}".encode()).decode()
+
+    try:
+        async with get_upstream_guard(FACTA).call() as call:
+            async with get_http_session("facta").get(
+                token_url, headers={"Authorization": f"Basic {auth_string}"}
+            ) as response:
+                call.status = response.status
+                response.raise_for_status()
+                data = await response.json()
+
+                if data.get("erro"):
+                    raise ValueError(f"Erro ao obter token: {data.get('mensagem')}")
+
+                token = data.get("token")
+                if not token:
+                    raise ValueError("Token não foi recebido após login.")
+
+                logger.info(f"Autenticado com sucesso na FACTA ({token_url}).")
+                return token, FACTA_TOKEN_TTL
+
+    except aiohttp.ClientResponseError as e:
+        logger.error(f"Erro na autenticação: {e.status} - {e.message}")
+        raise
+    except Exception as e:
+        logger.error(f"Erro inesperado durante autenticação: {str(e)}")
+        raise
+
+
+on_credentials_rotated(
+    FACTA, functools.partial(forget_tokens, "facta", "facta_offline")
+)
+
+
 class FactaApi:
     def __init__(self, user=None, password=None):
         self.token: Optional[str] = None
-        self.token_expiry: Optional[datetime] = None
         self.token_offline: Optional[str] = None
-        self.token_expiry_offline: Optional[datetime] = None
 
         # URLs base
         self.base_url: str = os.getenv("FACTA_BASE_URL")
@@ -103,109 +147,60 @@ class FactaApi:
         )
         self.proposta_envio_link_url: str = f"{self.base_url}/proposta/envio-link"
 
-        # Credenciais
-        self.user: str = get_credential("FACTA_USER")
-        self.password: str = get_credential("FACTA_PASSWORD")
         self.session: Optional[aiohttp.ClientSession] = None
 
+    # Credenciais lidas do cache a cada uso: após uma rotação os tokens das
+    # antigas são descartados no módulo e o próximo login já usa as novas
+    @property
+    def user(self) -> str:
+        return get_credential("FACTA_USER")
+
+    @property
+    def password(self) -> str:
+        return get_credential("FACTA_PASSWORD")
+
     async def start_session(self) -> None:
-        """Inicia uma sessão HTTP com os headers necessários."""
+        """Usa a sessão HTTP compartilhada (pool de conexões) da FACTA."""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(
-                connector=aiohttp.TCPConnector(ssl=False),
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                },
-            )
-            logger.info("Nova sessão HTTP iniciada.")
+            self.session = get_http_session("facta")
 
     async def close_session(self) -> None:
-        """Fecha a sessão HTTP."""
-        if self.session and not self.session.closed:
-            await self.session.close()
-            logger.info("Sessão HTTP fechada.")
+        """O pool é compartilhado e fechado pelo registro no desligamento."""
+
+    @asynccontextmanager
+    async def _request(
+        self, method: str, url: str, **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Chamada à FACTA sob o limite de taxa e o circuit breaker do banco."""
+        async with get_upstream_guard(FACTA).call() as call:
+            async with self.session.request(method, url, **kwargs) as response:
+                call.status = response.status
+                yield response
 
     async def authenticate(self, offline: bool = False) -> str:
-        """Autentica na API e obtém o token de sessão.
+        """Obtém o token de sessão compartilhado (login só quando necessário).
 
         Args:
             offline: Se True, autentica na API offline, caso contrário na API principal
         """
-        now = datetime.now()
+        upstream = "facta_offline" if offline else "facta"
+        token_url = self.token_url_offline if offline else self.token_url
+        token = await get_token_manager().get_token(
+            token_key(upstream, token_url, self.user, self.password),
+            functools.partial(fetch_token, token_url, self.user, self.password),
+        )
 
         if offline:
-            if (
-                self.token_offline
-                and self.token_expiry_offline
-                and now < self.token_expiry_offline
-            ):
-                return self.token_offline
+            self.token_offline = token
         else:
-            if self.token and self.token_expiry and now < self.token_expiry:
-                return self.token
-
-        await self.start_session()
-
-        token_url = self.token_url_offline if offline else self.token_url
-        auth_string = base64.b64encode(f"{self.user}:{self.password}".encode()).decode()
-
-        try:
-            async with self.session.get(
-                token_url, headers={"Authorization": f"Basic {auth_string}"}
-            ) as response:
-                response.raise_for_status()
-                data = await response.json()
-
-                if data.get("erro"):
-                    raise ValueError(f"Erro ao obter token: {data.get('mensagem')}")
-
-                token = data.get("token")
-                token_expiry = now + timedelta(minutes=55)
-
-                if not token:
-                    raise ValueError("Token não foi recebido após login.")
-
-                # Armazenar token na variável correta
-                if offline:
-                    self.token_offline = token
-                    self.token_expiry_offline = token_expiry
-                else:
-                    self.token = token
-                    self.token_expiry = token_expiry
-
-                logger.info(
-                    f"Autenticado com sucesso na API {'offline' if offline else 'principal'}."
-                )
-                return token
-
-        except aiohttp.ClientResponseError as e:
-            logger.error(f"Erro na autenticação: {e.status} - {e.message}")
-            raise
-        except Exception as e:
-            logger.error(f"Erro inesperado durante autenticação: {str(e)}")
-            raise
+            self.token = token
+        return token
 
     async def get_auth_headers(self, offline: bool = False) -> Dict[str, str]:
         """Retorna os headers de autorização para as requisições."""
-        if offline:
-            if (
-                not self.token_offline
-                or not self.token_expiry_offline
-                or datetime.now() >= self.token_expiry_offline
-            ):
-                await self.authenticate(offline=True)
-            return {"Authorization": f"Bearer {self.token_offline}"}
-        else:
-            if (
-                not self.token
-                or not self.token_expiry
-                or datetime.now() >= self.token_expiry
-            ):
-                await self.authenticate(offline=False)
-            return {"Authorization": f"Bearer {self.token}"}
+        return {"Authorization": f"Bearer {await self.authenticate(offline)}"}
 
+    @single_flight("facta.base_offline")
     async def consultar_base_offline(self, cpf: str) -> Dict[str, Any]:
         """Consulta se um CPF está autorizado na base offline da CEF."""
         await self.start_session()
@@ -213,22 +208,21 @@ class FactaApi:
         url = f"{self.fgts_offline_url}?cpf={cpf}"
 
         try:
-            async with self.session.get(url, headers=headers) as response:
+            async with self._request("GET", url, headers=headers) as response:
                 logger.info(f"Chamada API: URL={url}, Status={response.status}")
                 response.raise_for_status()
                 result = await response.json()
                 return result
         except aiohttp.ClientResponseError as e:
             if e.status == 429:
-                logger.error("Limite de requisições atingido (2 por segundo)")
+                logger.error("Limite de requisições atingido na base offline")
             logger.error(f"Erro ao consultar base offline: {e.status} - {e.message}")
             raise
         except Exception as e:
             logger.error(f"Erro inesperado ao consultar base offline: {str(e)}")
             raise
-        finally:
-            await self.close_session()
 
+    @single_flight("facta.saldo_fgts")
     async def consultar_saldo_fgts(self, cpf: str) -> Dict[str, Any]:
         """Consulta o saldo disponível para antecipação do FGTS."""
         await self.start_session()
@@ -236,7 +230,7 @@ class FactaApi:
         url = f"{self.fgts_saldo_url}?cpf={cpf}"
 
         try:
-            async with self.session.get(url, headers=headers) as response:
+            async with self._request("GET", url, headers=headers) as response:
                 logger.info(f"Chamada API: URL={url}, Status={response.status}")
                 response.raise_for_status()
                 result = await response.json()
@@ -247,9 +241,8 @@ class FactaApi:
         except Exception as e:
             logger.error(f"Erro inesperado ao consultar saldo FGTS: {str(e)}")
             raise
-        finally:
-            await self.close_session()
 
+    @single_flight("facta.calculo_fgts")
     async def simular_valor_fgts(
         self,
         cpf: str,
@@ -264,8 +257,8 @@ class FactaApi:
         payload = {"cpf": cpf, "taxa": taxa, "tabela": tabela, "parcelas": parcelas}
 
         try:
-            async with self.session.post(
-                self.fgts_calculo_url, json=payload, headers=headers
+            async with self._request(
+                "POST", self.fgts_calculo_url, json=payload, headers=headers
             ) as response:
                 logger.info(
                     f"Chamada API: URL={self.fgts_calculo_url}, Status={response.status}"
@@ -279,8 +272,6 @@ class FactaApi:
         except Exception as e:
             logger.error(f"Erro inesperado ao simular valor FGTS: {str(e)}")
             raise
-        finally:
-            await self.close_session()
 
     async def cadastrar_simulacao(
         self,
@@ -319,8 +310,8 @@ class FactaApi:
 
         try:
 
-            async with self.session.post(
-                self.proposta_etapa1_url, data=form_data, headers=headers_form
+            async with self._request(
+                "POST", self.proposta_etapa1_url, data=form_data, headers=headers_form
             ) as response:
                 logger.info(
                     f"Chamada API: URL={self.proposta_etapa1_url}, Status={response.status}"
@@ -350,8 +341,6 @@ class FactaApi:
             logger.error(error_msg)
             logger.error(traceback.format_exc())
             return {"erro": True, "mensagem": error_msg}
-        finally:
-            await self.close_session()
 
     async def cadastrar_dados_pessoais(
         self, dados_pessoais: Dict[str, Any]
@@ -384,8 +373,8 @@ class FactaApi:
                 if value is not None:
                     form_data[key] = str(value)
 
-            async with self.session.post(
-                self.proposta_etapa2_url, data=form_data, headers=headers_form
+            async with self._request(
+                "POST", self.proposta_etapa2_url, data=form_data, headers=headers_form
             ) as response:
                 logger.info(
                     f"Chamada API: URL={self.proposta_etapa2_url}, Status={response.status}"
@@ -414,8 +403,6 @@ class FactaApi:
             logger.error(error_msg)
             logger.error(traceback.format_exc())
             return {"erro": True, "mensagem": error_msg}
-        finally:
-            await self.close_session()
 
     async def cadastrar_proposta(
         self,
@@ -435,8 +422,8 @@ class FactaApi:
         }
 
         try:
-            async with self.session.post(
-                self.proposta_etapa3_url, data=form_data, headers=headers_form
+            async with self._request(
+                "POST", self.proposta_etapa3_url, data=form_data, headers=headers_form
             ) as response:
                 logger.info(
                     f"Chamada API: URL={self.proposta_etapa3_url}, Status={response.status}"
@@ -462,8 +449,6 @@ class FactaApi:
             logger.error(error_msg)
             logger.error(traceback.format_exc())
             raise
-        finally:
-            await self.close_session()
 
     async def enviar_link_formalizacao(
         self, codigo_af: str, tipo_envio: str  # "whatsapp" ou "sms"
@@ -480,8 +465,11 @@ class FactaApi:
         }
 
         try:
-            async with self.session.post(
-                self.proposta_envio_link_url, data=form_data, headers=headers_form
+            async with self._request(
+                "POST",
+                self.proposta_envio_link_url,
+                data=form_data,
+                headers=headers_form,
             ) as response:
                 logger.info(
                     f"Chamada API: URL={self.proposta_envio_link_url}, Status={response.status}"
@@ -508,8 +496,6 @@ class FactaApi:
             logger.error(e)
             logger.error(traceback.format_exc())
             raise
-        finally:
-            await self.close_session()
 
     async def consultar_combobox(
         self, endpoint: str, params: Dict[str, str] = None
@@ -524,7 +510,7 @@ class FactaApi:
             url = f"{url}?{query_params}"
 
         try:
-            async with self.session.get(url, headers=headers) as response:
+            async with self._request("GET", url, headers=headers) as response:
                 logger.info(f"Chamada API: URL={url}, Status={response.status}")
                 response.raise_for_status()
                 return await response.json()
@@ -536,8 +522,6 @@ class FactaApi:
         except Exception as e:
             logger.error(f"Erro inesperado ao consultar combobox {endpoint}: {str(e)}")
             raise
-        finally:
-            await self.close_session()
 
     @staticmethod
     def criar_payload_parcelas(
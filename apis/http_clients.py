@@ -0,0 +1,174 @@
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
+import aiohttp
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
+    "Accept": "application/json",
+    "Content-Type": "application/json",
+}
+
+# Configuração do pool de cada API externa. Cada valor pode ser sobrescrito
+# por <NOME>_POOL_LIMIT, <NOME>_POOL_LIMIT_PER_HOST, <NOME>_KEEPALIVE_TIMEOUT,
+# <NOME>_DNS_CACHE_TTL e <NOME>_TIMEOUT (ex: FACTA_POOL_LIMIT).
+HTTP_CLIENT_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "facta": {
+        "limit": 20,
+        "limit_per_host": 10,
+        "timeout": 60,
+        "ssl": False,
+        "headers": BROWSER_HEADERS,
+    },
+    "vctex": {
+        "limit": 100,
+        "limit_per_host": 0,
+        "timeout": 90,
+        "ssl": False,
+        "headers": {
+            "User-Agent": "VCTEX-Client/1.0",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        },
+    },
+    "prata": {
+        "limit": 10,
+        "limit_per_host": 10,
+        "timeout": 60,
+        "ssl": False,
+        "headers": BROWSER_HEADERS,
+    },
+    "bmg": {
+        "limit": 10,
+        "limit_per_host": 10,
+        "timeout": 60,
+        "headers": {"Content-Type": "text/xml"},
+    },
+    "inapi": {
+        "limit": 20,
+        "limit_per_host": 10,
+        "timeout": 30,
+        "headers": {"Accept": "application/json"},
+    },
+    "cep": {"limit": 20, "limit_per_host": 10, "timeout": 10},
+    "evolution": {
+        "limit": 20,
+        "limit_per_host": 10,
+        "timeout": 30,
+        "headers": {"Content-Type": "application/json"},
+    },
+}
+
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+DEFAULT_DNS_CACHE_TTL = 300
+
+
+def _env_number(name: str, default, cast=float):
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning(f"Valor inválido para {name}: {value}")
+        return default
+
+
+class HttpClientRegistry:
+    """
+    Sessões HTTP (pools com keep-alive) por API externa e instâncias
+    compartilhadas dos clientes. Criado e fechado no lifespan da aplicação.
+    """
+
+    def __init__(self, configs: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.configs = configs or HTTP_CLIENT_CONFIGS
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._clients: Dict[type, Any] = {}
+
+    def session(self, name: str) -> aiohttp.ClientSession:
+        """Retorna a sessão HTTP compartilhada da API `name`"""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = self._create_session(name)
+            self._sessions[name] = session
+        return session
+
+    def _create_session(self, name: str) -> aiohttp.ClientSession:
+        config = self.configs[name]
+        prefix = name.upper()
+
+        connector = aiohttp.TCPConnector(
+            ssl=config.get("ssl", True),
+            limit=_env_number(f"{prefix}_POOL_LIMIT", config["limit"], int),
+            limit_per_host=_env_number(
+                f"{prefix}_POOL_LIMIT_PER_HOST", config["limit_per_host"], int
+            ),
+            keepalive_timeout=_env_number(
+                f"{prefix}_KEEPALIVE_TIMEOUT", DEFAULT_KEEPALIVE_TIMEOUT
+            ),
+            ttl_dns_cache=_env_number(
+                f"{prefix}_DNS_CACHE_TTL", DEFAULT_DNS_CACHE_TTL, int
+            ),
+        )
+        logger.info(f"Pool de conexões {name} iniciado")
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=_env_number(f"{prefix}_TIMEOUT", config["timeout"])
+            ),
+            headers=config.get("headers"),
+        )
+
+    def client(self, client_class: Type[T]) -> T:
+        """Retorna a instância compartilhada de um cliente de API"""
+        if client_class not in self._clients:
+            self._clients[client_class] = client_class()
+        return self._clients[client_class]
+
+    async def close(self):
+        """Fecha todas as sessões HTTP"""
+        for name, session in self._sessions.items():
+            if not session.closed:
+                await session.close()
+                logger.info(f"Pool de conexões {name} fechado")
+        self._sessions.clear()
+        self._clients.clear()
+
+
+_registry: Optional[HttpClientRegistry] = None
+
+
+def get_http_client_registry() -> HttpClientRegistry:
+    """Retorna o registro de clientes HTTP da aplicação"""
+    global _registry
+    if _registry is None:
+        _registry = HttpClientRegistry()
+    return _registry
+
+
+def get_http_session(name: str) -> aiohttp.ClientSession:
+    return get_http_client_registry().session(name)
+
+
+def get_api_client(client_class: Type[T]) -> T:
+    return get_http_client_registry().client(client_class)
+
+
+def api_client_dependency(client_class: Type[T]) -> Callable[[], T]:
+    """Dependência do FastAPI que injeta a instância compartilhada do cliente"""
+
+    def dependency() -> T:
+        return get_api_client(client_class)
+
+    return dependency
+
+
+async def close_http_clients():
+    global _registry
+    if _registry is not None:
+        await _registry.close()
+        _registry = None
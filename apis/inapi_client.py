@@ -1,41 +1,153 @@
+import asyncio
+import logging
 import os
-import requests
-from services.inapi.redis_cache import get_in100_from_cache, add_in100_to_cache
+from typing import Any, Dict, List, Optional, Tuple
+import aiohttp
+from services.inapi.redis_cache import (
+    add_in100_to_cache_async,
+    add_many_in100_to_cache_async,
+    get_in100_from_cache_async,
+    get_many_in100_from_cache_async,
+)
+from .http_clients import get_http_session
+from .single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+# Consultas simultâneas à InApi em uma busca em lote
+INAPI_BULK_CONCURRENCY = int(os.getenv("INAPI_BULK_CONCURRENCY", "5"))
 
 
 class InApiClient:
     def __init__(self):
         self.base_url = "https://inapi.digital/api/check/consult"
+        self.session = None
 
-    def get_in_100(self, cpf: str, benefit: str):
-        redis_key = f"in100_{cpf}_{benefit}"
-        cached_in100 = get_in100_from_cache(redis_key)
-        if cached_in100 is not None:
-            return cached_in100
+    async def start_session(self):
+        if self.session is None or self.session.closed:
+            self.session = get_http_session("inapi")
+
+    async def close_session(self):
+        """O pool é compartilhado e fechado pelo registro no desligamento"""
+
+    @staticmethod
+    def _cache_key(cpf: str, benefit: str) -> str:
+        return f"in100_{cpf}_{benefit}"
+
+    async def _get_cached(self, redis_key: str, cpf: str, benefit: str):
+        try:
+            # Margem antiga é servida e atualizada em segundo plano
+            return await get_in100_from_cache_async(
+                redis_key, refresh=lambda _: self._fetch_in_100(cpf, benefit)
+            )
+        except Exception as e:
+            logger.warning(f"Cache do IN100 indisponível: {str(e)}")
+            return None
+
+    @single_flight("inapi.in100")
+    async def _fetch_in_100(self, cpf: str, benefit: str) -> Optional[Dict[str, Any]]:
+        """Consulta o IN100 na InApi; retorna o payload ou None"""
+        await self.start_session()
         in_api_token = os.getenv("INAPI_TOKEN")
-        headers = {
-            "Accept": "application/json",
-            "Authorization": "Bearer " + in_api_token,
-        }
+        headers = {"Authorization": "Bearer " + in_api_token}
 
         params = (
             ("cpf", cpf),
             ("benefit", benefit),
-            ("with_loans", True),
+            # Mesmo valor enviado anteriormente pelo requests
+            ("with_loans", "True"),
         )
 
-        response = requests.get(
-            "https://inapi.digital/api/check/consult", headers=headers, params=params
-        )
+        try:
+            async with self.session.get(
+                self.base_url, headers=headers, params=params
+            ) as response:
+                if response.status != 200:
+                    return None
+                json = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Erro ao consultar IN100 na InApi: {str(e)}")
+            return None
+
+        if json["error"] is False:
+            return json["payload"]
+        return None
+
+    async def get_in_100(self, cpf: str, benefit: str):
+        redis_key = self._cache_key(cpf, benefit)
+        cached_in100 = await self._get_cached(redis_key, cpf, benefit)
+        if cached_in100 is not None:
+            return cached_in100
 
-        if response.status_code == 200:
-            json = response.json()
+        payload = await self._fetch_in_100(cpf, benefit)
+        if payload is not None:
+            try:
+                await add_in100_to_cache_async(redis_key, payload)
+            except Exception as e:
+                logger.warning(f"Erro ao gravar IN100 no cache: {str(e)}")
+        return payload
 
-            if json["error"] is False:
-                add_in100_to_cache(redis_key, json["payload"])
-                return json["payload"]
-            else:
-                return None
+    async def get_many_in_100(
+        self, items: List[Tuple[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca o IN100 de vários pares (cpf, benefício)
 
-        else:
-            return None
+        O cache é lido com um único MGET; apenas as chaves ausentes são
+        consultadas na InApi e os novos resultados são gravados em um único
+        pipeline.
+
+        Returns:
+            Lista na mesma ordem da entrada com cpf, benefit, in100 e cached
+        """
+        pairs = list(dict.fromkeys(items))
+        keys = {pair: self._cache_key(*pair) for pair in pairs}
+
+        pairs_by_key = {key: pair for pair, key in keys.items()}
+
+        try:
+            cached = await get_many_in100_from_cache_async(
+                list(keys.values()),
+                refresh=lambda key: self._fetch_in_100(*pairs_by_key[key]),
+            )
+        except Exception as e:
+            logger.warning(f"Cache do IN100 indisponível: {str(e)}")
+            cached = {}
+
+        misses = [pair for pair in pairs if keys[pair] not in cached]
+        semaphore = asyncio.Semaphore(INAPI_BULK_CONCURRENCY)
+
+        async def fetch(pair: Tuple[str, str]):
+            async with semaphore:
+                return await self._fetch_in_100(*pair)
+
+        fetched = dict(zip(misses, await asyncio.gather(*map(fetch, misses))))
+
+        to_cache = {
+            keys[pair]: payload
+            for pair, payload in fetched.items()
+            if payload is not None
+        }
+        try:
+            await add_many_in100_to_cache_async(to_cache)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar IN100 no cache: {str(e)}")
+
+        logger.info(
+            f"IN100 em lote: {len(pairs)} pares, {len(cached)} do cache, "
+            f"{len(misses)} consultados na InApi"
+        )
+
+        return [
+            {
+                "cpf": cpf,
+                "benefit": benefit,
+                "in100": (
+                    cached[keys[(cpf, benefit)]]
+                    if keys[(cpf, benefit)] in cached
+                    else fetched[(cpf, benefit)]
+                ),
+                "cached": keys[(cpf, benefit)] in cached,
+            }
+            for cpf, benefit in items
+        ]
@@ -3,6 +3,7 @@ import os
 import logging
 from typing import Optional, Dict, Any
 from apis.helpers import format_prata_response
+from apis.http_clients import get_http_session
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -31,23 +32,12 @@ class PrataApi:
                 raise EnvironmentError(f"Variável de ambiente {var} não está definida.")
 
     async def start_session(self) -> None:
-        """Inicia uma sessão HTTP com os headers necessários."""
+        """Usa a sessão HTTP compartilhada (pool de conexões) da Prata."""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(
-                connector=aiohttp.TCPConnector(ssl=False),
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36",
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                },
-            )
-            logger.info("Nova sessão HTTP iniciada.")
+            self.session = get_http_session("prata")
 
     async def close_session(self) -> None:
-        """Fecha a sessão HTTP."""
-        if self.session and not self.session.closed:
-            await self.session.close()
-            logger.info("Sessão HTTP fechada.")
+        """O pool é compartilhado e fechado pelo registro no desligamento."""
 
     async def authenticate(self) -> str:
         """Autentica na API e obtém o token de sessão."""
@@ -105,5 +95,3 @@ class PrataApi:
         except Exception as e:
             logger.error(f"Erro inesperado ao buscar informações PIX: {str(e)}")
             raise
-        finally:
-            await self.close_session()
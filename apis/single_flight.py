@@ -0,0 +1,94 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import copy
+import functools
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas idênticas em andamento: apenas a primeira chama a API e as
+    demais aguardam o mesmo resultado (ou a mesma exceção).
+
+    Use somente em chamadas idempotentes (consultas e simulações).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Dict[str, Any]] = {}
+        self.requests = 0
+        self.executed = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        self.requests += 1
+        call = self._calls.get(key)
+        if call is not None:
+            self.collapsed += 1
+            call["shared"] = True
+            logger.debug(f"Chamada {self.name} agrupada com outra em andamento")
+            # shield: o cancelamento de um solicitante não cancela os demais
+            return copy.deepcopy(await asyncio.shield(call["task"]))
+
+        self.executed += 1
+        call = {"task": asyncio.create_task(func()), "shared": False}
+        self._calls[key] = call
+        call["task"].add_done_callback(lambda _: self._release(key, call))
+
+        result = await asyncio.shield(call["task"])
+        # Resultado compartilhado: cada solicitante recebe sua cópia
+        return copy.deepcopy(result) if call["shared"] else result
+
+    def _release(self, key: Hashable, call: Dict[str, Any]):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._calls),
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Retorna o grupo de chamadas compartilhado com o nome informado"""
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+
+def get_single_flight_metrics() -> Dict[str, Dict[str, Any]]:
+    """Métricas de chamadas executadas e agrupadas por grupo"""
+    return {name: group.metrics() for name, group in _groups.items()}
+
+
+def _default_key(args: tuple, kwargs: Dict[str, Any]) -> str:
+    return json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+def single_flight(name: str, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Decorator de métodos assíncronos de clientes de API
+
+    A chave é calculada a partir dos argumentos (sem `self`), portanto
+    instâncias diferentes do cliente compartilham a mesma chamada.
+    """
+    group = get_single_flight(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            call_key = key(*args, **kwargs) if key else _default_key(args, kwargs)
+            return await group.do(call_key, lambda: func(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
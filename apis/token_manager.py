@@ -0,0 +1,251 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from redis.exceptions import RedisError
+from services.inapi.redis_cache import get_async_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Tokens são renovados em segundo plano quando faltam menos que isso para expirar
+AUTH_TOKEN_REFRESH_MARGIN = float(os.getenv("AUTH_TOKEN_REFRESH_MARGIN", "300"))
+AUTH_TOKEN_REFRESH_INTERVAL = float(os.getenv("AUTH_TOKEN_REFRESH_INTERVAL", "30"))
+# Tokens sem uso há mais tempo que isso deixam de ser renovados
+AUTH_TOKEN_IDLE_TIMEOUT = float(os.getenv("AUTH_TOKEN_IDLE_TIMEOUT", "3600"))
+# Compartilha os tokens entre workers pelo Redis (o token fica gravado no Redis)
+AUTH_TOKEN_REDIS = os.getenv("AUTH_TOKEN_REDIS", "false").lower() == "true"
+AUTH_TOKEN_LOCK_TIMEOUT = 30
+
+# Retorna (token, segundos até expirar)
+Fetch = Callable[[], Awaitable[Tuple[str, float]]]
+# (token, expira em - epoch)
+Token = Tuple[str, float]
+
+
+def token_key(upstream: str, *credentials: Optional[str]) -> str:
+    """Chave do token: API + hash das credenciais usadas no login"""
+    digest = hashlib.sha256("\0".join(c or "" for c in credentials).encode())
+    return f"{upstream}:{digest.hexdigest()[:16]}"
+
+
+class TokenManager:
+    """
+    Tokens de autenticação das APIs dos bancos, compartilhados pelo processo
+    por API e conjunto de credenciais.
+
+    Logins concorrentes da mesma chave são serializados por um lock: só o
+    primeiro chama o endpoint de token e os demais recebem o mesmo token.
+    O refresher (`start_token_refresher`) renova os tokens em uso antes de
+    expirarem, tirando o login do caminho das requisições. Com
+    AUTH_TOKEN_REDIS os tokens também são compartilhados entre workers, com
+    um lock no Redis para que apenas um worker faça o login.
+    """
+
+    def __init__(
+        self,
+        refresh_margin: float = AUTH_TOKEN_REFRESH_MARGIN,
+        shared: bool = AUTH_TOKEN_REDIS,
+    ):
+        self.refresh_margin = refresh_margin
+        self.shared = shared
+        self._tokens: Dict[str, Token] = {}
+        self._fetchers: Dict[str, Fetch] = {}
+        self._last_used: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.logins = 0
+        self.shared_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _valid(self, key: str, margin: float = 0.0) -> Optional[str]:
+        entry = self._tokens.get(key)
+        if entry and time.time() < entry[1] - margin:
+            return entry[0]
+        return None
+
+    async def get_token(self, key: str, fetch: Fetch) -> str:
+        """Token válido da chave, fazendo login (uma única vez) se necessário"""
+        self._fetchers[key] = fetch
+        self._last_used[key] = time.time()
+
+        token = self._valid(key)
+        if token:
+            self.hits += 1
+            return token
+
+        self.misses += 1
+        return await self._refresh(key)
+
+    async def _refresh(self, key: str, margin: float = 0.0) -> str:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Renovado por outra chamada enquanto esta aguardava o lock
+            token = self._valid(key, margin)
+            if token:
+                return token
+
+            entry = await self._fetch(key, margin)
+            self._tokens[key] = entry
+            return entry[0]
+
+    async def _fetch(self, key: str, margin: float) -> Token:
+        if self.shared:
+            try:
+                return await self._fetch_shared(key, margin)
+            except RedisError as e:
+                logger.warning(f"Redis indisponível para o token {key}: {str(e)}")
+        return await self._login(key)
+
+    async def _login(self, key: str) -> Token:
+        token, expires_in = await self._fetchers[key]()
+        self.logins += 1
+        logger.info(f"Novo token obtido para {key.split(':')[0]}")
+        return token, time.time() + expires_in
+
+    async def _read_shared(
+        self, redis, redis_key: str, margin: float
+    ) -> Optional[Token]:
+        data = await redis.get(redis_key)
+        if data is None:
+            return None
+        token, expires_at = json.loads(data)
+        if time.time() < expires_at - margin:
+            self.shared_hits += 1
+            return token, expires_at
+        return None
+
+    async def _fetch_shared(self, key: str, margin: float) -> Token:
+        redis = get_async_redis_connection()
+        redis_key = f"auth_token:{key}"
+
+        entry = await self._read_shared(redis, redis_key, margin)
+        if entry:
+            return entry
+
+        lock = redis.lock(
+            f"{redis_key}:lock",
+            timeout=AUTH_TOKEN_LOCK_TIMEOUT,
+            blocking_timeout=AUTH_TOKEN_LOCK_TIMEOUT,
+        )
+        # Sem o lock no prazo o login é feito mesmo assim
+        acquired = await lock.acquire()
+        try:
+            # Outro worker pode ter feito o login enquanto este aguardava
+            entry = await self._read_shared(redis, redis_key, margin)
+            if entry:
+                return entry
+
+            entry = await self._login(key)
+            try:
+                await redis.set(redis_key, json.dumps(entry), exat=int(entry[1]))
+            except RedisError as e:
+                logger.warning(f"Erro ao gravar o token {key} no Redis: {str(e)}")
+            return entry
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except RedisError as e:
+                    # O lock expira sozinho após AUTH_TOKEN_LOCK_TIMEOUT
+                    logger.warning(f"Erro ao liberar o lock do token {key}: {str(e)}")
+
+    async def invalidate(self, key: str, token: Optional[str] = None):
+        """
+        Descarta o token da chave (ex.: após um 401). Com `token`, só descarta
+        se ainda for o atual, preservando um token já renovado por outra
+        chamada.
+        """
+        entry = self._tokens.get(key)
+        if entry and (token is None or entry[0] == token):
+            del self._tokens[key]
+
+        if self.shared:
+            try:
+                redis = get_async_redis_connection()
+                redis_key = f"auth_token:{key}"
+                data = await redis.get(redis_key)
+                if data and (token is None or json.loads(data)[0] == token):
+                    await redis.delete(redis_key)
+            except RedisError as e:
+                logger.warning(f"Erro ao descartar o token {key} no Redis: {str(e)}")
+
+    def forget(self, *upstreams: str):
+        """Descarta os tokens das APIs (ex.: rotação de credenciais)"""
+        prefixes = tuple(f"{upstream}:" for upstream in upstreams)
+        for key in [key for key in self._fetchers if key.startswith(prefixes)]:
+            self._tokens.pop(key, None)
+            self._fetchers.pop(key, None)
+            self._last_used.pop(key, None)
+
+    async def refresh_expiring(self):
+        """Renova os tokens em uso que expiram dentro da margem"""
+        now = time.time()
+        for key in list(self._fetchers):
+            if now - self._last_used.get(key, 0) > AUTH_TOKEN_IDLE_TIMEOUT:
+                continue
+            if self._valid(key, self.refresh_margin):
+                continue
+            try:
+                await self._refresh(key, self.refresh_margin)
+                self.refreshes += 1
+            except Exception as e:
+                # O token atual continua valendo até expirar
+                self.refresh_failures += 1
+                logger.error(f"Erro ao renovar o token {key}: {str(e)}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(AUTH_TOKEN_REFRESH_INTERVAL)
+            await self.refresh_expiring()
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "shared": self.shared,
+            "hits": self.hits,
+            "misses": self.misses,
+            "logins": self.logins,
+            "shared_hits": self.shared_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "tokens": {
+                key: {"expires_in": round(expires_at - now)}
+                for key, (_, expires_at) in self._tokens.items()
+            },
+        }
+
+
+_token_manager: Optional[TokenManager] = None
+_refresher_task: Optional[asyncio.Task] = None
+
+
+def get_token_manager() -> TokenManager:
+    """Retorna o gerenciador de tokens compartilhado pelo processo"""
+    global _token_manager
+    if _token_manager is None:
+        _token_manager = TokenManager()
+    return _token_manager
+
+
+def forget_tokens(*upstreams: str):
+    get_token_manager().forget(*upstreams)
+
+
+async def start_token_refresher():
+    """Inicia a renovação dos tokens em segundo plano"""
+    global _refresher_task
+    if _refresher_task is None or _refresher_task.done():
+        _refresher_task = asyncio.create_task(get_token_manager().run())
+
+
+async def stop_token_refresher():
+    global _refresher_task
+    if _refresher_task:
+        _refresher_task.cancel()
+        await asyncio.gather(_refresher_task, return_exceptions=True)
+        _refresher_task = None
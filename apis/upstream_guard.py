@@ -0,0 +1,323 @@
+from typing import Any, AsyncIterator, Dict, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+import time
+import aiohttp
+from redis.exceptions import RedisError
+from repositories import BANK_CONFIGS, get_config_cache
+from services.inapi.redis_cache import get_async_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Limites padrão de cada banco; sobrescritos por banks.<BANCO>.rate_limit e
+# banks.<BANCO>.circuit_breaker no documento de bank_configs
+DEFAULT_RATE_LIMITS: Dict[str, Dict[str, float]] = {
+    "FACTA": {"rate_per_second": 2, "burst": 2},
+    "VCTEX": {"rate_per_second": 10, "burst": 10},
+}
+DEFAULT_RATE_LIMIT = {"rate_per_second": 5, "burst": 5}
+DEFAULT_CIRCUIT_BREAKER = {"failure_threshold": 5, "reset_timeout": 30}
+
+# Compartilha o balde de cada banco entre workers pelo Redis
+UPSTREAM_RATE_LIMIT_REDIS = (
+    os.getenv("UPSTREAM_RATE_LIMIT_REDIS", "true").lower() == "true"
+)
+# Após um erro no Redis o balde local é usado por este tempo
+REDIS_RETRY_AFTER = 30
+SETTINGS_TTL = 30
+
+# Taxa efetiva reduzida à metade a cada 429 e recuperada aos poucos
+MIN_RATE_FACTOR = 0.1
+RATE_RECOVERY_STEP = 0.05
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Reserva uma ficha no balde (pode ficar negativo) e retorna a espera em segundos
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+local wait = 0
+if tokens < 0 then
+    wait = -tokens / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst / rate + wait) * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class UpstreamUnavailableError(Exception):
+    """Circuito aberto: o banco está falhando e a chamada nem é feita"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(
+            f"{upstream} indisponível (circuito aberto, nova tentativa em "
+            f"{retry_after:.0f}s)"
+        )
+
+
+class TokenBucket:
+    """
+    Balde de fichas por banco. Cada chamada reserva uma ficha e aguarda a
+    vez; com Redis o balde é único para todos os workers.
+    """
+
+    def __init__(self, upstream: str, shared: bool = UPSTREAM_RATE_LIMIT_REDIS):
+        self.upstream = upstream
+        self.shared = shared
+        self.rate_factor = 1.0
+        self._tokens: Optional[float] = None
+        self._updated_at = time.monotonic()
+        self._redis_retry_at = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+
+    def _reserve_local(self, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens = burst if self._tokens is None else self._tokens
+        tokens = min(burst, tokens + (now - self._updated_at) * rate) - 1
+        self._tokens, self._updated_at = tokens, now
+        return -tokens / rate if tokens < 0 else 0.0
+
+    async def _reserve_shared(self, rate: float, burst: float) -> float:
+        redis = get_async_redis_connection()
+        wait = await redis.eval(
+            TOKEN_BUCKET_SCRIPT, 1, f"rate_limit:{self.upstream}", rate, burst
+        )
+        return float(wait)
+
+    async def acquire(self, rate_per_second: float, burst: float):
+        rate = max(rate_per_second * self.rate_factor, 0.01)
+        burst = max(burst, 1)
+
+        wait = None
+        if self.shared and time.monotonic() >= self._redis_retry_at:
+            try:
+                wait = await self._reserve_shared(rate, burst)
+            except RedisError as e:
+                self._redis_retry_at = time.monotonic() + REDIS_RETRY_AFTER
+                logger.warning(
+                    f"Redis indisponível para o limite de {self.upstream}, usando "
+                    f"limite local: {str(e)}"
+                )
+        if wait is None:
+            wait = self._reserve_local(rate, burst)
+
+        if wait > 0:
+            self.waits += 1
+            self.wait_seconds += wait
+            await asyncio.sleep(wait)
+
+    def throttle(self):
+        """429 recebido: reduz a taxa efetiva à metade"""
+        self.throttled += 1
+        self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor / 2)
+        logger.warning(
+            f"Limite de requisições atingido em {self.upstream}, taxa reduzida "
+            f"para {self.rate_factor:.0%}"
+        )
+
+    def recover(self):
+        if self.rate_factor < 1.0:
+            self.rate_factor = min(1.0, self.rate_factor + RATE_RECOVERY_STEP)
+
+
+class CircuitBreaker:
+    """
+    Abre após `failure_threshold` falhas seguidas (erro de conexão, timeout
+    ou 5xx) e rejeita as chamadas por `reset_timeout` segundos. Depois
+    disso uma única chamada de teste decide se o circuito fecha ou reabre.
+    """
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.reset_timeout = DEFAULT_CIRCUIT_BREAKER["reset_timeout"]
+        self.rejected = 0
+        self.trips = 0
+
+    def before_call(self, reset_timeout: float):
+        self.reset_timeout = reset_timeout
+        if self.state == CLOSED:
+            return
+
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == OPEN and elapsed >= reset_timeout:
+            # Esta chamada é o teste; as demais continuam rejeitadas
+            self.state = HALF_OPEN
+            return
+
+        self.rejected += 1
+        raise UpstreamUnavailableError(self.upstream, max(0, reset_timeout - elapsed))
+
+    def release_probe(self):
+        """Chamada de teste interrompida: a próxima chamada testa de novo"""
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+            self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuito de {self.upstream} fechado")
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self, failure_threshold: int):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+                logger.error(
+                    f"Circuito de {self.upstream} aberto após {self.failures} "
+                    f"falhas seguidas"
+                )
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    @property
+    def degraded(self) -> bool:
+        return self.state != CLOSED
+
+
+class UpstreamCall:
+    """Status HTTP da chamada, informado pelo cliente quando não há exceção"""
+
+    def __init__(self):
+        self.status: Optional[int] = None
+
+
+class UpstreamGuard:
+    """
+    Limitador de taxa + circuit breaker de um banco, usado em volta de cada
+    chamada HTTP:
+
+        async with get_upstream_guard("FACTA").call() as call:
+            async with session.get(url) as response:
+                call.status = response.status
+    """
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.bucket = TokenBucket(upstream)
+        self.breaker = CircuitBreaker(upstream)
+        self._settings: Optional[Dict[str, Dict[str, float]]] = None
+        self._settings_loaded_at = 0.0
+        self._pinned = False
+
+    def configure(
+        self,
+        rate_limit: Optional[Dict[str, float]] = None,
+        circuit_breaker: Optional[Dict[str, float]] = None,
+    ):
+        """Fixa os limites, ignorando bank_configs (ex.: benchmarks)"""
+        self._settings = {
+            "rate_limit": {**DEFAULT_RATE_LIMIT, **(rate_limit or {})},
+            "circuit_breaker": {**DEFAULT_CIRCUIT_BREAKER, **(circuit_breaker or {})},
+        }
+        self._pinned = True
+
+    async def settings(self) -> Dict[str, Dict[str, float]]:
+        if not self._pinned and (
+            self._settings is None
+            or time.monotonic() - self._settings_loaded_at >= SETTINGS_TTL
+        ):
+            bank = {}
+            try:
+                config = await get_config_cache().get_async(BANK_CONFIGS)
+                bank = ((config or {}).get("banks") or {}).get(self.upstream) or {}
+            except Exception as e:
+                logger.error(f"Erro ao obter limites de {self.upstream}: {str(e)}")
+            self._settings = {
+                "rate_limit": {
+                    **DEFAULT_RATE_LIMITS.get(self.upstream, DEFAULT_RATE_LIMIT),
+                    **(bank.get("rate_limit") or {}),
+                },
+                "circuit_breaker": {
+                    **DEFAULT_CIRCUIT_BREAKER,
+                    **(bank.get("circuit_breaker") or {}),
+                },
+            }
+            self._settings_loaded_at = time.monotonic()
+        return self._settings
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[UpstreamCall]:
+        settings = await self.settings()
+        self.breaker.before_call(settings["circuit_breaker"]["reset_timeout"])
+        call = UpstreamCall()
+        try:
+            await self.bucket.acquire(**settings["rate_limit"])
+            yield call
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            self._record(True, None)
+            raise
+        except Exception as e:
+            self._record(False, getattr(e, "status", None) or call.status)
+            raise
+        except BaseException:
+            # Cancelada (ex.: prazo da simulação): não conta, mas libera o teste
+            self.breaker.release_probe()
+            raise
+        else:
+            self._record(False, call.status)
+
+    def _record(self, call_failed: bool, status: Optional[int]):
+        settings = self._settings or {}
+        failure_threshold = settings.get("circuit_breaker", DEFAULT_CIRCUIT_BREAKER)[
+            "failure_threshold"
+        ]
+        if call_failed or (status is not None and status >= 500):
+            self.breaker.record_failure(failure_threshold)
+        elif status == 429:
+            self.bucket.throttle()
+        else:
+            self.breaker.record_success()
+            self.bucket.recover()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "trips": self.breaker.trips,
+            "rejected": self.breaker.rejected,
+            "rate_factor": self.bucket.rate_factor,
+            "rate_limited_waits": self.bucket.waits,
+            "rate_limited_wait_seconds": round(self.bucket.wait_seconds, 3),
+            "throttled": self.bucket.throttled,
+            "settings": self._settings,
+        }
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+
+
+def get_upstream_guard(upstream: str) -> UpstreamGuard:
+    """Retorna o limitador/circuit breaker compartilhado do banco"""
+    if upstream not in _guards:
+        _guards[upstream] = UpstreamGuard(upstream)
+    return _guards[upstream]
+
+
+def is_upstream_degraded(upstream: str) -> bool:
+    guard = _guards.get(upstream)
+    return guard is not None and guard.breaker.degraded
+
+
+def get_upstream_guard_metrics() -> Dict[str, Dict[str, Any]]:
+    """Estado do circuito e do limitador de cada banco"""
+    return {name: guard.metrics() for name, guard in _guards.items()}
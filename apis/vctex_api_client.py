@@ -1,18 +1,26 @@
 import aiohttp
-from typing import Any, Dict
+import functools
+from typing import Any, Dict, Tuple
 import os
 from urllib.parse import urljoin
 from dotenv import load_dotenv
 from apis.helpers import format_simulation_response, format_proposal_response
 import json
 import traceback
-from datetime import datetime, timedelta
-from tenacity import retry, stop_after_attempt, wait_exponential
-from cachetools import TTLCache
+from tenacity import (
+    retry,
+    retry_if_not_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
 import structlog
-from aiohttp import TCPConnector, ClientTimeout
+from aiohttp import ClientTimeout
 import ssl
-from utils.api_credentials import get_credential
+from utils.api_credentials import get_credential, on_credentials_rotated
+from .single_flight import single_flight
+from .http_clients import get_http_session
+from .token_manager import forget_tokens, get_token_manager, token_key
+from .upstream_guard import UpstreamUnavailableError, get_upstream_guard
 
 load_dotenv()
 
@@ -24,94 +32,53 @@ structlog.configure(
 )
 logger = structlog.get_logger()
 
-session_cache = TTLCache(maxsize=100, ttl=7200)
+VCTEX = "VCTEX"
+
+# Token da VCTEX vale 2h; renovado antes pelo gerenciador de tokens
+VCTEX_TOKEN_TTL = 115 * 60
+
+# Token obtido com credenciais antigas não é mais reaproveitado
+on_credentials_rotated(VCTEX, functools.partial(forget_tokens, "vctex"))
 
 
 class VCTEXAPIClient:
     def __init__(self):
         self.proxy = True
         self.token = None
-        self.token_expiration = None
+        self.token_key = None
         self.proxy_url = os.getenv("PROXY_URL")
         self.base_url = os.getenv("VCTEX_API_URL")
         self.session = None
         self.timeout = ClientTimeout(total=90)
 
     async def start_session(self):
-        """Inicia uma nova sessão HTTP com configurações otimizadas."""
+        """Usa a sessão HTTP compartilhada (pool de conexões) da VCTEX."""
         if self.session is None or self.session.closed:
-            connector = TCPConnector(
-                ssl=False,
-                limit=100,  # Limite de conexões simultâneas
-                ttl_dns_cache=300,  # Cache DNS por 5 minutos
-            )
-            self.session = aiohttp.ClientSession(
-                connector=connector,
-                timeout=self.timeout,
-                headers={
-                    "User-Agent": "VCTEX-Client/1.0",
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                },
-            )
-            logger.info("session_created", status="success")
+            self.session = get_http_session("vctex")
 
     async def close_session(self):
-        """Fecha a sessão HTTP de forma segura."""
-        if self.session and not self.session.closed:
-            await self.session.close()
-            logger.info("session_closed", status="success")
-
-    def _is_token_expired(self) -> bool:
-        """Verifica se o token atual está expirado."""
-        if not self.token_expiration:
-            return True
-        return datetime.now() >= self.token_expiration
+        """O pool é compartilhado e fechado pelo registro no desligamento."""
 
     @retry(
+        retry=retry_if_not_exception_type(UpstreamUnavailableError),
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
         reraise=True,
     )
     async def authenticate(self) -> str:
         """
-        Autentica na API com retry automático e cache.
+        Obtém o token de acesso compartilhado (login só quando necessário).
         Retorna o token de acesso.
         """
         try:
-            # Verificar cache primeiro
-            cached_token = session_cache.get("auth_token")
-            if cached_token and not self._is_token_expired():
-                return cached_token
-
             cpf = get_credential("VCTEX_USER")
             password = get_credential("VCTEX_PASSWORD")
             if not cpf or not password:
                 raise ValueError("Credenciais não configuradas (CPF/PASSWORD)")
 
-            await self.start_session()
-            response = await self._request(
-                "POST",
-                "authentication/login",
-                {"cpf": cpf, "password": password},
-                retry_auth=False,
-            )
-
-            if "token" not in response or "accessToken" not in response.get(
-                "token", {}
-            ):
-                raise ValueError(f"Resposta de autenticação inválida: {response}")
-
-            self.token = response["token"]["accessToken"]
-            self.token_expiration = datetime.now() + timedelta(
-                minutes=115
-            )  # 5 min buffer
-
-            # Atualizar cache
-            session_cache["auth_token"] = self.token
-
-            logger.info(
-                "authentication_success", expiration=self.token_expiration.isoformat()
+            self.token_key = token_key("vctex", self.base_url, cpf, password)
+            self.token = await get_token_manager().get_token(
+                self.token_key, functools.partial(self._login, cpf, password)
             )
             return self.token
 
@@ -121,8 +88,28 @@ class VCTEXAPIClient:
             )
             raise
 
+    @classmethod
+    async def _login(cls, cpf: str, password: str) -> Tuple[str, float]:
+        """Login na VCTEX: retorna o token e a validade em segundos."""
+        client = cls()
+        await client.start_session()
+        response = await client._request(
+            "POST",
+            "authentication/login",
+            {"cpf": cpf, "password": password},
+            retry_auth=False,
+        )
+
+        if "token" not in response or "accessToken" not in response.get("token", {}):
+            raise ValueError(f"Resposta de autenticação inválida: {response}")
+
+        logger.info("authentication_success", expires_in=VCTEX_TOKEN_TTL)
+        return response["token"]["accessToken"], VCTEX_TOKEN_TTL
+
     @retry(
-        stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10)
+        retry=retry_if_not_exception_type(UpstreamUnavailableError),
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
     )
     async def _request(
         self,
@@ -135,53 +122,65 @@ class VCTEXAPIClient:
         url = urljoin(self.base_url, endpoint)
         headers = headers or {}
 
-        if self.token:
-            headers["Authorization"] = f"Bearer {self.token}"
-
         if not self.session or self.session.closed:
             await self.start_session()
 
         try:
+            # Token compartilhado: evita a ida e volta de um 401 na primeira chamada
+            if retry_auth and not self.token:
+                await self.authenticate()
+
+            if self.token:
+                headers["Authorization"] = f"Bearer {self.token}"
+
             # Configurar SSL para o proxy HTTPS
             ssl_context = ssl.create_default_context()
             ssl_context.check_hostname = False
             ssl_context.verify_mode = ssl.CERT_NONE
 
-            async with self.session.request(
-                method,
-                url,
-                json=data,
-                headers=headers,
-                proxy=self.proxy_url if self.proxy else None,
-                timeout=self.timeout,
-                ssl=ssl_context if self.proxy else None,
-            ) as response:
-                response_text = await response.text()
-                logger.info(
-                    "api_request",
-                    method=method,
-                    endpoint=endpoint,
-                    status_code=response.status,
-                )
-
-                try:
-                    response_json = json.loads(response_text)
-                except json.JSONDecodeError:
-                    response_json = {"message": response_text}
-
-                if response.status == 401 and retry_auth:
-                    self.token = None
-                    await self.authenticate()
-                    return await self._request(method, endpoint, data, headers, False)
-
-                return response_json
-
+            async with get_upstream_guard(VCTEX).call() as call:
+                async with self.session.request(
+                    method,
+                    url,
+                    json=data,
+                    headers=headers,
+                    proxy=self.proxy_url if self.proxy else None,
+                    timeout=self.timeout,
+                    ssl=ssl_context if self.proxy else None,
+                ) as response:
+                    call.status = response.status
+                    response_text = await response.text()
+                    logger.info(
+                        "api_request",
+                        method=method,
+                        endpoint=endpoint,
+                        status_code=response.status,
+                    )
+
+                    try:
+                        response_json = json.loads(response_text)
+                    except json.JSONDecodeError:
+                        response_json = {"message": response_text}
+
+            if response.status == 401 and retry_auth:
+                if self.token_key:
+                    await get_token_manager().invalidate(self.token_key, self.token)
+                self.token = None
+                await self.authenticate()
+                return await self._request(method, endpoint, data, headers, False)
+
+            return response_json
+
+        except UpstreamUnavailableError:
+            # Banco fora do ar: falha imediata, sem retries
+            raise
         except Exception as e:
             logger.error(
                 "request_error", error=str(e), traceback=traceback.format_exc()
             )
             return {"message": str(e), "statusCode": 500}
 
+    @single_flight("vctex.simulation")
     async def simulate_credit(self, data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             await self.authenticate()
@@ -206,6 +205,7 @@ class VCTEXAPIClient:
             logger.error(f"Error in simulation: {str(e)}")
             return {"message": str(e), "statusCode": 500}
 
+    @single_flight("vctex.simulation_installments")
     async def simulate_credit_by_installments(
         self, data: Dict[str, Any]
     ) -> Dict[str, Any]:
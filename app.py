@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
@@ -22,15 +24,66 @@ from services.simulations.batch_router import router as batch_simulation_router
 from services.bank_config.router import router as bank_config_router
 from services.table_config.router import router as table_config_router
 from services.api_credentials.router import router as api_credentials_router
+from apis.http_clients import close_http_clients, get_http_client_registry
+from apis.upstream_guard import get_upstream_guard_metrics
+from apis.token_manager import (
+    get_token_manager,
+    start_token_refresher,
+    stop_token_refresher,
+)
+from services.inapi.redis_cache import close_async_redis_pool
+from utils.mongo import close_mongo_clients, get_mongo_pool_metrics, start_mongo_clients
+from services.sessions.cpf_backfill import ensure_cpf_index
+from services.sessions.message_migration import ensure_session_message_indexes
+from memory import MongoDBMemoryManager
+from repositories import get_config_cache, start_config_watcher, stop_config_watcher
+from services.simulations.batch_jobs import (
+    start_batch_job_runner,
+    stop_batch_job_runner,
+)
+from services.chat.service import (
+    start_chat_stats_refresher,
+    stop_chat_stats_refresher,
+)
 
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_mongo_clients()
+    try:
+        await asyncio.to_thread(ensure_cpf_index, MongoDBMemoryManager().collection)
+    except Exception as e:
+        logger.error(f"Erro ao criar índice de CPF das sessões: {str(e)}")
+    try:
+        await asyncio.to_thread(
+            ensure_session_message_indexes, MongoDBMemoryManager().db
+        )
+    except Exception as e:
+        logger.error(f"Erro ao criar índice das mensagens das sessões: {str(e)}")
+    await start_config_watcher()
+    app.state.http_clients = get_http_client_registry()
+    await start_token_refresher()
+    await start_batch_job_runner()
+    await start_chat_stats_refresher()
+    yield
+    await stop_chat_stats_refresher()
+    await stop_batch_job_runner()
+    await stop_token_refresher()
+    await stop_config_watcher()
+    await close_http_clients()
+    await close_async_redis_pool()
+    close_mongo_clients()
+
+
 app = FastAPI(
     title="DECOTECH API FGTS",
     version="1.0",
     description="Decotech System.",
+    lifespan=lifespan,
 )
 
 
@@ -81,5 +134,30 @@ app.include_router(bank_config_router)
 app.include_router(table_config_router)
 app.include_router(api_credentials_router)
 
+
+@app.get("/metrics/mongo-pool")
+async def mongo_pool_metrics():
+    """Uso dos pools de conexões MongoDB (sync e Motor) deste processo"""
+    return get_mongo_pool_metrics()
+
+
+@app.get("/metrics/config-cache")
+async def config_cache_metrics():
+    """Acertos, invalidações e estado do change stream do cache de configurações"""
+    return get_config_cache().metrics()
+
+
+@app.get("/metrics/auth-tokens")
+async def auth_token_metrics():
+    """Logins, acertos e validade dos tokens das APIs dos bancos"""
+    return get_token_manager().metrics()
+
+
+@app.get("/metrics/upstreams")
+async def upstream_metrics():
+    """Circuit breaker e limite de taxa de cada banco"""
+    return get_upstream_guard_metrics()
+
+
 if __name__ == "__main__":
     uvicorn.run("app:app", host="0.0.0.0", port=8002, reload=True)
@@ -0,0 +1,189 @@
+"""
+Teste de carga da listagem de clientes (GET /customers) em um único worker,
+comparando o acesso anterior (pymongo síncrono dentro do handler async) com
+o repositório assíncrono (Motor).
+
+Precisa de um MongoDB real em MONGODB_URL; os dados ficam em um banco
+separado (--database) que é removido ao final:
+
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.async_mongo_load \\
+        --requests 500 --concurrency 50
+
+Enquanto a carga roda, um endpoint sem I/O (/health) é consultado em
+paralelo: a latência dele mostra o bloqueio do event loop (head-of-line).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+import httpx
+from fastapi import FastAPI, Query
+from pymongo import MongoClient
+from repositories import SessionRepository
+from services.customer.service import CustomerService
+from utils.mongo import close_mongo_clients, get_async_mongo_client
+
+PAGE_SIZE = 20
+
+
+def seed(collection, sessions: int, messages: int):
+    collection.drop()
+    now = datetime.now(timezone.utc)
+    collection.insert_many(
+        [
+            {
+                "session_id": f"55119{i:08d}",
+                "customer_data": {
+                    "customer_info": {
+                        "name": f"Cliente {i}",
+                        "cpf": f"{i:011d}",
+                    }
+                },
+                "messages": [
+                    {"type": "human", "data": {"content": f"mensagem {j}"}}
+                    for j in range(messages)
+                ],
+                "created_at": now,
+                "last_updated": now,
+            }
+            for i in range(sessions)
+        ]
+    )
+
+
+def build_app(database: str, sync_client: MongoClient) -> FastAPI:
+    repository_class = type(
+        "BenchmarkSessionRepository", (SessionRepository,), {"database": database}
+    )
+    legacy_collection = sync_client[database]["sessions"]
+    service = CustomerService(repository_class(get_async_mongo_client()))
+
+    app = FastAPI()
+
+    @app.get("/legacy/customers")
+    async def legacy_customers(skip: int = Query(0)):
+        # Comportamento anterior: chamadas bloqueantes dentro do handler async
+        query = {"customer_data": {"$exists": True}}
+        total = legacy_collection.count_documents(query)
+        items = list(legacy_collection.find(query).skip(skip).limit(PAGE_SIZE))
+        return {"total": total, "items": len(items)}
+
+    @app.get("/customers")
+    async def customers(skip: int = Query(0)):
+        result = await service.get_customers(skip, PAGE_SIZE)
+        return {"total": result["total"], "items": len(result["items"])}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def percentile(values: List[float], p: float) -> float:
+    return values[max(0, int(len(values) * p) - 1)]
+
+
+async def run_mode(
+    client: httpx.AsyncClient,
+    path: str,
+    requests: int,
+    concurrency: int,
+    sessions: int,
+) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    health: List[float] = []
+    done = asyncio.Event()
+
+    async def call(i: int):
+        async with semaphore:
+            started_at = time.perf_counter()
+            skip = (i * PAGE_SIZE) % max(sessions - PAGE_SIZE, 1)
+            response = await client.get(path, params={"skip": skip})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started_at) * 1000)
+
+    async def probe():
+        while not done.is_set():
+            started_at = time.perf_counter()
+            await client.get("/health")
+            health.append((time.perf_counter() - started_at) * 1000)
+            await asyncio.sleep(0.005)
+
+    await client.get(path)  # conexões do pool fora da medição
+    probe_task = asyncio.create_task(probe())
+    started_at = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started_at
+    done.set()
+    await probe_task
+
+    latencies.sort()
+    health.sort()
+    return {
+        "mode": path,
+        "throughput": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "health_p95_ms": percentile(health, 0.95) if health else 0.0,
+    }
+
+
+async def main(
+    requests: int, concurrency: int, sessions: int, messages: int, database: str
+):
+    sync_client = MongoClient(os.getenv("MONGODB_URL"), maxPoolSize=concurrency)
+    seed(sync_client[database]["sessions"], sessions, messages)
+
+    transport = httpx.ASGITransport(app=build_app(database, sync_client))
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+        results = [
+            await run_mode(client, path, requests, concurrency, sessions)
+            for path in ("/legacy/customers", "/customers")
+        ]
+
+    sync_client.drop_database(database)
+    sync_client.close()
+    close_mongo_clients()
+
+    print(
+        f"{requests} requisições, concorrência {concurrency}, "
+        f"{sessions} sessões com {messages} mensagens"
+    )
+    print(f"{'modo':<20}{'req/s':>10}{'p50':>10}{'p95':>10}{'health p95':>12}")
+    for r in results:
+        print(
+            f"{r['mode']:<20}{r['throughput']:>10.1f}{r['p50_ms']:>8.2f}ms"
+            f"{r['p95_ms']:>8.2f}ms{r['health_p95_ms']:>10.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--database", default="fgts_agent_benchmark")
+    args = parser.parse_args()
+
+    if not os.getenv("MONGODB_URL"):
+        parser.error("defina MONGODB_URL apontando para um MongoDB de teste")
+
+    logging.disable(logging.INFO)
+    asyncio.run(
+        main(
+            max(1, args.requests),
+            max(1, args.concurrency),
+            max(PAGE_SIZE + 1, args.sessions),
+            args.messages,
+            args.database,
+        )
+    )
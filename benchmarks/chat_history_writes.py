@@ -0,0 +1,193 @@
+"""
+Benchmark da amplificação de escrita do histórico de chat em conversas
+longas: gravação anterior (relê a sessão e regrava o array `messages`
+inteiro com $set a cada mensagem), histórico append-only na sessão
+($push/$each com a pergunta e a resposta de cada troca) e baldes de
+tamanho fixo em session_messages (a sessão guarda só o resumo).
+
+Precisa de um MongoDB real em MONGODB_URL; os dados ficam em um banco
+separado (--database) que é removido ao final:
+
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.chat_history_writes \\
+        --turns 300 --message-size 400
+
+Os bytes são medidos pelos comandos enviados ao servidor e pelas respostas
+recebidas (monitoramento de comandos do pymongo).
+"""
+
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Sequence
+import bson
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    message_to_dict,
+)
+from pymongo import MongoClient, monitoring
+from memory.mongodb_memory_manager import MongoDBChatMessageHistory
+from utils.session_messages import SESSION_MESSAGES
+
+
+class LegacyChatMessageHistory(MongoDBChatMessageHistory):
+    """Comportamento anterior: relê e regrava todas as mensagens"""
+
+    def add_message(self, message: BaseMessage) -> None:
+        messages = self.messages
+        messages.append(message)
+        self.collection.update_one(
+            {"session_id": self.session_id},
+            {
+                "$set": {
+                    "messages": [message_to_dict(msg) for msg in messages],
+                    "last_updated": datetime.utcnow(),
+                }
+            },
+            upsert=True,
+        )
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        for message in messages:
+            self.add_message(message)
+
+
+class InlinePushChatMessageHistory(MongoDBChatMessageHistory):
+    """Mensagens no array `messages` da sessão, acrescentadas com $push"""
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        timestamp = datetime.utcnow()
+        self.collection.update_one(
+            {"session_id": self.session_id},
+            {
+                "$push": {
+                    "messages": {
+                        "$each": [
+                            {**message_to_dict(message), "timestamp": timestamp}
+                            for message in messages
+                        ]
+                    }
+                },
+                "$set": {"last_updated": timestamp},
+            },
+            upsert=True,
+        )
+
+
+class ByteCounter(monitoring.CommandListener):
+    """Bytes (BSON) enviados e recebidos nos comandos de leitura e escrita"""
+
+    COMMANDS = ("find", "update", "findAndModify")
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+
+    def started(self, event):
+        if event.command_name in self.COMMANDS:
+            self.sent += len(bson.encode(event.command))
+
+    def succeeded(self, event):
+        if event.command_name in self.COMMANDS:
+            self.received += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def run_mode(
+    name: str,
+    history: MongoDBChatMessageHistory,
+    counter: ByteCounter,
+    turns: int,
+    message_size: int,
+) -> Dict[str, float]:
+    history.clear()
+    counter.sent = counter.received = 0
+    content = "x" * message_size
+
+    last_turn_bytes = 0
+    started_at = time.perf_counter()
+    for turn in range(turns):
+        before = counter.sent + counter.received
+        history.add_messages(
+            [
+                HumanMessage(content=f"{turn} {content}"),
+                AIMessage(content=f"{turn} {content}"),
+            ]
+        )
+        last_turn_bytes = counter.sent + counter.received - before
+    elapsed = time.perf_counter() - started_at
+
+    session = history.collection.find_one({"session_id": history.session_id})
+    session_bytes = len(bson.encode(session))
+    stored_bytes = session_bytes + sum(
+        len(bson.encode(bucket))
+        for bucket in history.messages_collection.find(
+            {"session_id": history.session_id}
+        )
+    )
+    return {
+        "mode": name,
+        "seconds": elapsed,
+        "sent_mb": counter.sent / 1024 / 1024,
+        "received_mb": counter.received / 1024 / 1024,
+        "last_turn_kb": last_turn_bytes / 1024,
+        "session_kb": session_bytes / 1024,
+        "amplification": (counter.sent + counter.received) / stored_bytes,
+    }
+
+
+def main(turns: int, message_size: int, database: str):
+    counter = ByteCounter()
+    client = MongoClient(os.getenv("MONGODB_URL"), event_listeners=[counter])
+    collection = client[database]["sessions"]
+    messages_collection = client[database][SESSION_MESSAGES]
+    collection.drop()
+    messages_collection.drop()
+
+    results: List[Dict[str, float]] = []
+    for name, history_class in (
+        ("$set (anterior)", LegacyChatMessageHistory),
+        ("$push na sessão", InlinePushChatMessageHistory),
+        ("baldes", MongoDBChatMessageHistory),
+    ):
+        history = history_class(f"benchmark-{history_class.__name__}", client)
+        history.collection = collection
+        history.messages_collection = messages_collection
+        results.append(run_mode(name, history, counter, turns, message_size))
+
+    client.drop_database(database)
+    client.close()
+
+    print(
+        f"{turns} trocas (pergunta + resposta) de {message_size} bytes, "
+        f"{turns * 2} mensagens por conversa"
+    )
+    print(
+        f"{'modo':<18}{'tempo':>9}{'enviado':>11}{'recebido':>11}"
+        f"{'última troca':>14}{'sessão':>11}{'amplificação':>14}"
+    )
+    for r in results:
+        print(
+            f"{r['mode']:<18}{r['seconds']:>8.2f}s{r['sent_mb']:>9.2f}MB"
+            f"{r['received_mb']:>9.2f}MB{r['last_turn_kb']:>12.1f}KB"
+            f"{r['session_kb']:>9.1f}KB{r['amplification']:>13.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--message-size", type=int, default=400)
+    parser.add_argument("--database", default="fgts_agent_benchmark")
+    args = parser.parse_args()
+
+    if not os.getenv("MONGODB_URL"):
+        parser.error("defina MONGODB_URL apontando para um MongoDB de teste")
+
+    logging.disable(logging.INFO)
+    main(max(1, args.turns), max(1, args.message_size), args.database)
@@ -0,0 +1,193 @@
+"""
+Benchmark da latência por simulação FACTA (base offline -> saldo -> cálculo)
+com uma sessão HTTP nova por chamada (comportamento anterior) e com o pool
+de conexões compartilhado.
+
+Por padrão sobe um servidor local que imita os endpoints da FACTA:
+
+    python -m benchmarks.facta_session_pool --simulations 200 --tls
+
+Com --tls o servidor usa HTTPS (certificado autoassinado gerado com o
+openssl), o que inclui o custo do handshake TLS evitado pelo keep-alive.
+--latency-ms adiciona um atraso fixo em cada resposta do servidor.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import ssl
+import tempfile
+import time
+from typing import Dict, List, Optional
+import aiohttp
+from aiohttp import web
+import apis.facta_api_client as facta_api_client
+from apis.facta_api_client import FactaApi
+from apis.http_clients import close_http_clients
+from apis.upstream_guard import get_upstream_guard
+
+CPF = "12345678901"
+
+
+class PerCallSessionFactaApi(FactaApi):
+    """Comportamento anterior: sessão (e conexão) nova em cada chamada"""
+
+    async def start_session(self) -> None:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ssl=False)
+            )
+
+    async def close_session(self) -> None:
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+def build_mock_app(latency_ms: float, connections: set) -> web.Application:
+    async def respond(request: web.Request, data: Dict) -> web.Response:
+        connections.add(request.transport.get_extra_info("peername"))
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        return web.json_response(data)
+
+    async def token(request):
+        return await respond(request, {"erro": False, "token": "token"})
+
+    async def base_offline(request):
+        return await respond(request, {"erro": False, "mensagem": "CPF autorizado"})
+
+    async def saldo(request):
+        retorno = {f"valor_{i}": "100.00" for i in range(1, 11)}
+        return await respond(request, {"erro": False, "retorno": retorno})
+
+    async def calculo(request):
+        return await respond(request, {"erro": False, "valor_liquido": "850,00"})
+
+    app = web.Application()
+    for prefix in ("/main", "/offline"):
+        app.router.add_get(f"{prefix}/gera-token", token)
+    app.router.add_get("/offline/fgts/base-offline", base_offline)
+    app.router.add_get("/main/fgts/saldo", saldo)
+    app.router.add_post("/main/fgts/calculo", calculo)
+    return app
+
+
+def build_ssl_context(directory: str) -> ssl.SSLContext:
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-keyout",
+            key,
+            "-out",
+            cert,
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+async def simulate_once(api: FactaApi) -> float:
+    """Uma simulação completa, como em FactaBankSimulator.simulate"""
+    started_at = time.perf_counter()
+    await api.consultar_base_offline(CPF)
+    await api.close_session()
+    saldo = await api.consultar_saldo_fgts(CPF)
+    await api.close_session()
+    await api.simular_valor_fgts(
+        CPF, api.criar_payload_parcelas(saldo), taxa="1.8", tabela="57851"
+    )
+    await api.close_session()
+    return (time.perf_counter() - started_at) * 1000
+
+
+async def run_mode(
+    name: str, api: FactaApi, simulations: int, connections: set
+) -> Dict[str, float]:
+    connections.clear()
+    await simulate_once(api)  # autenticação fora da medição
+    connections.clear()
+
+    latencies: List[float] = [await simulate_once(api) for _ in range(simulations)]
+    latencies.sort()
+    return {
+        "mode": name,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "connections": len(connections),
+    }
+
+
+async def main(simulations: int, latency_ms: float, tls: bool):
+    connections: set = set()
+    runner = web.AppRunner(build_mock_app(latency_ms, connections))
+    await runner.setup()
+
+    with tempfile.TemporaryDirectory() as directory:
+        ssl_context: Optional[ssl.SSLContext] = (
+            build_ssl_context(directory) if tls else None
+        )
+        site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=ssl_context)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        scheme = "https" if tls else "http"
+        os.environ["FACTA_BASE_URL"] = f"{scheme}://127.0.0.1:{port}/main"
+        os.environ["FACTA_OFFLINE_URL"] = f"{scheme}://127.0.0.1:{port}/offline"
+
+        # Credenciais fictícias: o servidor local não valida o login
+        facta_api_client.get_credential = lambda key, default=None: "benchmark"
+        # Sem MongoDB/Redis: limite local alto para medir apenas o pool HTTP
+        facta_guard = get_upstream_guard("FACTA")
+        facta_guard.configure(rate_limit={"rate_per_second": 10000, "burst": 10000})
+        facta_guard.bucket.shared = False
+
+        results = [
+            await run_mode(
+                "sessão por chamada",
+                PerCallSessionFactaApi(),
+                simulations,
+                connections,
+            ),
+            await run_mode("pool compartilhado", FactaApi(), simulations, connections),
+        ]
+        await close_http_clients()
+        await runner.cleanup()
+
+    print(
+        f"{simulations} simulações, {scheme.upper()}, latência do servidor {latency_ms}ms"
+    )
+    print(f"{'modo':<22}{'média':>10}{'p50':>10}{'p95':>10}{'conexões':>10}")
+    for r in results:
+        print(
+            f"{r['mode']:<22}{r['mean_ms']:>8.2f}ms{r['p50_ms']:>8.2f}ms"
+            f"{r['p95_ms']:>8.2f}ms{r['connections']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--simulations", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    asyncio.run(main(max(1, args.simulations), args.latency_ms, args.tls))
@@ -1,7 +1,8 @@
-import os
 import logging
-from typing import List, Dict, Any
-from pymongo import MongoClient
+import os
+from typing import Callable, List, Dict, Any, Optional, Sequence, Tuple
+import tiktoken
+from pymongo import MongoClient, ReturnDocument
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.memory import BaseMemory
 from langchain_core.messages import (
@@ -10,109 +11,385 @@ from langchain_core.messages import (
     messages_from_dict,
     HumanMessage,
     AIMessage,
+    SystemMessage,
 )
-import pytz
 from datetime import datetime
 from pydantic import Field
+from utils.cpf import CPF_PROJECTION, cpf_normalized_update, touches_cpf
+from utils.mongo import get_mongo_client
+from utils.session_messages import (
+    LAST_MESSAGE_AT_FIELD,
+    LAST_MESSAGE_PREVIEW_FIELD,
+    MESSAGE_COUNT_FIELD,
+    MESSAGE_ROLLUPS,
+    SESSION_MESSAGES,
+    bucket_of,
+    bucket_operations,
+    join_buckets,
+    last_message_fields,
+    message_type_and_content,
+    rollup_update,
+)
 
 logging.basicConfig(level=logging.INFO)
 logging.getLogger("pymongo").setLevel(logging.WARNING)
 logging.getLogger("mongodb").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Janela do histórico enviada ao LLM: últimas N mensagens e/ou até N tokens
+# (0 desativa o limite; os dois em 0 carregam o histórico completo). As
+# mensagens que saem da janela entram no resumo gravado na sessão.
+MEMORY_WINDOW_MESSAGES = int(os.getenv("MEMORY_WINDOW_MESSAGES", "20"))
+MEMORY_WINDOW_TOKENS = int(os.getenv("MEMORY_WINDOW_TOKENS", "2000"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "500"))
+MEMORY_TOKEN_ENCODING = os.getenv("MEMORY_TOKEN_ENCODING", "cl100k_base")
+SUMMARY_FIELD = "conversation_summary"
+SUMMARY_LINE_LENGTH = 300
+SUMMARY_PREFIX = "Resumo da conversa anterior:\n"
+
+# Recebe o resumo atual e as mensagens que saíram da janela; retorna o novo resumo
+Summarizer = Callable[[str, List[BaseMessage]], str]
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens do texto (tiktoken); sem o encoding disponível, estima por caracteres"""
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding(MEMORY_TOKEN_ENCODING)
+        except Exception as e:
+            logger.warning(
+                f"Encoding {MEMORY_TOKEN_ENCODING} indisponível, estimando tokens "
+                f"por caracteres: {e}"
+            )
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    _, content = message_type_and_content(message)
+    return count_tokens(str(content or ""))
+
+
+def _context_line(message: BaseMessage) -> str:
+    if isinstance(message, SystemMessage):
+        return message.content
+    if isinstance(message, HumanMessage):
+        return f"User: {message.content}"
+    return f"Assistant: {message.content}"
+
+
+def extractive_summarizer(summary: str, messages: List[BaseMessage]) -> str:
+    """
+    Resumo padrão, sem LLM: acrescenta ao resumo as mensagens que saíram da
+    janela (truncadas) e descarta as linhas mais antigas acima de
+    MEMORY_SUMMARY_TOKENS. Um resumidor com LLM pode ser passado em
+    `MongoMemory(summarizer=...)`.
+    """
+    lines = summary.splitlines() if summary else []
+    lines += [
+        _context_line(message)[:SUMMARY_LINE_LENGTH].replace("\n", " ")
+        for message in messages
+    ]
+    tokens = [count_tokens(line) for line in lines]
+    total = sum(tokens)
+    while len(lines) > 1 and total > MEMORY_SUMMARY_TOKENS:
+        total -= tokens.pop(0)
+        lines.pop(0)
+    return "\n".join(lines)
+
 
 class MongoDBChatMessageHistory(BaseChatMessageHistory):
-    def __init__(self, session_id: str, connection_string: str):
+    """
+    Histórico do chat em baldes de tamanho fixo na coleção session_messages.
+
+    A sessão guarda apenas o contador `message_count` e o resumo da última
+    mensagem (`last_message_at`, `last_message_preview`), então as consultas
+    de sessões não carregam a conversa. Mensagens de sessões ainda não
+    migradas (array `messages` na sessão) continuam sendo lidas antes das
+    mensagens dos baldes.
+    """
+
+    def __init__(self, session_id: str, client: Optional[MongoClient] = None):
         self.session_id = session_id
-        self.client = MongoClient(connection_string)
+        self.client = client or get_mongo_client()
         self.db = self.client["fgts_agent"]
         self.collection = self.db["sessions"]
+        self.messages_collection = self.db[SESSION_MESSAGES]
+        self.rollups_collection = self.db[MESSAGE_ROLLUPS]
 
     @property
     def messages(self) -> List[BaseMessage]:
-        session_data = self.collection.find_one({"session_id": self.session_id})
-        if not session_data:
-            return []
-        return messages_from_dict(session_data.get("messages", []))
+        session_data = self.collection.find_one(
+            {"session_id": self.session_id}, {"_id": 0, "messages": 1}
+        )
+        buckets = self.messages_collection.find(
+            {"session_id": self.session_id}, {"_id": 0, "bucket": 1, "messages": 1}
+        )
+        return messages_from_dict(
+            join_buckets((session_data or {}).get("messages"), list(buckets))
+        )
 
-    def add_message(self, message: BaseMessage) -> None:
-        messages = self.messages
-        messages.append(message)
-        messages_dict = [message_to_dict(msg) for msg in messages]
+    def window(
+        self, max_messages: int = 0, max_tokens: int = 0
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Últimas mensagens (em ordem) limitadas por quantidade e/ou tokens,
+        junto com o resumo da sessão. Lê os baldes do mais novo para o mais
+        antigo com projeção `$slice`, parando assim que a janela enche.
+        """
+        sliced = {"$slice": -max_messages} if max_messages else 1
+        session = (
+            self.collection.find_one(
+                {"session_id": self.session_id},
+                {"_id": 0, SUMMARY_FIELD: 1, "messages": sliced},
+            )
+            or {}
+        )
+
+        newest_first: List[Dict[str, Any]] = []
+        tokens = 0
+
+        def take(messages: List[Dict[str, Any]]) -> bool:
+            nonlocal tokens
+            for message in reversed(messages):
+                if max_messages and len(newest_first) >= max_messages:
+                    return False
+                size = message_tokens(message) if max_tokens else 0
+                if max_tokens and newest_first and tokens + size > max_tokens:
+                    return False
+                newest_first.append(message)
+                tokens += size
+            return True
+
+        cursor = (
+            self.messages_collection.find(
+                {"session_id": self.session_id}, {"_id": 0, "messages": sliced}
+            )
+            .sort("bucket", -1)
+            .batch_size(2)
+        )
+        try:
+            full = not all(take(bucket.get("messages", [])) for bucket in cursor)
+        finally:
+            cursor.close()
+        # Sessão ainda não migrada: mensagens anteriores aos baldes
+        if not full:
+            take(session.get("messages") or [])
+
+        return newest_first[::-1], session.get(SUMMARY_FIELD)
+
+    def update_summary(
+        self,
+        window: List[Dict[str, Any]],
+        summary: Optional[Dict[str, Any]],
+        summarizer: Summarizer,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Acrescenta ao resumo as mensagens anteriores à janela que ele ainda
+        não cobre. Só as mensagens que saíram da janela desde o último
+        resumo são carregadas, e a gravação é condicional para que duas
+        atualizações concorrentes não resumam o mesmo trecho duas vezes.
+        """
+        if not window or "seq" not in window[0]:
+            return summary
 
-        brazil_tz = pytz.timezone("America/Sao_Paulo")
-        timestamp = datetime.now(brazil_tz)
+        start = window[0]["seq"]
+        through = (summary or {}).get("seq")
+        if through is not None and through >= start - 1:
+            return summary
 
+        buckets: Dict[str, Any] = {"$lte": bucket_of(start - 1)}
+        if through is not None:
+            buckets["$gte"] = bucket_of(through + 1)
+        dropped = [
+            message
+            for bucket in self.messages_collection.find(
+                {"session_id": self.session_id, "bucket": buckets},
+                {"_id": 0, "messages": 1},
+            ).sort("bucket", 1)
+            for message in bucket.get("messages", [])
+            if message["seq"] < start and (through is None or message["seq"] > through)
+        ]
+        if not dropped:
+            return summary
+
+        updated = {
+            "text": summarizer(
+                (summary or {}).get("text", ""), messages_from_dict(dropped)
+            ),
+            "seq": dropped[-1]["seq"],
+            "updated_at": datetime.utcnow(),
+        }
         self.collection.update_one(
+            {
+                "session_id": self.session_id,
+                f"{SUMMARY_FIELD}.seq": (
+                    through if through is not None else {"$exists": False}
+                ),
+            },
+            {"$set": {SUMMARY_FIELD: updated}},
+        )
+        return updated
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """
+        Reserva as posições das mensagens no contador da sessão (atualizando
+        o resumo da última mensagem na mesma escrita) e as acrescenta aos
+        baldes com $push, sem reler o histórico: o custo de cada escrita não
+        cresce com a conversa e escritas concorrentes não se sobrescrevem.
+        Também incrementa o contador da hora em message_rollups.
+        """
+        if not messages:
+            return
+
+        timestamp = datetime.utcnow()
+        documents = [
+            {**message_to_dict(message), "timestamp": timestamp} for message in messages
+        ]
+        session = self.collection.find_one_and_update(
             {"session_id": self.session_id},
             {
+                "$inc": {MESSAGE_COUNT_FIELD: len(documents)},
                 "$set": {
-                    "messages": messages_dict,
-                    "last_updated": datetime.utcnow(),
-                    "message_timestamps": {str(len(messages_dict) - 1): timestamp},
+                    "last_updated": timestamp,
+                    **last_message_fields(documents[-1]),
                 },
             },
+            projection={"_id": 0, MESSAGE_COUNT_FIELD: 1},
             upsert=True,
+            return_document=ReturnDocument.AFTER,
         )
+        first_seq = session[MESSAGE_COUNT_FIELD] - len(documents)
+        self.messages_collection.bulk_write(
+            bucket_operations(self.session_id, documents, first_seq)
+        )
+        try:
+            self.rollups_collection.update_one(
+                *rollup_update(timestamp, len(documents)), upsert=True
+            )
+        except Exception as e:
+            # As métricas podem ser reconstruídas a partir dos baldes
+            logger.error(f"Erro ao atualizar contadores de mensagens: {e}")
 
     def clear(self) -> None:
+        self.messages_collection.delete_many({"session_id": self.session_id})
         self.collection.update_one(
             {"session_id": self.session_id},
-            {"$set": {"messages": []}},
+            {
+                "$set": {
+                    MESSAGE_COUNT_FIELD: 0,
+                    LAST_MESSAGE_AT_FIELD: None,
+                    LAST_MESSAGE_PREVIEW_FIELD: None,
+                },
+                "$unset": {"messages": "", SUMMARY_FIELD: ""},
+            },
             upsert=True,
         )
 
 
 class MongoMemory(BaseMemory):
+    """
+    Memória do bot. Com janela (padrão), carrega apenas as últimas
+    `window_messages` mensagens / `window_tokens` tokens, precedidas de uma
+    SystemMessage com o resumo das mensagens anteriores, atualizado a cada
+    `save_context`. Sem janela (os dois limites em 0) carrega o histórico
+    completo.
+    """
+
     chat_memory: MongoDBChatMessageHistory = Field(default=None)
     memory_key: str = Field(default="chat_history")
     return_messages: bool = Field(default=True)
+    window_messages: int = Field(default=MEMORY_WINDOW_MESSAGES)
+    window_tokens: int = Field(default=MEMORY_WINDOW_TOKENS)
+    summarizer: Summarizer = Field(default=extractive_summarizer)
 
-    def __init__(self, session_id: str, mongo_url: str):
+    def __init__(
+        self,
+        session_id: str,
+        client: Optional[MongoClient] = None,
+        window_messages: int = MEMORY_WINDOW_MESSAGES,
+        window_tokens: int = MEMORY_WINDOW_TOKENS,
+        summarizer: Optional[Summarizer] = None,
+    ):
         super().__init__(
-            chat_memory=MongoDBChatMessageHistory(session_id, mongo_url),
+            chat_memory=MongoDBChatMessageHistory(session_id, client),
             memory_key="chat_history",
             return_messages=True,
+            window_messages=window_messages,
+            window_tokens=window_tokens,
+            summarizer=summarizer or extractive_summarizer,
         )
 
     @property
     def memory_variables(self) -> List[str]:
         return [self.memory_key]
 
+    @property
+    def windowed(self) -> bool:
+        return bool(self.window_messages or self.window_tokens)
+
     def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
-        return {self.memory_key: self.chat_memory.messages}
+        if not self.windowed:
+            return {self.memory_key: self.chat_memory.messages}
+
+        window, summary = self.chat_memory.window(
+            self.window_messages, self.window_tokens
+        )
+        messages = messages_from_dict(window)
+        if summary and summary.get("text"):
+            messages.insert(0, SystemMessage(content=SUMMARY_PREFIX + summary["text"]))
+        return {self.memory_key: messages}
 
     def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        messages: List[BaseMessage] = []
         if inputs.get("input"):
-            self.chat_memory.add_message(HumanMessage(content=inputs["input"]))
+            messages.append(HumanMessage(content=inputs["input"]))
         if outputs.get("output"):
-            self.chat_memory.add_message(AIMessage(content=outputs["output"]))
+            messages.append(AIMessage(content=outputs["output"]))
+        # Pergunta e resposta gravadas juntas em uma única escrita
+        self.chat_memory.add_messages(messages)
+
+        if self.windowed:
+            try:
+                window, summary = self.chat_memory.window(
+                    self.window_messages, self.window_tokens
+                )
+                self.chat_memory.update_summary(window, summary, self.summarizer)
+            except Exception as e:
+                # O resumo é refeito na próxima troca
+                logger.error(
+                    f"Erro ao atualizar o resumo da sessão "
+                    f"{self.chat_memory.session_id}: {e}"
+                )
 
     def clear(self) -> None:
         self.chat_memory.clear()
 
 
 class MongoDBMemoryManager:
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
+    def __init__(self, client: Optional[MongoClient] = None):
+        self.client = client or get_mongo_client()
         self.db = self.client["fgts_agent"]
         self.collection = self.db["sessions"]
 
-    def get_memory(self, session_id: str) -> MongoMemory:
+    def get_memory(self, session_id: str, **kwargs) -> MongoMemory:
         """Retorna uma instância de memória para a sessão."""
-        return MongoMemory(session_id, self.mongo_url)
+        return MongoMemory(session_id, self.client, **kwargs)
 
     def get_user_context(self, session_id: str) -> str:
-        """Recupera o contexto do usuário baseado no histórico."""
+        """Recupera o contexto do usuário (resumo + janela do histórico)."""
         try:
             memory = self.get_memory(session_id)
-            context = []
-            for msg in memory.chat_memory.messages:
-                if isinstance(msg, HumanMessage):
-                    context.append(f"User: {msg.content}")
-                else:
-                    context.append(f"Assistant: {msg.content}")
+            messages = memory.load_memory_variables({})[memory.memory_key]
+            context = [_context_line(msg) for msg in messages]
             return "\n".join(context) if context else "Sem contexto prévio."
         except Exception as e:
             logger.error(f"Erro ao obter contexto do usuário para {session_id}: {e}")
@@ -120,16 +397,31 @@ class MongoDBMemoryManager:
 
     def set_session_data(self, session_id: str, key: str, value: Any):
         try:
-            self.collection.update_one(
-                {"session_id": session_id}, {"$set": {key: value}}, upsert=True
-            )
+            if touches_cpf(key):
+                # Mantém o CPF canônico, recalculado sobre o documento já
+                # atualizado segundo a prioridade dos campos de CPF
+                document = self.collection.find_one_and_update(
+                    {"session_id": session_id},
+                    {"$set": {key: value}},
+                    projection=CPF_PROJECTION,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                if update := cpf_normalized_update(document):
+                    self.collection.update_one({"_id": document["_id"]}, update)
+            else:
+                self.collection.update_one(
+                    {"session_id": session_id}, {"$set": {key: value}}, upsert=True
+                )
             logger.info(f"Dados da sessão atualizados: {session_id}, chave: {key}")
         except Exception as e:
             logger.error(f"Erro ao definir dados da sessão {session_id}: {e}")
 
     def get_session_data(self, session_id: str, key: str) -> Any:
         try:
-            result = self.collection.find_one({"session_id": session_id})
+            result = self.collection.find_one(
+                {"session_id": session_id}, {"_id": 0, key: 1}
+            )
             return result.get(key) if result else None
         except Exception as e:
             logger.error(f"Erro ao obter dados da sessão {session_id}: {e}")
@@ -172,5 +464,4 @@ class MongoDBMemoryManager:
             logger.error(f"Erro ao armazenar proposta FGTS: {e}")
 
     def close(self):
-        self.client.close()
-        logger.info("Conexão com o MongoDB fechada")
+        """O cliente é compartilhado e fechado no desligamento da aplicação"""
@@ -15,4 +15,8 @@ class NormalizedSimulationResponse(BaseModel):
     interest_rate: float
     iof_amount: float
     raw_response: dict
+    success: bool = True
+    error_message: str | None = None
+    elapsed_ms: float | None = None
+    timed_out: bool = False
     timestamp: datetime = Field(default_factory=datetime.now)
@@ -0,0 +1,19 @@
+# Flake8: noqa
+from .base import AsyncMongoRepository
+from .sessions import SessionRepository
+from .session_messages import SessionMessageRepository
+from .chat_stats import ChatStatsRepository
+from .message_rollups import MessageRollupRepository
+from .simulations import SimulationRepository, SIMULATION_SUMMARY_PROJECTION
+from .proposals import ProposalRepository, PROPOSAL_SUMMARY_PROJECTION
+from .batch_results import BatchResultRepository, BATCH_RESULT_PROJECTION
+from .configs import BankConfigRepository, TableConfigRepository
+from .config_cache import (
+    BANK_CONFIGS,
+    TABLE_CONFIGS,
+    ConfigCache,
+    get_config_cache,
+    invalidate_config_cache,
+    start_config_watcher,
+    stop_config_watcher,
+)
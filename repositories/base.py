@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from utils.mongo import get_async_mongo_client
+
+Sort = Union[str, Sequence[Tuple[str, int]]]
+
+
+class AsyncMongoRepository:
+    """
+    Acesso assíncrono (Motor) a uma coleção.
+
+    As subclasses definem `database` e `collection_name`; todas usam o
+    cliente Motor compartilhado do processo, então nenhuma consulta bloqueia
+    o event loop dos handlers.
+    """
+
+    database = "fgts_agent"
+    collection_name: str = ""
+
+    def __init__(self, client: Optional[AsyncIOMotorClient] = None):
+        self.client = client or get_async_mongo_client()
+        self.db = self.client[self.database]
+        self.collection = self.db[self.collection_name]
+
+    async def find_one(
+        self,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        sort: Optional[Sort] = None,
+    ) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(query, projection, sort=sort)
+
+    async def find(
+        self,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        sort: Optional[Sort] = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> List[Dict[str, Any]]:
+        cursor = self.collection.find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=limit or None)
+
+    async def count_documents(self, query: Optional[Dict[str, Any]] = None) -> int:
+        return await self.collection.count_documents(query or {})
+
+    async def aggregate(
+        self, pipeline: List[Dict[str, Any]], **kwargs
+    ) -> List[Dict[str, Any]]:
+        return await self.collection.aggregate(pipeline, **kwargs).to_list(length=None)
+
+    async def distinct(
+        self, key: str, query: Optional[Dict[str, Any]] = None
+    ) -> List[Any]:
+        return await self.collection.distinct(key, query)
+
+    async def insert_one(self, document: Dict[str, Any]):
+        return await self.collection.insert_one(document)
+
+    async def update_one(
+        self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False
+    ):
+        return await self.collection.update_one(query, update, upsert=upsert)
+
+    async def update_many(self, query: Dict[str, Any], update: Dict[str, Any]):
+        return await self.collection.update_many(query, update)
+
+    async def replace_one(
+        self, query: Dict[str, Any], document: Dict[str, Any], upsert: bool = False
+    ):
+        return await self.collection.replace_one(query, document, upsert=upsert)
+
+    async def delete_one(self, query: Dict[str, Any]):
+        return await self.collection.delete_one(query)
+
+    async def delete_many(self, query: Dict[str, Any]):
+        return await self.collection.delete_many(query)
+
+    async def find_one_and_update(
+        self,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        upsert: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """Atualiza e retorna o documento já atualizado"""
+        return await self.collection.find_one_and_update(
+            query,
+            update,
+            projection=projection,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def bulk_write(self, operations: List[Any], ordered: bool = False):
+        return await self.collection.bulk_write(operations, ordered=ordered)
@@ -0,0 +1,19 @@
+from .base import AsyncMongoRepository
+
+# Campos retornados na listagem de resultados do lote
+BATCH_RESULT_PROJECTION = {
+    "_id": 0,
+    "cpf": 1,
+    "customer_name": 1,
+    "session_id": 1,
+    "last_updated": 1,
+    "results": 1,
+    "any_success": 1,
+    "simulations": {"$slice": -1},
+}
+
+
+class BatchResultRepository(AsyncMongoRepository):
+    """Resultados das simulações em lote (coleção batch_simulations)"""
+
+    collection_name = "batch_simulations"
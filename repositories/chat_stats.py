@@ -0,0 +1,16 @@
+from typing import Any, Dict, Optional
+from .base import AsyncMongoRepository
+
+CHAT_STATS_ID = "global"
+
+
+class ChatStatsRepository(AsyncMongoRepository):
+    """Resumo das estatísticas dos chats (documento único em chat_stats)"""
+
+    collection_name = "chat_stats"
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        return await self.find_one({"_id": CHAT_STATS_ID}, {"_id": 0})
+
+    async def save(self, stats: Dict[str, Any]):
+        return await self.replace_one({"_id": CHAT_STATS_ID}, stats, upsert=True)
@@ -0,0 +1,185 @@
+from typing import Any, Dict, Optional, Tuple
+from copy import deepcopy
+import asyncio
+import logging
+import os
+import threading
+import time
+from pymongo.errors import OperationFailure, PyMongoError
+from utils.mongo import get_async_database, get_database
+from .configs import BankConfigRepository, TableConfigRepository
+
+logger = logging.getLogger(__name__)
+
+BANK_CONFIGS = "bank_configs"
+TABLE_CONFIGS = "table_configs"
+CONFIG_COLLECTIONS = (BANK_CONFIGS, TABLE_CONFIGS)
+
+# Validade das configurações em memória; alterações feitas por este processo
+# (ou vistas pelo change stream) invalidam o cache na hora
+CONFIG_CACHE_TTL = float(os.getenv("CONFIG_CACHE_TTL", "30"))
+CONFIG_CHANGE_STREAM = os.getenv("CONFIG_CHANGE_STREAM", "true").lower() == "true"
+
+# (carregado em, documento, mapa banco -> tabela ativa)
+Entry = Tuple[float, Optional[Dict[str, Any]], Dict[str, str]]
+
+
+def build_active_table_map(config: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Primeira tabela ativa de cada banco, na ordem da configuração"""
+    active_tables: Dict[str, str] = {}
+    if not config or "tables" not in config:
+        return active_tables
+
+    for table_id, table_info in config["tables"].items():
+        bank_name = table_info.get("bank_name")
+        if table_info.get("active", True) and bank_name not in active_tables:
+            active_tables[bank_name] = table_id
+    return active_tables
+
+
+class ConfigCache:
+    """
+    Configurações de bancos e tabelas (documento único em bank_configs e
+    table_configs) em memória, com TTL curto.
+
+    As escritas de BankConfigService/TableConfigService chamam `invalidate`
+    e o watcher (`start_config_watcher`) invalida o cache a cada alteração
+    vista pelo change stream, inclusive as feitas por outros workers. Cada
+    leitura recebe uma cópia do documento.
+    """
+
+    def __init__(self, ttl: float = CONFIG_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, Entry] = {}
+        self._lock = threading.Lock()
+        self._repositories = {
+            BANK_CONFIGS: BankConfigRepository,
+            TABLE_CONFIGS: TableConfigRepository,
+        }
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _cached(self, name: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def _store(self, name: str, version: int, document) -> Entry:
+        entry = (time.monotonic(), document, build_active_table_map(document))
+        with self._lock:
+            # Invalidado durante a leitura: o documento pode estar desatualizado
+            if version == self.version:
+                self._entries[name] = entry
+        return entry
+
+    def _load(self, name: str) -> Entry:
+        version = self.version
+        return self._store(name, version, get_database("fgts_agent")[name].find_one({}))
+
+    async def _load_async(self, name: str) -> Entry:
+        version = self.version
+        document = await self._repositories[name]().get()
+        return self._store(name, version, document)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        entry = self._cached(name) or self._load(name)
+        return deepcopy(entry[1])
+
+    async def get_async(self, name: str) -> Optional[Dict[str, Any]]:
+        entry = self._cached(name) or await self._load_async(name)
+        return deepcopy(entry[1])
+
+    def active_tables(self) -> Dict[str, str]:
+        """Mapa banco -> ID da tabela ativa"""
+        entry = self._cached(TABLE_CONFIGS) or self._load(TABLE_CONFIGS)
+        return dict(entry[2])
+
+    async def active_tables_async(self) -> Dict[str, str]:
+        """Mapa banco -> ID da tabela ativa"""
+        entry = self._cached(TABLE_CONFIGS) or await self._load_async(TABLE_CONFIGS)
+        return dict(entry[2])
+
+    def invalidate(self, name: Optional[str] = None):
+        """Descarta uma configuração (ou todas) e incrementa a versão"""
+        with self._lock:
+            self.version += 1
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+        self.invalidations += 1
+
+    async def watch(self):
+        """Invalida o cache a cada alteração nas coleções de configuração"""
+        pipeline = [{"$match": {"ns.coll": {"$in": list(CONFIG_COLLECTIONS)}}}]
+        delay = 1
+        while True:
+            try:
+                async with get_async_database("fgts_agent").watch(pipeline) as stream:
+                    # Alterações feitas enquanto o stream estava fechado
+                    self.invalidate()
+                    delay = 1
+                    async for change in stream:
+                        self.invalidate(change.get("ns", {}).get("coll"))
+            except OperationFailure as e:
+                # Servidor standalone não tem change streams: vale só o TTL
+                logger.warning(
+                    f"Change stream de configurações indisponível, usando TTL de "
+                    f"{self.ttl}s: {str(e)}"
+                )
+                return
+            except PyMongoError as e:
+                logger.warning(f"Change stream de configurações interrompido: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "ttl": self.ttl,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "watching": _watcher_task is not None and not _watcher_task.done(),
+        }
+
+
+_config_cache: Optional[ConfigCache] = None
+_watcher_task: Optional[asyncio.Task] = None
+
+
+def get_config_cache() -> ConfigCache:
+    """Retorna a instância compartilhada do cache de configurações"""
+    global _config_cache
+    if _config_cache is None:
+        _config_cache = ConfigCache()
+    return _config_cache
+
+
+def invalidate_config_cache(name: Optional[str] = None):
+    get_config_cache().invalidate(name)
+
+
+async def start_config_watcher():
+    """Inicia o change stream que invalida o cache de configurações"""
+    global _watcher_task
+    if not CONFIG_CHANGE_STREAM:
+        return
+    if _watcher_task is None or _watcher_task.done():
+        _watcher_task = asyncio.create_task(get_config_cache().watch())
+
+
+async def stop_config_watcher():
+    global _watcher_task
+    if _watcher_task:
+        _watcher_task.cancel()
+        await asyncio.gather(_watcher_task, return_exceptions=True)
+        _watcher_task = None
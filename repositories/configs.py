@@ -0,0 +1,17 @@
+from typing import Any, Dict, Optional
+from .base import AsyncMongoRepository
+
+
+class SingletonConfigRepository(AsyncMongoRepository):
+    """Coleções de configuração com um único documento"""
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        return await self.find_one({})
+
+
+class BankConfigRepository(SingletonConfigRepository):
+    collection_name = "bank_configs"
+
+
+class TableConfigRepository(SingletonConfigRepository):
+    collection_name = "table_configs"
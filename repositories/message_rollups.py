@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from utils.session_messages import MESSAGE_ROLLUPS
+from .base import AsyncMongoRepository
+
+
+class MessageRollupRepository(AsyncMongoRepository):
+    """Contadores de mensagens por hora (coleção message_rollups)"""
+
+    collection_name = MESSAGE_ROLLUPS
+
+    async def counts(
+        self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Mensagens por dia da semana e hora no período `[start_date, end_date)`,
+        como `{"_id": {"weekDay", "hour"}, "count"}`. Lê um documento por
+        hora do período, pelo índice de `_id`.
+        """
+        query: Dict[str, Any] = {}
+        if start_date or end_date:
+            query["_id"] = {}
+            if start_date:
+                query["_id"]["$gte"] = start_date
+            if end_date:
+                query["_id"]["$lt"] = end_date
+
+        return await self.aggregate(
+            [
+                {"$match": query},
+                {
+                    "$group": {
+                        "_id": {"weekDay": "$weekday", "hour": "$hour"},
+                        "count": {"$sum": "$count"},
+                    }
+                },
+                {"$sort": {"_id.weekDay": 1, "_id.hour": 1}},
+            ]
+        )
@@ -0,0 +1,30 @@
+from typing import Any, Dict, Optional
+from .base import AsyncMongoRepository
+
+# Campos retornados nos históricos de proposta
+PROPOSAL_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "financial_id": 1,
+    "bank_name": 1,
+    "contract_number": 1,
+    "formalization_link": 1,
+    "success": 1,
+    "error_message": 1,
+    "timestamp": 1,
+}
+
+
+class ProposalRepository(AsyncMongoRepository):
+    """Propostas enviadas aos bancos (coleção fgts_proposals)"""
+
+    collection_name = "fgts_proposals"
+
+    async def get_by_financial_id(
+        self, financial_id: str, projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        return await self.find_one({"financial_id": financial_id}, projection)
+
+    async def get_by_contract(
+        self, contract_number: str, projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        return await self.find_one({"contract_number": contract_number}, projection)
@@ -0,0 +1,26 @@
+from typing import Any, Dict, List, Optional
+from utils.session_messages import SESSION_MESSAGES, join_buckets
+from .base import AsyncMongoRepository
+
+
+class SessionMessageRepository(AsyncMongoRepository):
+    """Baldes de mensagens do chat (coleção session_messages)"""
+
+    collection_name = SESSION_MESSAGES
+
+    async def get_messages(
+        self, session_id: str, legacy: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Histórico completo da sessão em ordem. `legacy` são as mensagens
+        ainda gravadas no documento da sessão (sessões não migradas).
+        """
+        buckets = await self.find(
+            {"session_id": session_id},
+            {"_id": 0, "bucket": 1, "messages": 1},
+            sort=[("bucket", 1)],
+        )
+        return join_buckets(legacy, buckets)
+
+    async def delete_session(self, session_id: str):
+        return await self.delete_many({"session_id": session_id})
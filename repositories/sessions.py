@@ -0,0 +1,55 @@
+from typing import Any, Dict, Optional
+from utils.cpf import CPF_PROJECTION, cpf_normalized_update, touches_cpf
+from .base import AsyncMongoRepository
+
+
+class SessionRepository(AsyncMongoRepository):
+    """Sessões do bot (coleção sessions)"""
+
+    collection_name = "sessions"
+
+    async def get(
+        self, session_id: str, projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        return await self.find_one({"session_id": session_id}, projection)
+
+    async def get_by_financial_id(
+        self, financial_id: str, projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        return await self.find_one({"financial_id": financial_id}, projection)
+
+    async def get_field(self, session_id: str, key: str) -> Any:
+        """Equivalente assíncrono de MongoDBMemoryManager.get_session_data"""
+        document = await self.get(session_id, {"_id": 0, key: 1})
+        if not document:
+            return None
+        value = document
+        for part in key.split("."):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+
+    async def set_fields(self, session_id: str, fields: Dict[str, Any]):
+        """
+        Grava vários campos da sessão em um único `$set` (com upsert).
+
+        Mantém o CPF canônico quando algum campo grava um CPF da sessão,
+        como em MongoDBMemoryManager.set_session_data.
+        """
+        if not any(touches_cpf(key) for key in fields):
+            await self.update_one(
+                {"session_id": session_id}, {"$set": fields}, upsert=True
+            )
+            return
+
+        # O CPF canônico é recalculado sobre o documento já atualizado, para
+        # que um campo de menor prioridade não sobrescreva o principal
+        document = await self.find_one_and_update(
+            {"session_id": session_id},
+            {"$set": fields},
+            projection=CPF_PROJECTION,
+            upsert=True,
+        )
+        if update := cpf_normalized_update(document):
+            await self.update_one({"_id": document["_id"]}, update)
@@ -0,0 +1,24 @@
+from typing import Any, Dict, Optional
+from .base import AsyncMongoRepository
+
+# Campos retornados nos históricos de simulação
+SIMULATION_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "cpf": 1,
+    "bank_name": 1,
+    "available_amount": 1,
+    "error_message": 1,
+    "success": 1,
+    "timestamp": 1,
+}
+
+
+class SimulationRepository(AsyncMongoRepository):
+    """Simulações individuais (coleção fgts_simulations)"""
+
+    collection_name = "fgts_simulations"
+
+    async def get_by_financial_id(
+        self, financial_id: str, projection: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        return await self.find_one({"financial_id": financial_id}, projection)
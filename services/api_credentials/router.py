@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import Dict, Any, List, Optional
+from utils.api_credentials import get_api_credential_service
 from .service import APICredentialService
 from .schemas import CredentialRequest, CredentialResponse
 
@@ -7,10 +8,6 @@ from .schemas import CredentialRequest, CredentialResponse
 router = APIRouter(prefix="/api/v1/api-credentials", tags=["api-credentials"])
 
 
-def get_api_credential_service():
-    return APICredentialService()
-
-
 @router.get("/", response_model=List[CredentialResponse])
 async def list_credentials(
     api_name: Optional[str] = None,
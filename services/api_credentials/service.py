@@ -1,6 +1,7 @@
 from pymongo import MongoClient
+from utils.mongo import get_mongo_client
 import os
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from datetime import datetime
 import logging
 
@@ -10,14 +11,26 @@ logger = logging.getLogger(__name__)
 class APICredentialService:
     """Serviço para gerenciar credenciais de APIs"""
 
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
+    def __init__(self, client: Optional[MongoClient] = None):
+        self.client = client or get_mongo_client()
         self.db = self.client["fgts_agent"]
         self.collection = self.db["api_credentials"]
+        # Chamados com o api_name a cada credencial definida ou desativada
+        self._listeners: List[Callable[[str], None]] = []
 
         self._migrate_initial_credentials()
 
+    def add_listener(self, callback: Callable[[str], None]):
+        """Registra uma função chamada quando uma credencial é alterada"""
+        self._listeners.append(callback)
+
+    def _notify(self, api_name: Optional[str]):
+        for callback in self._listeners:
+            try:
+                callback(api_name)
+            except Exception as e:
+                logger.error(f"Erro ao notificar alteração de credencial: {str(e)}")
+
     def _migrate_initial_credentials(self):
         """Migra credenciais iniciais de .env para o banco de dados se a coleção estiver vazia"""
         if self.collection.count_documents({}) > 0:
@@ -64,6 +77,14 @@ class APICredentialService:
 
         return os.getenv(key)
 
+    def get_active_credentials(self) -> List[Dict[str, Any]]:
+        """Todas as credenciais ativas (chave, valor e API) em uma consulta"""
+        return list(
+            self.collection.find(
+                {"active": True}, {"_id": 0, "key": 1, "value": 1, "api_name": 1}
+            )
+        )
+
     def get_all_api_credentials(self, api_name: str) -> Dict[str, str]:
         """
         Obtém todas as credenciais de uma API específica
@@ -142,6 +163,7 @@ class APICredentialService:
                 )
 
             logger.info(f"Credencial {key} definida/atualizada com sucesso")
+            self._notify(api_name)
             return True
 
         except Exception as e:
@@ -159,16 +181,18 @@ class APICredentialService:
             True se operação bem-sucedida
         """
         try:
-            result = self.collection.update_one(
+            credential = self.collection.find_one_and_update(
                 {"key": key},
                 {"$set": {"active": False, "updated_at": datetime.utcnow()}},
+                projection={"_id": 0, "api_name": 1},
             )
 
-            if result.matched_count == 0:
+            if credential is None:
                 logger.warning(f"Credencial {key} não encontrada")
                 return False
 
             logger.info(f"Credencial {key} desativada com sucesso")
+            self._notify(credential.get("api_name"))
             return True
 
         except Exception as e:
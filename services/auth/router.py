@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import timedelta
+from pymongo import MongoClient
+from utils.mongo import get_mongo_client
 from .service import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES
 from .schemas import Token, UserCreate, UserResponse
 from .roles.constants import UserRole, ROLE_PERMISSIONS, ROLE_NAMES
@@ -9,14 +11,21 @@ router = APIRouter(prefix="/api/v1/auth", tags=["auth"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
 
+def get_auth_service(client: MongoClient = Depends(get_mongo_client)) -> AuthService:
+    return AuthService(client)
+
+
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), auth_service: AuthService = Depends()
+    token: str = Depends(oauth2_scheme),
+    auth_service: AuthService = Depends(get_auth_service),
 ) -> UserResponse:
     return auth_service.get_current_user(token)
 
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, auth_service: AuthService = Depends()):
+async def register(
+    user: UserCreate, auth_service: AuthService = Depends(get_auth_service)
+):
     """Registra um novo usuário"""
     return await auth_service.create_user(user)
 
@@ -24,7 +33,7 @@ async def register(user: UserCreate, auth_service: AuthService = Depends()):
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    auth_service: AuthService = Depends(),
+    auth_service: AuthService = Depends(get_auth_service),
 ):
     """Autentica um usuário e retorna o token com suas permissões"""
     user = await auth_service.authenticate_user(form_data.username, form_data.password)
@@ -3,6 +3,7 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pymongo import MongoClient
+from utils.mongo import get_mongo_client
 import os
 from fastapi import HTTPException, status
 from .schemas import UserCreate, UserResponse
@@ -16,9 +17,8 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 class AuthService:
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
+    def __init__(self, client: Optional[MongoClient] = None):
+        self.client = client or get_mongo_client()
         self.db = self.client["fgts_agent"]
         self.users = self.db["users"]
 
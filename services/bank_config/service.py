@@ -1,5 +1,6 @@
 from pymongo import MongoClient
-import os
+from repositories import BANK_CONFIGS, ConfigCache, get_config_cache
+from utils.mongo import get_mongo_client
 from typing import Dict, List, Optional
 from datetime import datetime
 import logging
@@ -8,13 +9,19 @@ logger = logging.getLogger(__name__)
 
 
 class BankConfigService:
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
+    def __init__(
+        self,
+        client: Optional[MongoClient] = None,
+        config_cache: Optional[ConfigCache] = None,
+    ):
+        self.client = client or get_mongo_client()
         self.db = self.client["fgts_agent"]
-        self.collection = self.db["bank_configs"]
+        self.collection = self.db[BANK_CONFIGS]
+        self.config_cache = config_cache or get_config_cache()
 
-        self._ensure_default_config()
+        # Com a configuração em cache não é preciso consultar o banco
+        if self.config_cache.get(BANK_CONFIGS) is None:
+            self._ensure_default_config()
 
     def _ensure_default_config(self):
         """Cria a configuração padrão se não existir"""
@@ -27,6 +34,7 @@ class BankConfigService:
                         "features": ["simulation", "proposal"],
                         "description": "VCTEX Bank - Antecipação de FGTS",
                         "updated_at": datetime.utcnow(),
+                        "rate_limit": {"rate_per_second": 10, "burst": 10},
                     },
                     "FACTA": {
                         "bank_name": "FACTA",
@@ -34,18 +42,20 @@ class BankConfigService:
                         "features": ["simulation", "proposal"],
                         "description": "Banco Facta - Antecipação de FGTS",
                         "updated_at": datetime.utcnow(),
+                        "rate_limit": {"rate_per_second": 2, "burst": 2},
                     },
                 }
             }
             self.collection.insert_one(default_config)
+            self.config_cache.invalidate(BANK_CONFIGS)
             logger.info("Configuração padrão de bancos criada")
 
     def get_bank_config(self) -> Dict:
         """Obtém a configuração atual dos bancos"""
-        config = self.collection.find_one({})
+        config = self.config_cache.get(BANK_CONFIGS)
         if not config:
             self._ensure_default_config()
-            config = self.collection.find_one({})
+            config = self.config_cache.get(BANK_CONFIGS)
 
         if "_id" in config:
             del config["_id"]
@@ -91,22 +101,26 @@ class BankConfigService:
         Returns:
             True se atualizado com sucesso, False caso contrário
         """
-        config = self.get_bank_config()
-
-        if bank_name not in config["banks"]:
-            logger.warning(f"Tentativa de atualizar banco inexistente: {bank_name}")
-            return False
-
-        config["banks"][bank_name]["active"] = active
+        now = datetime.utcnow()
+        fields = {
+            f"banks.{bank_name}.active": active,
+            f"banks.{bank_name}.updated_at": now,
+        }
         if features is not None:
-            config["banks"][bank_name]["features"] = features
-        config["banks"][bank_name]["updated_at"] = datetime.utcnow()
+            fields[f"banks.{bank_name}.features"] = features
         if updater:
-            config["banks"][bank_name]["updated_by"] = updater
+            fields[f"banks.{bank_name}.updated_by"] = updater
+        fields["last_updated"] = now
 
-        config["last_updated"] = datetime.utcnow()
+        # Atualiza só os campos do banco, direto no documento do MongoDB
+        result = self.collection.update_one(
+            {f"banks.{bank_name}": {"$exists": True}}, {"$set": fields}
+        )
+        if result.matched_count == 0:
+            logger.warning(f"Tentativa de atualizar banco inexistente: {bank_name}")
+            return False
 
-        self.collection.replace_one({}, config)
+        self.config_cache.invalidate(BANK_CONFIGS)
 
         logger.info(
             f"Banco {bank_name} atualizado: active={active}, features={features}"
@@ -153,26 +167,32 @@ class BankConfigService:
         Returns:
             True se adicionado com sucesso, False caso contrário
         """
-        config = self.get_bank_config()
-
-        if bank_name in config["banks"]:
+        self._ensure_default_config()
+        features = features or []
+        now = datetime.utcnow()
+
+        # O filtro garante que um banco existente não seja sobrescrito
+        result = self.collection.update_one(
+            {f"banks.{bank_name}": {"$exists": False}},
+            {
+                "$set": {
+                    f"banks.{bank_name}": {
+                        "bank_name": bank_name,
+                        "active": active,
+                        "features": features,
+                        "description": description,
+                        "updated_at": now,
+                        "updated_by": updater,
+                    },
+                    "last_updated": now,
+                }
+            },
+        )
+        if result.matched_count == 0:
             logger.warning(f"Banco já existe: {bank_name}")
             return False
 
-        features = features or []
-
-        config["banks"][bank_name] = {
-            "bank_name": bank_name,
-            "active": active,
-            "features": features,
-            "description": description,
-            "updated_at": datetime.utcnow(),
-            "updated_by": updater,
-        }
-
-        config["last_updated"] = datetime.utcnow()
-
-        self.collection.replace_one({}, config)
+        self.config_cache.invalidate(BANK_CONFIGS)
 
         logger.info(f"Novo banco adicionado: {bank_name}")
         return True
@@ -183,11 +203,7 @@ class BankConfigService:
         Método estático para obter bancos ativos sem criar instância completa
         """
         try:
-            mongo_client = MongoClient(os.getenv("MONGODB_URL"))
-            db = mongo_client["fgts_agent"]
-            collection = db["bank_configs"]
-
-            config = collection.find_one({})
+            config = get_config_cache().get(BANK_CONFIGS)
             if not config or "banks" not in config:
                 return []
 
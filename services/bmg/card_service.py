@@ -3,7 +3,11 @@ from datetime import datetime
 from decimal import Decimal
 from fastapi import HTTPException
 from math import ceil
-from services.bmg.repository.mongo_db import BMGMongoRepository
+from services.bmg.repository.mongo_db import (
+    BMGMongoRepository,
+    CARD_SUMMARY_PROJECTION,
+    bmg_in100_key,
+)
 from apis import (
     BmgApiClient,
     OfferRequest,
@@ -40,18 +44,22 @@ class CardService:
     async def first_step(self, data: FirstStepRequest):
         repository = BMGMongoRepository()
 
-        user_data = repository.get_from_collection_by_cpf(self.collection, data.cpf)
+        user_data = await repository.get_from_collection_by_cpf(
+            self.collection, data.cpf, include_in100=True
+        )
 
         if not user_data:
-            user_data = repository.add_to_collection(self.collection, data.model_dump())
+            user_data = await repository.add_to_collection(
+                self.collection, data.model_dump(), include_in100=True
+            )
 
         return user_data
 
     async def second_step(self, data: SecondStepRequest):
         repository = BMGMongoRepository()
 
-        user_data = repository.get_from_collection_by_id(
-            self.collection, data.customer_id
+        user_data = await repository.get_from_collection_by_id(
+            self.collection, data.customer_id, include_in100=True
         )
 
         if not user_data or "in100" not in user_data:
@@ -93,15 +101,15 @@ class CardService:
             income_value=income_value,
         )
 
-        offer = bmg_client.get_card_offer(form_data)
+        offer = await bmg_client.get_card_offer(form_data)
 
         return offer
 
     async def third_step(self, data: ThirdStepRequest):
         repository = BMGMongoRepository()
 
-        user_data = repository.get_from_collection_by_id(
-            self.collection, data.customer_id
+        user_data = await repository.get_from_collection_by_id(
+            self.collection, data.customer_id, include_in100=True
         )
 
         if not user_data:
@@ -126,7 +134,7 @@ class CardService:
             bank_info = customer_data["customer"]["bank_data"]
 
             if "in100" in user_data:
-                redis_key = f"in100_bmg_{user_data['cpf']}_{user_data['benefit']}"
+                redis_key = bmg_in100_key(user_data["cpf"], user_data["benefit"])
                 in100_data = user_data["in100"]
 
                 if "consulta" in in100_data:
@@ -138,14 +146,17 @@ class CardService:
                         "contaCorrente"
                     ] = f"{bank_info.get('accountNumber')}{bank_info.get('accountDigit')}"
 
-                    from services.inapi.redis_cache import add_in100_to_cache
+                    from services.inapi.redis_cache import (
+                        add_in100_to_cache_async,
+                    )
 
-                    add_in100_to_cache(redis_key, in100_data)
+                    await add_in100_to_cache_async(redis_key, in100_data)
 
-        updated_data = repository.update_in_collection_by_id(
+        updated_data = await repository.update_in_collection_by_id(
             self.collection,
             user_data["id"],
             data=data_to_update,
+            include_in100=True,
         )
 
         return updated_data
@@ -226,8 +237,8 @@ class CardService:
     async def fourth_step(self, data: FourthStepRequest):
         repository = BMGMongoRepository()
 
-        user_data = repository.get_from_collection_by_id(
-            self.collection, data.customer_id
+        user_data = await repository.get_from_collection_by_id(
+            self.collection, data.customer_id, include_in100=True
         )
 
         if not user_data:
@@ -301,12 +312,13 @@ class CardService:
         )
 
         bmg_client = BmgApiClient()
-        proposal_number = bmg_client.save_benefit_card_proposal(proposal_data)
+        proposal_number = await bmg_client.save_benefit_card_proposal(proposal_data)
 
-        updated_data = repository.update_in_collection_by_id(
+        updated_data = await repository.update_in_collection_by_id(
             self.collection,
             user_data["id"],
             data={"proposal_number": proposal_number},
+            include_in100=True,
         )
 
         return updated_data
@@ -321,12 +333,14 @@ class CardService:
         if cpf:
             query["cpf"] = cpf
 
-        total = repository.count_documents(self.collection, query)
+        total = await repository.count_documents(self.collection, query)
 
         skip = (page - 1) * per_page
         total_pages = ceil(total / per_page) if total > 0 else 1
 
-        cards = repository.get_paginated(self.collection, query, skip, per_page)
+        cards = await repository.get_paginated(
+            self.collection, query, skip, per_page, projection=CARD_SUMMARY_PROJECTION
+        )
 
         items = []
         for card in cards:
@@ -385,8 +399,8 @@ class CardService:
             Detalhes completos do cartão ou None se não encontrado
         """
         repository = BMGMongoRepository()
-        card = repository.get_from_collection_by_proposal(
-            self.collection, proposal_number
+        card = await repository.get_from_collection_by_proposal(
+            self.collection, proposal_number, include_in100=True
         )
 
         if not card:
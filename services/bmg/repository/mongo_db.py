@@ -1,72 +1,148 @@
-from pymongo import MongoClient
-import os
+from typing import Any, Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from bson.objectid import ObjectId
+from utils.mongo import get_async_mongo_client
 
-from services.inapi.redis_cache import get_in100_from_cache
+from services.inapi.redis_cache import (
+    get_in100_from_cache_async,
+    get_many_in100_from_cache_async,
+)
 
+# Campos usados na listagem de cartões (CardService.list_cards)
+CARD_SUMMARY_PROJECTION = {
+    "name": 1,
+    "benefit": 1,
+    "cpf": 1,
+    "proposal_number": 1,
+    "card_simulation": 1,
+    "in100": 1,
+}
 
-class BMGMongoRepository:
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
-        self.db = self.client["bmg"]
+# Campos necessários para montar a chave do IN100 no cache
+IN100_KEY_FIELDS = {"cpf": 1, "benefit": 1}
 
-    def add_to_collection(self, collection_name, data):
-        collection = self.db[collection_name]
-        result = collection.insert_one(data)
-        inserted_id = result.inserted_id
 
-        # Fetch the inserted document
-        inserted_doc = collection.find_one({"_id": inserted_id})
+def bmg_in100_key(cpf: str, benefit: str) -> str:
+    return f"in100_bmg_{cpf}_{benefit}"
 
-        if inserted_doc and "benefit" in inserted_doc:
-            redis_key = f"in100_bmg_{data.cpf}_{inserted_doc['benefit']}"
-            in100_data = get_in100_from_cache(redis_key)
-            inserted_doc["in100"] = in100_data
 
-        return self.parse_mongo_return(inserted_doc)
+class BMGMongoRepository:
+    """
+    Acesso assíncrono (Motor) às coleções do banco bmg.
 
-    def get_collection(self, collection_name):
-        collection = self.db[collection_name]
-        return collection
+    As leituras aceitam `projection` para trazer apenas os campos usados e
+    `include_in100` para anexar o IN100 do cache ao documento (opcional:
+    só quem usa a margem paga a consulta ao cache).
+    """
 
-    def get_from_collection_by_id(self, collection_name, id):
+    def __init__(self, client: Optional[AsyncIOMotorClient] = None):
+        self.client = client or get_async_mongo_client()
+        self.db = self.client["bmg"]
+
+    @staticmethod
+    def _build_projection(
+        projection: Optional[Dict[str, Any]], include_in100: bool
+    ) -> Optional[Dict[str, Any]]:
+        if projection is None or not include_in100:
+            return projection
+        return {**projection, **IN100_KEY_FIELDS}
+
+    async def _attach_in100(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        if "benefit" in document and "cpf" in document:
+            in100_data = await get_in100_from_cache_async(
+                bmg_in100_key(document["cpf"], document["benefit"])
+            )
+            if in100_data:
+                document["in100"] = in100_data
+        return document
+
+    async def _attach_in100_many(self, documents: List[Dict[str, Any]]):
+        """Anexa o IN100 de vários documentos com um único MGET"""
+        keys = {
+            id(document): bmg_in100_key(document["cpf"], document["benefit"])
+            for document in documents
+            if "benefit" in document and "cpf" in document
+        }
+        in100_by_key = await get_many_in100_from_cache_async(
+            list(dict.fromkeys(keys.values()))
+        )
+
+        for document in documents:
+            in100_data = in100_by_key.get(keys.get(id(document)))
+            if in100_data:
+                document["in100"] = in100_data
+        return documents
+
+    async def _find_one(
+        self,
+        collection_name,
+        query,
+        projection: Optional[Dict[str, Any]] = None,
+        include_in100: bool = False,
+    ):
         collection = self.db[collection_name]
-        result = collection.find_one({"_id": ObjectId(id)})
+        result = await collection.find_one(
+            query, self._build_projection(projection, include_in100)
+        )
         if not result:
             return None
-        if result and "benefit" in result:
-            redis_key = f"in100_bmg_{result['cpf']}_{result['benefit']}"
-            in100_data = get_in100_from_cache(redis_key)
-            if in100_data:
-                result["in100"] = in100_data
+
+        if include_in100:
+            await self._attach_in100(result)
 
         return self.parse_mongo_return(result)
 
-    def get_from_collection_by_cpf(self, collection_name, cpf):
+    async def add_to_collection(self, collection_name, data, include_in100=False):
+        collection = self.db[collection_name]
+        result = await collection.insert_one(data)
+        inserted_id = result.inserted_id
+
+        # Fetch the inserted document
+        return await self._find_one(
+            collection_name, {"_id": inserted_id}, include_in100=include_in100
+        )
+
+    def get_collection(self, collection_name):
         collection = self.db[collection_name]
-        result = collection.find_one({"cpf": cpf})
+        return collection
 
+    async def get_from_collection_by_id(
+        self, collection_name, id, projection=None, include_in100=False
+    ):
+        return await self._find_one(
+            collection_name, {"_id": ObjectId(id)}, projection, include_in100
+        )
+
+    async def get_from_collection_by_cpf(
+        self, collection_name, cpf, projection=None, include_in100=False
+    ):
+        return await self._find_one(
+            collection_name, {"cpf": cpf}, projection, include_in100
+        )
+
+    async def update_in_collection_by_id(
+        self, collection_name, id, data, projection=None, include_in100=False
+    ):
+        """Atualiza e retorna o documento atualizado em um único comando"""
+        collection = self.db[collection_name]
+        result = await collection.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {"$set": data},
+            projection=self._build_projection(projection, include_in100),
+            return_document=ReturnDocument.AFTER,
+        )
         if not result:
             return None
 
-        if result and "benefit" in result:
-            redis_key = f"in100_bmg_{result['cpf']}_{result['benefit']}"
-            in100_data = get_in100_from_cache(redis_key)
-            if in100_data:
-                result["in100"] = in100_data
+        if include_in100:
+            await self._attach_in100(result)
 
         return self.parse_mongo_return(result)
 
-    def update_in_collection_by_id(self, collection_name, id, data):
-        collection = self.db[collection_name]
-        collection.update_one({"_id": ObjectId(id)}, {"$set": data})
-
-        return self.get_from_collection_by_id(collection_name, id)
-
-    def delete_from_collection_by_id(self, collection_name, id):
+    async def delete_from_collection_by_id(self, collection_name, id):
         collection = self.db[collection_name]
-        collection.delete_one({"_id": ObjectId(id)})
+        await collection.delete_one({"_id": ObjectId(id)})
 
     def parse_mongo_return(self, data):
         response = {
@@ -76,21 +152,41 @@ class BMGMongoRepository:
         del response["_id"]
         return response
 
-    def count_documents(self, collection_name, query=None):
+    async def count_documents(self, collection_name, query=None):
         """Conta documentos na coleção com filtros opcionais."""
         collection = self.db[collection_name]
-        return collection.count_documents(query or {})
-
-    def get_paginated(self, collection_name, query, skip, limit):
+        return await collection.count_documents(query or {})
+
+    async def get_paginated(
+        self,
+        collection_name,
+        query,
+        skip,
+        limit,
+        projection=None,
+        include_in100=False,
+    ):
         """Busca documentos com paginação."""
         collection = self.db[collection_name]
-        cursor = collection.find(query).skip(skip).limit(limit)
-        return [self.parse_mongo_return(doc) for doc in cursor]
+        cursor = (
+            collection.find(query, self._build_projection(projection, include_in100))
+            .skip(skip)
+            .limit(limit)
+        )
+        documents = await cursor.to_list(length=limit)
+
+        if include_in100:
+            await self._attach_in100_many(documents)
+
+        return [self.parse_mongo_return(doc) for doc in documents]
 
-    def get_from_collection_by_proposal(self, collection_name, proposal_number):
+    async def get_from_collection_by_proposal(
+        self, collection_name, proposal_number, projection=None, include_in100=False
+    ):
         """Busca documento pelo número da proposta."""
-        collection = self.db[collection_name]
-        result = collection.find_one({"proposal_number": proposal_number})
-        if not result:
-            return None
-        return self.parse_mongo_return(result)
+        return await self._find_one(
+            collection_name,
+            {"proposal_number": proposal_number},
+            projection,
+            include_in100,
+        )
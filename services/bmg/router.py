@@ -16,7 +16,7 @@ router = APIRouter(prefix="/api/v1/bmg", tags=["bmg"])
 @router.post("/request_in100")
 async def request_in100(data: In100Request):
     bmg_client = BmgApiClient()
-    response = bmg_client.request_in100(data)
+    response = await bmg_client.request_in100(data)
 
     return response
 
@@ -24,11 +24,13 @@ async def request_in100(data: In100Request):
 @router.post("/in100_consult_filter")
 async def in100_consult_filter(data: In100ConsultFilter):
     bmg_client = BmgApiClient()
-    bmg_client.in100_consult_filter(data)
+    await bmg_client.in100_consult_filter(data)
 
     repository = BMGMongoRepository()
 
-    response = repository.get_from_collection_by_cpf("cards", data.cpf)
+    response = await repository.get_from_collection_by_cpf(
+        "cards", data.cpf, include_in100=True
+    )
 
     return response
 
@@ -36,7 +38,7 @@ async def in100_consult_filter(data: In100ConsultFilter):
 @router.post("/single_consult_request")
 async def single_consult_request(data: SingleConsultRequest):
     bmg_client = BmgApiClient()
-    response = bmg_client.single_consult_request(data)
+    response = await bmg_client.single_consult_request(data)
 
     return response
 
@@ -1,12 +1,20 @@
 from fastapi import APIRouter, HTTPException, Depends
+from apis import CepAPIClient
+from apis.http_clients import api_client_dependency
 from .service import CEPService
 from .schemas import AddressResponse
 
 router = APIRouter(prefix="/api/v1/cep", tags=["cep"])
 
 
+def get_cep_service(
+    client: CepAPIClient = Depends(api_client_dependency(CepAPIClient)),
+) -> CEPService:
+    return CEPService(client)
+
+
 @router.get("/{cep}", response_model=AddressResponse)
-async def get_address(cep: str, service: CEPService = Depends()):
+async def get_address(cep: str, service: CEPService = Depends(get_cep_service)):
     """Consulta endereço por CEP."""
     try:
         address = await service.get_address(cep)
@@ -1,9 +1,11 @@
+from typing import Optional
 from apis import CepAPIClient
+from apis.http_clients import get_api_client
 
 
 class CEPService:
-    def __init__(self):
-        self.client = CepAPIClient()
+    def __init__(self, client: Optional[CepAPIClient] = None):
+        self.client = client or get_api_client(CepAPIClient)
 
     async def get_address(self, cep: str):
         return await self.client.fetch_address_by_cep(cep)
@@ -7,7 +7,7 @@ from .schemas import (
     ChatStatsResponse,
     ContractDetailsResponse,
 )
-from memory import MongoDBMemoryManager
+from repositories import SessionRepository
 import logging
 
 router = APIRouter(prefix="/api/v1/chats", tags=["chats"])
@@ -15,8 +15,7 @@ logger = logging.getLogger(__name__)
 
 
 async def get_chat_service():
-    memory_manager = MongoDBMemoryManager()
-    return ChatService(memory_manager)
+    return ChatService(SessionRepository())
 
 
 @router.get("/stats", response_model=ChatStatsResponse)
@@ -61,11 +60,13 @@ async def get_chat_contract_details(
 async def get_message_metrics(
     page: int = Query(default=1, ge=1),
     per_page: int = Query(default=20, ge=1, le=100),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     service: ChatService = Depends(get_chat_service),
 ):
-    """Retorna métricas de mensagens com paginação"""
+    """Retorna métricas de mensagens do período (por hora e dia da semana)"""
     try:
-        return await service.get_messages_metrics(page, per_page)
+        return await service.get_messages_metrics(page, per_page, start_date, end_date)
     except Exception as e:
         logger.error(f"Erro ao obter métricas de mensagens: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
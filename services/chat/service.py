@@ -1,21 +1,70 @@
 from datetime import datetime, timedelta
+import asyncio
 import logging
+import os
 from typing import Dict, Any, Optional, List
-from memory import MongoDBMemoryManager
+from repositories import (
+    ChatStatsRepository,
+    MessageRollupRepository,
+    SessionMessageRepository,
+    SessionRepository,
+)
+from utils.cpf import cpf_search_query
+from utils.session_messages import (
+    LAST_MESSAGE_AT_FIELD,
+    LAST_MESSAGE_PREVIEW_FIELD,
+    MESSAGE_COUNT_FIELD,
+)
 import math
 
 logger = logging.getLogger(__name__)
 
+# Intervalo de recálculo do resumo em chat_stats; a rota só recalcula na
+# requisição se o resumo estiver bem mais velho (ex.: refresher parado)
+CHAT_STATS_REFRESH_INTERVAL = float(os.getenv("CHAT_STATS_REFRESH_INTERVAL", "60"))
+CHAT_STATS_MAX_AGE = CHAT_STATS_REFRESH_INTERVAL * 5
+
+# Sessões com mensagens: contador desnormalizado ou, em sessões ainda não
+# migradas para session_messages, o array `messages` da própria sessão
+HAS_MESSAGES = {
+    "$or": [
+        {MESSAGE_COUNT_FIELD: {"$gt": 0}},
+        {"messages.0": {"$exists": True}},
+    ]
+}
+LAST_MESSAGE_AT = {
+    "$ifNull": [
+        f"${LAST_MESSAGE_AT_FIELD}",
+        {"$arrayElemAt": ["$messages.timestamp", -1]},
+    ]
+}
+
 
 class ChatService:
-    def __init__(self, memory_manager: MongoDBMemoryManager):
-        self.memory_manager = memory_manager
+    def __init__(
+        self,
+        sessions: Optional[SessionRepository] = None,
+        session_messages: Optional[SessionMessageRepository] = None,
+        chat_stats: Optional[ChatStatsRepository] = None,
+        rollups: Optional[MessageRollupRepository] = None,
+    ):
+        self.sessions = sessions or SessionRepository()
+        self.session_messages = session_messages or SessionMessageRepository()
+        self.chat_stats = chat_stats or ChatStatsRepository()
+        self.rollups = rollups or MessageRollupRepository()
+
+    async def _find_with_messages(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Sessão com o histórico completo, lido dos baldes de mensagens"""
+        document = await self.sessions.find_one({"session_id": session_id})
+        if document:
+            document["messages"] = await self.session_messages.get_messages(
+                session_id, document.get("messages")
+            )
+        return document
 
     async def get_chat(self, session_id: str) -> Dict[str, Any]:
         try:
-            document = self.memory_manager.collection.find_one(
-                {"session_id": session_id}
-            )
+            document = await self._find_with_messages(session_id)
             if not document:
                 raise ValueError(f"Chat não encontrado: {session_id}")
             return self._convert_document_to_chat(document)
@@ -35,9 +84,7 @@ class ChatService:
 
             skip = (page - 1) * per_page
 
-            base_query = {
-                "$and": [{"messages": {"$exists": True}}, {"messages": {"$ne": []}}]
-            }
+            base_query = {"$and": [HAS_MESSAGES]}
 
             if search:
                 base_query["$or"] = [
@@ -54,10 +101,11 @@ class ChatService:
                             "$options": "i",
                         }
                     },
-                    {"cpf": {"$regex": search, "$options": "i"}},
                 ]
+                if cpf_query := cpf_search_query(search):
+                    base_query["$or"].append(cpf_query)
 
-            total = self.memory_manager.collection.count_documents(base_query)
+            total = await self.sessions.count_documents(base_query)
             total_pages = math.ceil(total / per_page) if total > 0 else 1
 
             pipeline = [
@@ -65,11 +113,20 @@ class ChatService:
                 {
                     "$addFields": {
                         "ultimo_timestamp": {
-                            "$ifNull": [
-                                {"$arrayElemAt": ["$messages.timestamp", -1]},
-                                "$last_updated",
+                            "$ifNull": [LAST_MESSAGE_AT, "$last_updated"]
+                        },
+                        LAST_MESSAGE_AT_FIELD: LAST_MESSAGE_AT,
+                        # Mensagens nos baldes mais as que ainda estão na
+                        # sessão (calculado antes do $slice abaixo)
+                        MESSAGE_COUNT_FIELD: {
+                            "$add": [
+                                {"$ifNull": [f"${MESSAGE_COUNT_FIELD}", 0]},
+                                {"$size": {"$ifNull": ["$messages", []]}},
                             ]
-                        }
+                        },
+                        # A listagem mostra só a última mensagem; a conversa
+                        # completa vem de get_chat_conversation
+                        "messages": {"$slice": [{"$ifNull": ["$messages", []]}, -1]},
                     }
                 },
                 {"$sort": {"ultimo_timestamp": -1}},
@@ -77,13 +134,28 @@ class ChatService:
                 {"$limit": per_page},
             ]
 
-            chats = list(self.memory_manager.collection.aggregate(pipeline))
+            chats = await self.sessions.aggregate(pipeline)
 
             items = []
             for chat in chats:
                 try:
+                    # O resumo acompanha as mensagens novas (nos baldes); o
+                    # array da sessão só vale quando ainda não há resumo
+                    preview = chat.get(LAST_MESSAGE_PREVIEW_FIELD)
+                    if preview:
+                        chat["messages"] = [
+                            {
+                                "type": preview.get("type"),
+                                "data": {"content": preview.get("content")},
+                                "timestamp": preview.get("timestamp"),
+                            }
+                        ]
                     converted = self._convert_document_to_chat(chat)
                     if converted:
+                        converted[MESSAGE_COUNT_FIELD] = chat[MESSAGE_COUNT_FIELD]
+                        converted[LAST_MESSAGE_AT_FIELD] = chat.get(
+                            LAST_MESSAGE_AT_FIELD
+                        )
                         items.append(converted)
                 except Exception as e:
                     logger.error(
@@ -107,9 +179,7 @@ class ChatService:
 
     async def get_chat_conversation(self, session_id: str) -> Dict[str, Any]:
         try:
-            document = self.memory_manager.collection.find_one(
-                {"session_id": session_id}
-            )
+            document = await self._find_with_messages(session_id)
             if not document:
                 raise ValueError(f"Chat não encontrado: {session_id}")
 
@@ -155,85 +225,140 @@ class ChatService:
             logger.error(f"Erro ao obter conversa: {str(e)}")
             raise
 
-    async def get_chat_stats(self) -> Dict[str, Any]:
+    async def get_chat_stats(
+        self, max_age: float = CHAT_STATS_MAX_AGE
+    ) -> Dict[str, Any]:
+        """
+        Estatísticas gerais dos chats, lidas do resumo em chat_stats
+        (atualizado em segundo plano por `start_chat_stats_refresher`).
+        Só recalcula na requisição se o resumo tiver mais de `max_age`
+        segundos.
+        """
         try:
-            # Usar UTC para consistência com MongoDB
-            now = datetime.utcnow()
-            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-
-            # Contagem de mensagens
-            messages_pipeline = [
-                {"$match": {"messages": {"$exists": True, "$ne": []}}},
-                {"$project": {"message_count": {"$size": "$messages"}}},
-                {"$group": {"_id": None, "total": {"$sum": "$message_count"}}},
-            ]
-
-            messages_result = list(
-                self.memory_manager.collection.aggregate(messages_pipeline)
-            )
-            total_messages = messages_result[0]["total"] if messages_result else 0
-
-            # Buscar chats válidos (com mensagens)
-            chats = list(
-                self.memory_manager.collection.find(
-                    {"messages": {"$exists": True, "$ne": []}}
-                )
-            )
+            stats = await self.chat_stats.get()
+            computed_at = (stats or {}).get("computed_at")
+            if (
+                computed_at is None
+                or (datetime.utcnow() - computed_at).total_seconds() >= max_age
+            ):
+                stats = await self.refresh_chat_stats()
+            return stats
+        except Exception as e:
+            logger.error(f"Erro ao obter estatísticas: {str(e)}")
+            raise
 
-            total_sessions = len(chats)
+    async def refresh_chat_stats(self) -> Dict[str, Any]:
+        """Recalcula as estatísticas e grava o resumo em chat_stats"""
+        stats = await self.compute_chat_stats()
+        await self.chat_stats.save(stats)
+        return stats
 
-            # CORREÇÃO: Usar query direta no MongoDB para contar sessões ativas hoje
-            # Isso evita problemas de timezone e formato de data
-            active_today_query = {
-                "messages": {"$exists": True, "$ne": []},
-                "last_updated": {
-                    "$gte": today_start,
-                    "$lt": today_start + timedelta(days=1),
-                },
-            }
-            active_today = self.memory_manager.collection.count_documents(
-                active_today_query
-            )
+    async def compute_chat_stats(self) -> Dict[str, Any]:
+        """
+        Estatísticas em uma única agregação ($facet) sobre os campos
+        projetados das sessões com mensagens.
+        """
+        # Usar UTC para consistência com MongoDB
+        now = datetime.utcnow()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
-            # Contratos completos (verificar se contract_number existe e não está vazio)
-            successful_chats = sum(
-                1
-                for chat in chats
-                if chat.get("contract_number") and chat.get("contract_number") != ""
-            )
+        pipeline = [
+            {"$match": HAS_MESSAGES},
+            {
+                "$project": {
+                    "_id": 0,
+                    "created_at": 1,
+                    "last_updated": 1,
+                    "message_count": {
+                        "$add": [
+                            {"$ifNull": [f"${MESSAGE_COUNT_FIELD}", 0]},
+                            {"$size": {"$ifNull": ["$messages", []]}},
+                        ]
+                    },
+                    # Contratos completos (contract_number existe e não está vazio)
+                    "has_contract": {
+                        "$cond": [
+                            {
+                                "$and": [
+                                    {"$ifNull": ["$contract_number", False]},
+                                    {"$ne": ["$contract_number", ""]},
+                                ]
+                            },
+                            1,
+                            0,
+                        ]
+                    },
+                }
+            },
+            {
+                "$facet": {
+                    "totals": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "total_sessions": {"$sum": 1},
+                                "total_messages": {"$sum": "$message_count"},
+                                "completed_proposals": {"$sum": "$has_contract"},
+                            }
+                        }
+                    ],
+                    "active_today": [
+                        {
+                            "$match": {
+                                "last_updated": {
+                                    "$gte": today_start,
+                                    "$lt": today_start + timedelta(days=1),
+                                }
+                            }
+                        },
+                        {"$count": "total"},
+                    ],
+                    # Duração em minutos, ignorando valores absurdos (fora de 0 a 24h)
+                    "duration": [
+                        {
+                            "$match": {
+                                "created_at": {"$type": "date"},
+                                "last_updated": {"$type": "date"},
+                            }
+                        },
+                        {
+                            "$project": {
+                                "minutes": {
+                                    "$divide": [
+                                        {"$subtract": ["$last_updated", "$created_at"]},
+                                        60000,
+                                    ]
+                                }
+                            }
+                        },
+                        {"$match": {"minutes": {"$gt": 0, "$lt": 1440}}},
+                        {"$group": {"_id": None, "avg": {"$avg": "$minutes"}}},
+                    ],
+                }
+            },
+        ]
 
-            success_rate = (
-                (successful_chats / total_sessions * 100) if total_sessions > 0 else 0
-            )
+        result = await self.sessions.aggregate(pipeline)
+        facets = result[0] if result else {}
+        totals = (facets.get("totals") or [{}])[0]
+        active_today = (facets.get("active_today") or [{}])[0].get("total", 0)
+        avg_duration = (facets.get("duration") or [{}])[0].get("avg") or 0
 
-            # Cálculo da duração com proteção contra erros
-            durations = []
-            for chat in chats:
-                if chat.get("created_at") and chat.get("last_updated"):
-                    try:
-                        # Calcular duração em minutos e filtrar valores absurdos
-                        duration = (
-                            chat["last_updated"] - chat["created_at"]
-                        ).total_seconds() / 60
-                        if 0 < duration < 1440:  # Entre 0 e 24 horas
-                            durations.append(duration)
-                    except Exception as e:
-                        logger.debug(f"Erro ao calcular duração: {e}")
-                        continue
-
-            avg_duration = sum(durations) / len(durations) if durations else 0
+        total_sessions = totals.get("total_sessions", 0)
+        successful_chats = totals.get("completed_proposals", 0)
+        success_rate = (
+            (successful_chats / total_sessions * 100) if total_sessions > 0 else 0
+        )
 
-            return {
-                "total_sessions": total_sessions,
-                "active_today": active_today,
-                "success_rate": round(success_rate, 2),
-                "avg_duration_minutes": round(avg_duration, 2),
-                "total_messages": total_messages,
-                "completed_proposals": successful_chats,
-            }
-        except Exception as e:
-            logger.error(f"Erro ao obter estatísticas: {str(e)}")
-            raise
+        return {
+            "total_sessions": total_sessions,
+            "active_today": active_today,
+            "success_rate": round(success_rate, 2),
+            "avg_duration_minutes": round(avg_duration, 2),
+            "total_messages": totals.get("total_messages", 0),
+            "completed_proposals": successful_chats,
+            "computed_at": now,
+        }
 
     def _convert_document_to_chat(self, document: Dict) -> Dict[str, Any]:
         """
@@ -314,27 +439,17 @@ class ChatService:
 
             base_query = {}
             if cpf_search:
-                base_query["$or"] = [
-                    {
-                        "customer_data.customer_info.cpf": {
-                            "$regex": cpf_search,
-                            "$options": "i",
-                        }
-                    },
-                    {"customer_data.cpf": {"$regex": cpf_search, "$options": "i"}},
-                    {"cpf": {"$regex": cpf_search, "$options": "i"}},
-                ]
+                # Sem dígitos na busca, nenhuma sessão corresponde ao CPF
+                base_query = cpf_search_query(cpf_search) or {"_id": None}
 
             pipeline = [
                 {"$match": base_query},
                 {
                     "$addFields": {
                         "ultimo_timestamp": {
-                            "$ifNull": [
-                                {"$arrayElemAt": ["$messages.timestamp", -1]},
-                                "$last_updated",
-                            ]
+                            "$ifNull": [LAST_MESSAGE_AT, "$last_updated"]
                         },
+                        LAST_MESSAGE_AT_FIELD: LAST_MESSAGE_AT,
                         # Verificar se há valor liberado para ordenação
                         "tem_valor_liberado": {
                             "$cond": [
@@ -368,6 +483,8 @@ class ChatService:
                         },
                     }
                 },
+                # Histórico de sessões ainda não migradas fica fora do agrupamento
+                {"$project": {"messages": 0}},
                 {
                     "$group": {
                         "_id": "$session_id",
@@ -442,29 +559,25 @@ class ChatService:
             ]
 
             # Executar contagens
-            count_result = list(
-                self.memory_manager.collection.aggregate(count_pipeline)
-            )
+            count_result = await self.sessions.aggregate(count_pipeline)
             total = count_result[0]["total"] if count_result else 0
 
-            count_with_contract = list(
-                self.memory_manager.collection.aggregate(count_with_contract_pipeline)
+            count_with_contract = await self.sessions.aggregate(
+                count_with_contract_pipeline
             )
             total_with_contract = (
                 count_with_contract[0]["total"] if count_with_contract else 0
             )
 
-            count_without_contract = list(
-                self.memory_manager.collection.aggregate(
-                    count_without_contract_pipeline
-                )
+            count_without_contract = await self.sessions.aggregate(
+                count_without_contract_pipeline
             )
             total_without_contract = (
                 count_without_contract[0]["total"] if count_without_contract else 0
             )
 
             # Executar pipeline principal para obter os registros
-            chats = list(self.memory_manager.collection.aggregate(pipeline))
+            chats = await self.sessions.aggregate(pipeline)
 
             # Processar os resultados
             pipeline_items = []
@@ -558,9 +671,7 @@ class ChatService:
                 proposal_created_at = customer_data.get("proposal_created_at")
 
                 # Timestamp da última mensagem
-                ultimo_timestamp = None
-                if doc.get("messages") and len(doc.get("messages", [])) > 0:
-                    ultimo_timestamp = doc["messages"][-1].get("timestamp")
+                ultimo_timestamp = doc.get(LAST_MESSAGE_AT_FIELD)
 
                 item = {
                     "contract_number": doc.get("contract_number")
@@ -609,94 +720,47 @@ class ChatService:
             logger.error(f"Erro ao obter dados da esteira: {str(e)}")
             raise
 
-    async def get_messages_by_hour(self, start_date=None, end_date=None):
-        pipeline = [
-            {"$match": {"messages": {"$exists": True, "$ne": []}}},
-            {"$unwind": "$messages"},
-            {"$project": {"hour": {"$hour": "$last_updated"}, "message": "$messages"}},
-            {"$group": {"_id": "$hour", "count": {"$sum": 1}}},
-            {"$sort": {"_id": 1}},
-        ]
+    async def get_messages_by_hour(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ):
+        """Mensagens por hora (UTC) no período, lidas dos contadores por hora"""
+        hours: Dict[int, int] = {}
+        for doc in await self.rollups.counts(start_date, end_date):
+            hour = doc["_id"].get("hour")
+            if hour is not None:
+                hours[hour] = hours.get(hour, 0) + doc["count"]
 
-        result = list(self.memory_manager.collection.aggregate(pipeline))
         return {
-            "labels": [f"{doc['_id']}h" for doc in result],
-            "data": [doc["count"] for doc in result],
+            "labels": [f"{hour}h" for hour in sorted(hours)],
+            "data": [hours[hour] for hour in sorted(hours)],
         }
 
-    async def get_messages_metrics(self, page: int = 1, per_page: int = 20):
+    async def get_messages_metrics(
+        self,
+        page: int = 1,
+        per_page: int = 20,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ):
+        """
+        Histogramas por hora e por dia da semana das mensagens do período,
+        lidos dos contadores em message_rollups (um documento por hora).
+        A paginação é mantida na resposta por compatibilidade: os
+        histogramas cobrem sempre o período inteiro.
+        """
         try:
             page = max(1, page)
             per_page = max(1, per_page)
 
-            skip = (page - 1) * per_page
-
-            count_pipeline = [
-                {
-                    "$match": {
-                        "messages": {"$exists": True, "$ne": []},
-                    }
-                },
-                {"$unwind": "$messages"},
-                {"$count": "total"},
-            ]
-
-            count_result = list(
-                self.memory_manager.collection.aggregate(count_pipeline)
-            )
-            total_messages = count_result[0]["total"] if count_result else 0
-
-            pipeline = [
-                {
-                    "$match": {
-                        "messages": {"$exists": True, "$ne": []},
-                    }
-                },
-                {"$unwind": "$messages"},
-                {
-                    "$project": {
-                        "timestamp": {
-                            "$toDate": {
-                                "$ifNull": ["$messages.timestamp", "$last_updated"]
-                            }
-                        },
-                        "dayOfWeek": {
-                            "$dayOfWeek": {
-                                "$toDate": {
-                                    "$ifNull": ["$messages.timestamp", "$last_updated"]
-                                }
-                            }
-                        },
-                        "hour": {
-                            "$hour": {
-                                "$toDate": {
-                                    "$ifNull": ["$messages.timestamp", "$last_updated"]
-                                }
-                            }
-                        },
-                    }
-                },
-                {"$sort": {"timestamp": -1}},
-                {"$skip": skip},
-                {"$limit": per_page},
-                {
-                    "$group": {
-                        "_id": {"weekDay": "$dayOfWeek", "hour": "$hour"},
-                        "count": {"$sum": 1},
-                    }
-                },
-                {"$sort": {"_id.weekDay": 1, "_id.hour": 1}},
-            ]
-
-            result = list(self.memory_manager.collection.aggregate(pipeline))
+            result = await self.rollups.counts(start_date, end_date)
 
             hours = {i: 0 for i in range(24)}
             weekdays = ["Dom", "Seg", "Ter", "Qua", "Qui", "Sex", "Sáb"]
             weekday_data = {day: 0 for day in weekdays}
 
-            page_messages_count = 0
-            peak_hour = {"hour": 0, "count": 0}
-            peak_day = {"day": "", "count": 0}
+            total_messages = 0
 
             # Processa resultados
             for doc in result:
@@ -704,21 +768,26 @@ class ChatService:
                     hour = doc["_id"].get("hour")
                     weekday_idx = doc["_id"].get("weekDay")
                     count = doc["count"]
-                    page_messages_count += count
+                    total_messages += count
 
                     if hour is not None and 0 <= hour < 24:
                         hours[hour] += count
-                        if hours[hour] > peak_hour["count"]:
-                            peak_hour = {"hour": hour, "count": hours[hour]}
 
                     if weekday_idx is not None and 1 <= weekday_idx <= 7:
-                        weekday = weekdays[weekday_idx - 1]
-                        weekday_data[weekday] += count
-                        if weekday_data[weekday] > peak_day["count"]:
-                            peak_day = {"day": weekday, "count": weekday_data[weekday]}
+                        weekday_data[weekdays[weekday_idx - 1]] += count
+
+            peak_hour = {"hour": 0, "count": 0}
+            for hour, count in hours.items():
+                if count > peak_hour["count"]:
+                    peak_hour = {"hour": hour, "count": count}
+
+            peak_day = {"day": "", "count": 0}
+            for day, count in weekday_data.items():
+                if count > peak_day["count"]:
+                    peak_day = {"day": day, "count": count}
 
-            avg_per_hour = page_messages_count / 24 if page_messages_count > 0 else 0
-            avg_per_day = page_messages_count / 7 if page_messages_count > 0 else 0
+            avg_per_hour = total_messages / 24 if total_messages > 0 else 0
+            avg_per_day = total_messages / 7 if total_messages > 0 else 0
 
             total_pages = (
                 math.ceil(total_messages / per_page) if total_messages > 0 else 1
@@ -735,7 +804,7 @@ class ChatService:
                 },
                 "metrics": {
                     "total_messages": total_messages,
-                    "current_page_messages": page_messages_count,
+                    "current_page_messages": total_messages,
                     "peak_hour": peak_hour,
                     "peak_day": peak_day,
                     "avg_messages_per_hour": round(avg_per_hour, 2),
@@ -770,8 +839,8 @@ class ChatService:
             Exception: Para outros erros durante o processamento
         """
         try:
-            document = self.memory_manager.collection.find_one(
-                {"session_id": session_id}
+            document = await self.sessions.find_one(
+                {"session_id": session_id}, {"messages": 0}
             )
             if not document:
                 raise ValueError(f"Chat não encontrado: {session_id}")
@@ -1092,3 +1161,32 @@ class ChatService:
             if value:
                 return value
         return None
+
+
+_stats_task: Optional[asyncio.Task] = None
+
+
+async def _refresh_chat_stats():
+    service = ChatService()
+    while True:
+        try:
+            # Outro worker pode ter acabado de recalcular o resumo
+            await service.get_chat_stats(max_age=CHAT_STATS_REFRESH_INTERVAL)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar estatísticas dos chats: {str(e)}")
+        await asyncio.sleep(CHAT_STATS_REFRESH_INTERVAL)
+
+
+async def start_chat_stats_refresher():
+    """Inicia o recálculo periódico do resumo de estatísticas dos chats"""
+    global _stats_task
+    if _stats_task is None or _stats_task.done():
+        _stats_task = asyncio.create_task(_refresh_chat_stats())
+
+
+async def stop_chat_stats_refresher():
+    global _stats_task
+    if _stats_task:
+        _stats_task.cancel()
+        await asyncio.gather(_stats_task, return_exceptions=True)
+        _stats_task = None
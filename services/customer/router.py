@@ -1,4 +1,5 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from repositories import SessionRepository
 from .service import CustomerService
 from .schemas import CustomerUpdate, CustomerUploadResponse, CustomerListResponse
 from typing import Dict, Any
@@ -6,9 +7,14 @@ from typing import Dict, Any
 router = APIRouter(prefix="/api/v1/customers", tags=["customers"])
 
 
+def get_customer_service() -> CustomerService:
+    return CustomerService(SessionRepository())
+
+
 @router.post("/upload", response_model=CustomerUploadResponse)
 async def upload_customers(
-    file: UploadFile = File(...), service: CustomerService = Depends()
+    file: UploadFile = File(...),
+    service: CustomerService = Depends(get_customer_service),
 ):
     """Upload customer data from CSV file."""
     if not file.filename.endswith(".csv"):
@@ -28,7 +34,7 @@ async def list_customers(
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=20, ge=1, le=100),
     search: str = Query(default=None),
-    service: CustomerService = Depends(),
+    service: CustomerService = Depends(get_customer_service),
 ):
     """List customers with pagination and search."""
     try:
@@ -39,7 +45,9 @@ async def list_customers(
 
 @router.put("/{session_id}", response_model=Dict[str, str])
 async def update_customer(
-    session_id: str, customer_data: CustomerUpdate, service: CustomerService = Depends()
+    session_id: str,
+    customer_data: CustomerUpdate,
+    service: CustomerService = Depends(get_customer_service),
 ):
     """Update customer data."""
     try:
@@ -53,7 +61,9 @@ async def update_customer(
 
 
 @router.delete("/{session_id}", response_model=Dict[str, str])
-async def delete_customer(session_id: str, service: CustomerService = Depends()):
+async def delete_customer(
+    session_id: str, service: CustomerService = Depends(get_customer_service)
+):
     """Delete customer."""
     try:
         return await service.delete_customer(session_id)
@@ -68,7 +78,7 @@ async def get_customers_list(
     page: int = Query(default=1, ge=1),
     per_page: int = Query(default=20, ge=1, le=100),
     search: str = Query(default=None),
-    service: CustomerService = Depends(),
+    service: CustomerService = Depends(get_customer_service),
 ):
     """List customers with pagination and search."""
     try:
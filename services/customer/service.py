@@ -1,21 +1,29 @@
 import pandas as pd
 from fastapi import UploadFile
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
-from pymongo import MongoClient
 import io
-import os
+from repositories import SessionMessageRepository, SessionRepository
+from utils.cpf import (
+    CPF_NORMALIZED_FIELD,
+    CPF_PROJECTION,
+    cpf_normalized_update,
+    cpf_search_query,
+    normalize_cpf,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class CustomerService:
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
-        self.db = self.client["fgts_agent"]
-        self.collection = self.db["sessions"]
+    def __init__(
+        self,
+        sessions: Optional[SessionRepository] = None,
+        session_messages: Optional[SessionMessageRepository] = None,
+    ):
+        self.sessions = sessions or SessionRepository()
+        self.session_messages = session_messages or SessionMessageRepository()
 
     async def process_csv(self, file: UploadFile) -> Dict[str, Any]:
         try:
@@ -72,11 +80,14 @@ class CustomerService:
                     }
 
                     # Inserir ou atualizar no MongoDB
-                    self.collection.update_one(
+                    await self.sessions.update_one(
                         {"session_id": session_id},
                         {
                             "$set": {
                                 "customer_data": customer_data,
+                                CPF_NORMALIZED_FIELD: normalize_cpf(
+                                    customer_data["customer_info"]["cpf"]
+                                ),
                                 "created_at": datetime.now(timezone.utc),
                                 "last_updated": datetime.now(timezone.utc),
                                 "source": "upload",
@@ -120,20 +131,18 @@ class CustomerService:
                             "$options": "i",
                         }
                     },
-                    {
-                        "customer_data.customer_info.cpf": {
-                            "$regex": search,
-                            "$options": "i",
-                        }
-                    },
                     {"session_id": {"$regex": search, "$options": "i"}},
                 ]
+                if cpf_query := cpf_search_query(search):
+                    query["$or"].append(cpf_query)
 
             # Get total count
-            total = self.collection.count_documents(query)
+            total = await self.sessions.count_documents(query)
 
-            # Get paginated results
-            customers = list(self.collection.find(query).skip(skip).limit(limit))
+            # Get paginated results (without inline chat history)
+            customers = await self.sessions.find(
+                query, {"messages": 0}, skip=skip, limit=limit
+            )
 
             return {"total": total, "items": customers}
         except Exception as e:
@@ -143,19 +152,23 @@ class CustomerService:
     async def update_customer(self, session_id: str, customer_data: Dict[str, Any]):
         try:
             # Update customer data
-            result = self.collection.update_one(
-                {"session_id": session_id},
-                {
-                    "$set": {
-                        "customer_data.customer_info": customer_data,
-                        "last_updated": datetime.now(timezone.utc),
-                    }
-                },
+            update = {
+                "customer_data.customer_info": customer_data,
+                "last_updated": datetime.now(timezone.utc),
+            }
+
+            document = await self.sessions.find_one_and_update(
+                {"session_id": session_id}, {"$set": update}, CPF_PROJECTION
             )
 
-            if result.matched_count == 0:
+            if document is None:
                 raise ValueError(f"Customer with session_id {session_id} not found")
 
+            # customer_info is replaced as a whole: recompute the canonical CPF
+            # from the updated document, following the CPF_FIELDS priority
+            if cpf_update := cpf_normalized_update(document):
+                await self.sessions.update_one({"_id": document["_id"]}, cpf_update)
+
             return {"message": "Customer updated successfully"}
         except Exception as e:
             logger.error(f"Error updating customer: {str(e)}")
@@ -163,11 +176,13 @@ class CustomerService:
 
     async def delete_customer(self, session_id: str):
         try:
-            result = self.collection.delete_one({"session_id": session_id})
+            result = await self.sessions.delete_one({"session_id": session_id})
 
             if result.deleted_count == 0:
                 raise ValueError(f"Customer with session_id {session_id} not found")
 
+            await self.session_messages.delete_session(session_id)
+
             return {"message": "Customer deleted successfully"}
         except Exception as e:
             logger.error(f"Error deleting customer: {str(e)}")
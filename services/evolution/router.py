@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends
 from .service import EvolutionService
+from apis.evolution.evolution_api_client import EvolutionAPIClient
+from apis.http_clients import api_client_dependency
 from typing import Dict, Any
 from .schemas import MessageRequest
 
 router = APIRouter(prefix="/api/v1/evolution", tags=["evolution"])
 
 
-async def get_evolution_service():
-    return EvolutionService()
+async def get_evolution_service(
+    client: EvolutionAPIClient = Depends(api_client_dependency(EvolutionAPIClient)),
+):
+    return EvolutionService(client)
 
 
 @router.get("/conversation/{phone}", response_model=Dict[str, Any])
@@ -2,15 +2,16 @@ from apis.evolution.evolution_api_client import EvolutionAPIClient
 from memory import MongoDBMemoryManager
 import logging
 import pytz
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from apis.http_clients import get_api_client
 
 logger = logging.getLogger(__name__)
 BR_TZ = pytz.timezone("America/Sao_Paulo")
 
 
 class EvolutionService:
-    def __init__(self):
-        self.client = EvolutionAPIClient()
+    def __init__(self, client: Optional[EvolutionAPIClient] = None):
+        self.client = client or get_api_client(EvolutionAPIClient)
         self.memory_manager = MongoDBMemoryManager()
 
     async def find_all_chats(self) -> Dict[str, Any]:
@@ -1,29 +1,315 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from cachetools import TTLCache
+import asyncio
 import json
+import logging
 import os
+import threading
+import time
+import msgpack
 import redis
+import redis.asyncio as aioredis
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+IN100_CACHE_TTL = 60 * 60 * 24 * 30  # 30 days
+
+# Cache local (por processo) na frente do Redis
+IN100_LOCAL_MAXSIZE = int(os.getenv("IN100_LOCAL_MAXSIZE", "2048"))
+IN100_LOCAL_TTL = int(os.getenv("IN100_LOCAL_TTL", "60"))
+
+# Margens mais antigas que isso são servidas e atualizadas em segundo plano
+IN100_STALE_AFTER = int(os.getenv("IN100_STALE_AFTER", str(60 * 60 * 12)))
+
+ZSTD_LEVEL = 3
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Retorna o payload atualizado da chave (ou None para manter o atual)
+Refresh = Callable[[str], Awaitable[Any]]
+
+_pool: Optional[redis.ConnectionPool] = None
+_async_pool: Optional[aioredis.ConnectionPool] = None
 
 
 def get_redis_connection():
-    r = redis.Redis(
-        host=os.getenv("REDIS_HOST"),
-        port=os.getenv("REDIS_PORT"),
-        decode_responses=True,
-    )
+    """Conexão síncrona usando o pool compartilhado do processo"""
+    global _pool
+    if _pool is None:
+        _pool = redis.ConnectionPool(
+            host=os.getenv("REDIS_HOST"),
+            port=os.getenv("REDIS_PORT"),
+        )
 
-    return r
+    return redis.Redis(connection_pool=_pool)
 
 
-def add_in100_to_cache(id, in_100_data):
-    r = get_redis_connection()
+def get_async_redis_connection() -> aioredis.Redis:
+    """Conexão assíncrona usando o pool compartilhado do processo"""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = aioredis.ConnectionPool(
+            host=os.getenv("REDIS_HOST"),
+            port=os.getenv("REDIS_PORT"),
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+        )
+
+    return aioredis.Redis(connection_pool=_async_pool)
+
+
+async def close_async_redis_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.disconnect()
+        _async_pool = None
+
+
+def encode_in100(payload: Any, stored_at: float) -> bytes:
+    """msgpack + zstd, com o horário da gravação junto do payload"""
+    return zstandard.compress(msgpack.packb({"v": payload, "t": stored_at}), ZSTD_LEVEL)
+
+
+def decode_in100(data: bytes) -> Tuple[Any, Optional[float]]:
+    """Retorna (payload, stored_at); valores antigos em JSON não têm horário"""
+    if data.startswith(ZSTD_MAGIC):
+        entry = msgpack.unpackb(zstandard.decompress(data))
+        return entry["v"], entry["t"]
+    return json.loads(data), None
+
+
+class In100Cache:
+    """
+    Cache do IN100 em dois níveis: TTLCache local na frente do Redis.
+
+    Os valores ficam comprimidos no Redis e no cache local (cada leitura
+    recebe uma cópia nova do payload). Nas leituras assíncronas com
+    `refresh`, uma margem mais antiga que IN100_STALE_AFTER é retornada
+    imediatamente e atualizada em segundo plano.
+    """
+
+    def __init__(
+        self,
+        local_maxsize: int = IN100_LOCAL_MAXSIZE,
+        local_ttl: int = IN100_LOCAL_TTL,
+        stale_after: int = IN100_STALE_AFTER,
+    ):
+        self._local: TTLCache = TTLCache(maxsize=local_maxsize, ttl=local_ttl)
+        self._lock = threading.Lock()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.stale_after = stale_after
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.bytes_raw = 0
+        self.bytes_stored = 0
+
+    def _local_get(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        with self._lock:
+            data = self._local.get(key)
+        return decode_in100(data) if data is not None else None
+
+    def _local_set(self, key: str, data: bytes):
+        with self._lock:
+            self._local[key] = data
+
+    def _encode(self, payload: Any) -> bytes:
+        data = encode_in100(payload, time.time())
+        self.bytes_raw += len(json.dumps(payload))
+        self.bytes_stored += len(data)
+        return data
+
+    def _is_stale(self, stored_at: Optional[float]) -> bool:
+        return stored_at is None or time.time() - stored_at > self.stale_after
+
+    def _from_redis(self, key: str, data: Optional[bytes]):
+        if data is None:
+            self.misses += 1
+            return None
+        self.redis_hits += 1
+        self._local_set(key, data)
+        return decode_in100(data)
+
+    def _get_many_local(self, keys: List[str]):
+        entries: Dict[str, Tuple[Any, Optional[float]]] = {}
+        remote_keys = []
+        for key in keys:
+            entry = self._local_get(key)
+            if entry is not None:
+                self.local_hits += 1
+                entries[key] = entry
+            else:
+                remote_keys.append(key)
+        return entries, remote_keys
+
+    def _get_many_remote(self, keys: List[str], values: List[Optional[bytes]]):
+        entries: Dict[str, Tuple[Any, Optional[float]]] = {}
+        for key, data in zip(keys, values):
+            entry = self._from_redis(key, data)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def get(self, key: str):
+        entry = self._local_get(key)
+        if entry is not None:
+            self.local_hits += 1
+            return entry[0]
+
+        entry = self._from_redis(key, get_redis_connection().get(key))
+        return entry[0] if entry else None
+
+    def set(self, key: str, payload: Any):
+        data = self._encode(payload)
+        get_redis_connection().set(key, data, ex=IN100_CACHE_TTL)
+        self._local_set(key, data)
 
-    r.set(id, json.dumps(in_100_data), ex=60 * 60 * 24 * 30)  # 30 days in_100_data)
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Chaves fora do cache local são lidas com um único MGET"""
+        entries, remote_keys = self._get_many_local(keys)
+        if remote_keys:
+            values = get_redis_connection().mget(remote_keys)
+            entries.update(self._get_many_remote(remote_keys, values))
+
+        return {key: payload for key, (payload, _) in entries.items()}
+
+    async def get_async(self, key: str, refresh: Optional[Refresh] = None):
+        entry = self._local_get(key)
+        if entry is not None:
+            self.local_hits += 1
+        else:
+            entry = self._from_redis(key, await get_async_redis_connection().get(key))
+            if entry is None:
+                return None
+
+        self._revalidate(key, entry[1], refresh)
+        return entry[0]
+
+    async def set_async(self, key: str, payload: Any):
+        data = self._encode(payload)
+        await get_async_redis_connection().set(key, data, ex=IN100_CACHE_TTL)
+        self._local_set(key, data)
+
+    async def get_many_async(
+        self, keys: List[str], refresh: Optional[Refresh] = None
+    ) -> Dict[str, Any]:
+        """Chaves fora do cache local são lidas com um único MGET"""
+        entries, remote_keys = self._get_many_local(keys)
+        if remote_keys:
+            values = await get_async_redis_connection().mget(remote_keys)
+            entries.update(self._get_many_remote(remote_keys, values))
+
+        for key, (_, stored_at) in entries.items():
+            self._revalidate(key, stored_at, refresh)
+
+        return {key: payload for key, (payload, _) in entries.items()}
+
+    async def set_many_async(self, items: Dict[str, Any]):
+        """Grava várias chaves em um único round-trip (pipeline)"""
+        if not items:
+            return
+
+        encoded = {key: self._encode(payload) for key, payload in items.items()}
+        async with get_async_redis_connection().pipeline(transaction=False) as pipe:
+            for key, data in encoded.items():
+                pipe.set(key, data, ex=IN100_CACHE_TTL)
+            await pipe.execute()
+
+        for key, data in encoded.items():
+            self._local_set(key, data)
+
+    def _revalidate(
+        self, key: str, stored_at: Optional[float], refresh: Optional[Refresh]
+    ):
+        if refresh is None or not self._is_stale(stored_at):
+            return
+
+        self.stale_served += 1
+        if key in self._refreshing:
+            return
+
+        task = asyncio.create_task(self._refresh(key, refresh))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: str, refresh: Refresh):
+        try:
+            payload = await refresh(key)
+            if payload is not None:
+                await self.set_async(key, payload)
+                self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning(f"Erro ao atualizar IN100 {key} em segundo plano: {str(e)}")
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (
+                (self.local_hits + self.redis_hits) / lookups if lookups else 0.0
+            ),
+            "stale_served": self.stale_served,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "refreshing": len(self._refreshing),
+            "local_size": len(self._local),
+            "local_maxsize": self._local.maxsize,
+            "bytes_raw": self.bytes_raw,
+            "bytes_stored": self.bytes_stored,
+            "compression_ratio": (
+                self.bytes_stored / self.bytes_raw if self.bytes_raw else 0.0
+            ),
+        }
+
+
+_in100_cache: Optional[In100Cache] = None
+
+
+def get_in100_cache() -> In100Cache:
+    """Retorna a instância compartilhada do cache do IN100"""
+    global _in100_cache
+    if _in100_cache is None:
+        _in100_cache = In100Cache()
+    return _in100_cache
+
+
+def add_in100_to_cache(id, in_100_data):
+    get_in100_cache().set(id, in_100_data)
 
 
 def get_in100_from_cache(id):
-    r = get_redis_connection()
+    return get_in100_cache().get(id)
+
+
+async def add_in100_to_cache_async(id, in_100_data):
+    await get_in100_cache().set_async(id, in_100_data)
+
+
+async def get_in100_from_cache_async(id, refresh: Optional[Refresh] = None):
+    return await get_in100_cache().get_async(id, refresh)
+
+
+def get_many_in100_from_cache(ids: List[str]) -> Dict[str, Any]:
+    """Busca várias chaves; chaves ausentes ficam de fora"""
+    if not ids:
+        return {}
+    return get_in100_cache().get_many(ids)
+
+
+async def get_many_in100_from_cache_async(
+    ids: List[str], refresh: Optional[Refresh] = None
+) -> Dict[str, Any]:
+    """Busca várias chaves; chaves ausentes ficam de fora"""
+    if not ids:
+        return {}
+    return await get_in100_cache().get_many_async(ids, refresh)
 
-    data = r.get(id)
-    if data is None:
-        return None
 
-    return json.loads(data)
+async def add_many_in100_to_cache_async(items: Dict[str, Any]):
+    await get_in100_cache().set_many_async(items)
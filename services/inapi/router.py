@@ -1,10 +1,34 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from apis import InApiClient
+from apis.http_clients import api_client_dependency
+from .redis_cache import get_in100_cache
+from .schemas import In100BulkRequest, In100BulkResponse
 
 router = APIRouter(prefix="/api/v1/inapi", tags=["inapi"])
 
 
 @router.get("/in100")
-async def get_in_100(cpf: str, benefit: str):
-    in_api_client = InApiClient()
-    return in_api_client.get_in_100(cpf, benefit)
+async def get_in_100(
+    cpf: str,
+    benefit: str,
+    in_api_client: InApiClient = Depends(api_client_dependency(InApiClient)),
+):
+    return await in_api_client.get_in_100(cpf, benefit)
+
+
+@router.post("/in100/bulk", response_model=In100BulkResponse)
+async def get_in_100_bulk(
+    data: In100BulkRequest,
+    in_api_client: InApiClient = Depends(api_client_dependency(InApiClient)),
+):
+    """Consulta o IN100 de vários pares (cpf, benefício) de uma vez"""
+    items = await in_api_client.get_many_in_100(
+        [(item.cpf, item.benefit) for item in data.items]
+    )
+    return {"items": items}
+
+
+@router.get("/cache/metrics")
+async def get_in100_cache_metrics():
+    """Acertos, falhas, tamanho e compressão do cache do IN100"""
+    return get_in100_cache().metrics()
@@ -0,0 +1,22 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+
+class In100Lookup(BaseModel):
+    cpf: str
+    benefit: str
+
+
+class In100BulkRequest(BaseModel):
+    items: List[In100Lookup] = Field(..., min_length=1, max_length=500)
+
+
+class In100BulkItem(BaseModel):
+    cpf: str
+    benefit: str
+    in100: Optional[Dict[str, Any]] = None
+    cached: bool
+
+
+class In100BulkResponse(BaseModel):
+    items: List[In100BulkItem]
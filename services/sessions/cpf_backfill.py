@@ -0,0 +1,113 @@
+"""
+Backfill do campo canônico `cpf_normalized` na coleção sessions.
+
+Uso:
+    python -m services.sessions.cpf_backfill [--batch-size 1000]
+
+Processa apenas sessões sem o campo, em ordem de `_id`, então pode ser
+interrompido e executado novamente para continuar de onde parou. Sessões
+sem CPF recebem `cpf_normalized: None` para não serem lidas de novo.
+"""
+
+import argparse
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from utils.cpf import CPF_FIELDS, CPF_NORMALIZED_FIELD, extract_cpf
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def ensure_cpf_index(collection) -> None:
+    """Cria o índice do campo canônico usado nas buscas por CPF"""
+    collection.create_index([(CPF_NORMALIZED_FIELD, ASCENDING)])
+
+
+def backfill_cpf_normalized(
+    collection, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, Any]:
+    """
+    Preenche `cpf_normalized` nas sessões que ainda não têm o campo
+
+    Returns:
+        Dict com total de sessões pendentes, atualizadas e sem CPF
+    """
+    ensure_cpf_index(collection)
+
+    query: Dict[str, Any] = {CPF_NORMALIZED_FIELD: {"$exists": False}}
+    projection = {field: 1 for field in CPF_FIELDS}
+
+    total = collection.count_documents(query)
+    logger.info(f"Sessões sem {CPF_NORMALIZED_FIELD}: {total}")
+
+    processed, with_cpf = 0, 0
+    last_id: Optional[Any] = None
+    started_at = time.monotonic()
+
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+
+        documents = list(
+            collection.find(batch_query, projection)
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+        )
+        if not documents:
+            break
+
+        operations = []
+        for document in documents:
+            cpf = extract_cpf(document)
+            with_cpf += 1 if cpf else 0
+            operations.append(
+                UpdateOne(
+                    {"_id": document["_id"]},
+                    {"$set": {CPF_NORMALIZED_FIELD: cpf}},
+                )
+            )
+
+        collection.bulk_write(operations, ordered=False)
+        processed += len(documents)
+        last_id = documents[-1]["_id"]
+
+        elapsed = time.monotonic() - started_at
+        rate = processed / elapsed if elapsed > 0 else 0
+        progress = processed / total * 100 if total else 100.0
+        logger.info(
+            f"Backfill {CPF_NORMALIZED_FIELD}: {processed}/{total} "
+            f"({progress:.1f}%), {rate:.0f} sessões/s"
+        )
+
+    return {
+        "total": total,
+        "processed": processed,
+        "with_cpf": with_cpf,
+        "without_cpf": processed - with_cpf,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Preenche {CPF_NORMALIZED_FIELD} na coleção sessions"
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    client = MongoClient(os.getenv("MONGODB_URL"))
+    result = backfill_cpf_normalized(
+        client["fgts_agent"]["sessions"], max(1, args.batch_size)
+    )
+    logger.info(f"Backfill concluído: {result}")
+
+
+if __name__ == "__main__":
+    main()
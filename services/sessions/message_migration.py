@@ -0,0 +1,206 @@
+"""
+Migração do histórico do chat (array `messages` da sessão) para os baldes
+da coleção session_messages.
+
+Uso:
+    python -m services.sessions.message_migration [--batch-size 200]
+
+Cada sessão tem as mensagens copiadas para baldes com posições negativas
+(antes de qualquer mensagem gravada pelo código novo), o array removido e
+`message_count` / `last_message_at` / `last_message_preview` preenchidos.
+Os baldes são regravados por inteiro, então a migração pode ser
+interrompida e executada novamente. Uma sessão que recebeu mensagens no
+formato antigo durante a cópia é mantida como está e migrada na próxima
+execução.
+"""
+
+import argparse
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient, ReplaceOne
+from utils.session_messages import (
+    MESSAGE_BUCKET_SIZE,
+    MESSAGE_COUNT_FIELD,
+    SESSION_MESSAGES,
+    bucket_of,
+    last_message_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def ensure_session_message_indexes(database) -> None:
+    """Cria o índice único (sessão, balde) usado nas leituras e no $push"""
+    database[SESSION_MESSAGES].create_index(
+        [("session_id", ASCENDING), ("bucket", ASCENDING)], unique=True
+    )
+
+
+def legacy_buckets(
+    session_id: str,
+    messages: List[Dict[str, Any]],
+    fallback_timestamp: Any,
+    bucket_size: int = MESSAGE_BUCKET_SIZE,
+) -> List[Dict[str, Any]]:
+    """Baldes (posições -len..-1) com as mensagens gravadas na sessão"""
+    buckets: Dict[int, Dict[str, Any]] = {}
+    for offset, message in enumerate(messages):
+        seq = offset - len(messages)
+        message = {
+            **message,
+            "timestamp": message.get("timestamp") or fallback_timestamp,
+            "seq": seq,
+        }
+        bucket = buckets.setdefault(
+            bucket_of(seq, bucket_size),
+            {"session_id": session_id, "bucket": bucket_of(seq, bucket_size)},
+        )
+        bucket.setdefault("messages", []).append(message)
+
+    for bucket in buckets.values():
+        timestamps = [m["timestamp"] for m in bucket["messages"] if m["timestamp"]]
+        bucket["count"] = len(bucket["messages"])
+        bucket["first_at"] = min(timestamps) if timestamps else None
+        bucket["last_at"] = max(timestamps) if timestamps else None
+    return list(buckets.values())
+
+
+def migrate_session(sessions, session_messages, document: Dict[str, Any]) -> bool:
+    """Migra uma sessão; retorna False se ela mudou durante a cópia"""
+    messages = [m for m in document.get("messages") or [] if isinstance(m, dict)]
+    session_id = document.get("session_id") or str(document["_id"])
+
+    buckets = legacy_buckets(session_id, messages, document.get("last_updated"))
+    if buckets:
+        session_messages.bulk_write(
+            [
+                ReplaceOne(
+                    {"session_id": session_id, "bucket": bucket["bucket"]},
+                    bucket,
+                    upsert=True,
+                )
+                for bucket in buckets
+            ],
+            ordered=False,
+        )
+
+    update: Dict[str, Any] = {
+        "$unset": {"messages": ""},
+        "$inc": {MESSAGE_COUNT_FIELD: len(messages)},
+    }
+    # Mensagens gravadas depois do deploy já preencheram o resumo
+    if messages and not document.get(MESSAGE_COUNT_FIELD):
+        update["$set"] = last_message_fields(
+            {
+                **messages[-1],
+                "timestamp": messages[-1].get("timestamp")
+                or document.get("last_updated"),
+            }
+        )
+
+    legacy = document.get("messages")
+    result = sessions.update_one(
+        {
+            "_id": document["_id"],
+            "messages": (
+                {"$size": len(legacy)} if isinstance(legacy, list) else legacy
+            ),
+        },
+        update,
+    )
+    return result.modified_count == 1
+
+
+def migrate_session_messages(
+    sessions, session_messages, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, Any]:
+    """
+    Move o histórico de todas as sessões que ainda têm o array `messages`
+
+    Returns:
+        Dict com total de sessões pendentes, migradas, mensagens copiadas e
+        sessões alteradas durante a cópia
+    """
+    query: Dict[str, Any] = {"messages": {"$exists": True}}
+    projection = {
+        "session_id": 1,
+        "messages": 1,
+        "last_updated": 1,
+        MESSAGE_COUNT_FIELD: 1,
+    }
+
+    total = sessions.count_documents(query)
+    logger.info(f"Sessões com mensagens na própria sessão: {total}")
+
+    processed, migrated, messages, changed = 0, 0, 0, 0
+    last_id: Optional[Any] = None
+    started_at = time.monotonic()
+
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+
+        documents = list(
+            sessions.find(batch_query, projection)
+            .sort("_id", ASCENDING)
+            .limit(batch_size)
+        )
+        if not documents:
+            break
+
+        for document in documents:
+            if migrate_session(sessions, session_messages, document):
+                migrated += 1
+                messages += len(document.get("messages") or [])
+            else:
+                changed += 1
+                logger.warning(
+                    f"Sessão {document.get('session_id')} alterada durante a "
+                    f"migração, execute novamente para concluir"
+                )
+
+        processed += len(documents)
+        last_id = documents[-1]["_id"]
+
+        elapsed = time.monotonic() - started_at
+        rate = processed / elapsed if elapsed > 0 else 0
+        progress = processed / total * 100 if total else 100.0
+        logger.info(
+            f"Migração de mensagens: {processed}/{total} "
+            f"({progress:.1f}%), {rate:.0f} sessões/s"
+        )
+
+    return {
+        "total": total,
+        "migrated": migrated,
+        "messages": messages,
+        "changed": changed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=f"Move o histórico do chat das sessões para {SESSION_MESSAGES}"
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    client = MongoClient(os.getenv("MONGODB_URL"))
+    database = client["fgts_agent"]
+    ensure_session_message_indexes(database)
+    result = migrate_session_messages(
+        database["sessions"], database[SESSION_MESSAGES], max(1, args.batch_size)
+    )
+    logger.info(f"Migração concluída: {result}")
+
+
+if __name__ == "__main__":
+    main()
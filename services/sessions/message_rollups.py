@@ -0,0 +1,92 @@
+"""
+Reconstrução dos contadores de mensagens por hora (coleção message_rollups)
+a partir dos baldes de session_messages.
+
+Uso:
+    python -m services.sessions.message_rollups
+
+Os contadores são mantidos por MongoDBChatMessageHistory a cada mensagem;
+esta ferramenta preenche o histórico anterior (execute depois de
+services.sessions.message_migration) ou corrige contadores após falhas.
+Cada hora é regravada com a contagem dos baldes, então pode ser executada
+novamente a qualquer momento; mensagens gravadas durante a execução podem
+ficar fora da hora corrente até a próxima.
+"""
+
+import logging
+import os
+from typing import Any, Dict
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from utils.session_messages import MESSAGE_ROLLUPS, SESSION_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_message_rollups(session_messages) -> Dict[str, Any]:
+    """
+    Regrava os contadores de todas as horas com mensagens nos baldes
+
+    Returns:
+        Dict com o total de horas e de mensagens contadas
+    """
+    session_messages.aggregate(
+        [
+            {"$unwind": "$messages"},
+            {"$match": {"messages.timestamp": {"$type": "date"}}},
+            {
+                "$group": {
+                    "_id": {
+                        "$dateTrunc": {"date": "$messages.timestamp", "unit": "hour"}
+                    },
+                    "count": {"$sum": 1},
+                }
+            },
+            {
+                "$project": {
+                    "count": 1,
+                    "hour": {"$hour": "$_id"},
+                    "weekday": {"$dayOfWeek": "$_id"},
+                }
+            },
+            {
+                "$merge": {
+                    "into": MESSAGE_ROLLUPS,
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert",
+                }
+            },
+        ],
+        allowDiskUse=True,
+    )
+
+    rollups = session_messages.database[MESSAGE_ROLLUPS]
+    totals = list(
+        rollups.aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": None,
+                        "hours": {"$sum": 1},
+                        "messages": {"$sum": "$count"},
+                    }
+                }
+            ]
+        )
+    )
+    return {
+        "hours": totals[0]["hours"] if totals else 0,
+        "messages": totals[0]["messages"] if totals else 0,
+    }
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    client = MongoClient(os.getenv("MONGODB_URL"))
+    result = rebuild_message_rollups(client["fgts_agent"][SESSION_MESSAGES])
+    logger.info(f"Contadores de mensagens reconstruídos: {result}")
+
+
+if __name__ == "__main__":
+    main()
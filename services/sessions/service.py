@@ -4,6 +4,8 @@ from memory import MongoDBMemoryManager
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
 import pytz
+from utils.cpf import CPF_NORMALIZED_FIELD, normalize_cpf
+from utils.mongo import get_async_mongo_client
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +14,13 @@ BR_TZ = pytz.timezone("America/Sao_Paulo")
 
 
 class SessionService:
-    def __init__(self, memory_manager: MongoDBMemoryManager):
+    def __init__(
+        self,
+        memory_manager: MongoDBMemoryManager,
+        client: Optional[AsyncIOMotorClient] = None,
+    ):
         self.memory_manager = memory_manager
-        self.client = AsyncIOMotorClient(memory_manager.mongo_url)
+        self.client = client or get_async_mongo_client()
         self.db = self.client["fgts_agent"]
         self.collection = self.db["sessions"]
 
@@ -38,6 +44,7 @@ class SessionService:
             session = {
                 "session_id": session_id,
                 "customer_data": {"customer_info": customer_info},
+                CPF_NORMALIZED_FIELD: normalize_cpf(customer_info["cpf"]),
                 "created_at": datetime.now(BR_TZ),
                 "status": "active",
                 "source": "trafego",
@@ -1,13 +1,15 @@
 from .base import BankSimulator, SimulationResult, BankInfo
 from apis import FactaApi
+from apis.http_clients import get_api_client
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class FactaBankSimulator(BankSimulator):
-    def __init__(self):
-        self.client = FactaApi()
+    def __init__(self, client: Optional[FactaApi] = None):
+        self.client = client or get_api_client(FactaApi)
 
     @property
     def bank_name(self) -> str:
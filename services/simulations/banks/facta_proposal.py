@@ -3,19 +3,22 @@ from models.vctex.models import SendProposalInput
 from typing import Dict, Any, Optional
 import logging
 from apis.facta_api_client import FactaApi
-from pymongo import MongoClient
-import os
+from apis.http_clients import get_api_client
+from motor.motor_asyncio import AsyncIOMotorClient
+from repositories import SimulationRepository
 
 logger = logging.getLogger(__name__)
 
 
 class FactaBankProposal(BankProposal):
-    def __init__(self):
-        self.client = FactaApi()
-        # Inicializar conexão com MongoDB para buscar dados da simulação
-        self.mongo_client = MongoClient(os.getenv("MONGODB_URL"))
-        self.db = self.mongo_client["fgts_agent"]
-        self.simulations = self.db["fgts_simulations"]
+    def __init__(
+        self,
+        client: Optional[FactaApi] = None,
+        mongo_client: Optional[AsyncIOMotorClient] = None,
+    ):
+        self.client = client or get_api_client(FactaApi)
+        # Simulações armazenadas, usadas para buscar o CPF da simulação
+        self.simulations = SimulationRepository(mongo_client)
 
     @property
     def bank_name(self) -> str:
@@ -31,27 +34,31 @@ class FactaBankProposal(BankProposal):
         normalized_id = simulation_id.replace("facta_", "")
 
         # Estratégia 1: Buscar simulação pelo ID exato
-        simulation = self.simulations.find_one({"financial_id": search_id})
+        simulation = await self.simulations.get_by_financial_id(search_id, {"cpf": 1})
         if simulation and "cpf" in simulation:
             cpf = simulation.get("cpf")
             return cpf
 
         # Estratégia 2: Buscar simulação pelo ID normalizado
-        simulation = self.simulations.find_one({"financial_id": normalized_id})
+        simulation = await self.simulations.get_by_financial_id(
+            normalized_id, {"cpf": 1}
+        )
         if simulation and "cpf" in simulation:
             cpf = simulation.get("cpf")
             return cpf
 
         # Estratégia 3: Buscar simulação onde o raw_response contenha o ID
-        simulation = self.simulations.find_one(
-            {"raw_response.simulacao_fgts": normalized_id}
+        simulation = await self.simulations.find_one(
+            {"raw_response.simulacao_fgts": normalized_id}, {"cpf": 1}
         )
         if simulation and "cpf" in simulation:
             cpf = simulation.get("cpf")
             return cpf
 
         # Estratégia 4: Procurar em todas as simulações do banco FACTA
-        simulations = list(self.simulations.find({"bank_name": "FACTA"}))
+        simulations = await self.simulations.find(
+            {"bank_name": "FACTA"}, {"cpf": 1, "raw_response.simulacao_fgts": 1}
+        )
 
         for sim in simulations:
             raw = sim.get("raw_response", {})
@@ -1,4 +1,5 @@
 from .base import BankSimulator, SimulationResult, BankInfo
+from apis.single_flight import single_flight
 import aiohttp
 import os
 import logging
@@ -21,6 +22,7 @@ class QIBankSimulator(BankSimulator):
             active=True,
         )
 
+    @single_flight("qi.simulation")
     async def simulate(self, cpf: str) -> SimulationResult:
         try:
             token = await self._authenticate()
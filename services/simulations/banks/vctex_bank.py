@@ -1,14 +1,16 @@
 from .base import BankSimulator, SimulationResult, BankInfo
 import logging
 from apis.vctex_api_client import VCTEXAPIClient
+from apis.http_clients import get_api_client
 from aiohttp import ClientTimeout
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 
 class VCTEXBankSimulator(BankSimulator):
-    def __init__(self):
-        self.client = VCTEXAPIClient()
+    def __init__(self, client: Optional[VCTEXAPIClient] = None):
+        self.client = client or get_api_client(VCTEXAPIClient)
         self.timeout = ClientTimeout(total=90)
 
     @property
@@ -1,16 +1,17 @@
 from .base import BankProposal, ProposalResult
 from models.vctex.models import SendProposalInput
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
 from apis.vctex_api_client import VCTEXAPIClient
+from apis.http_clients import get_api_client
 import time
 
 logger = logging.getLogger(__name__)
 
 
 class VCTEXBankProposal(BankProposal):
-    def __init__(self):
-        self.client = VCTEXAPIClient()
+    def __init__(self, client: Optional[VCTEXAPIClient] = None):
+        self.client = client or get_api_client(VCTEXAPIClient)
 
     @property
     def bank_name(self) -> str:
@@ -37,4 +37,4 @@ def get_simulation_service() -> SimulationService:
 @router.get("/banks", response_model=Dict[str, Any])
 async def list_banks(service: SimulationService = Depends(get_simulation_service)):
     """Lista todos os bancos disponíveis para simulação"""
-    return service.list_banks()
+    return await service.list_banks()
@@ -0,0 +1,397 @@
+from typing import Dict, List, Any, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import math
+import os
+import socket
+import uuid
+from utils.mongo import get_async_mongo_client
+from .batch_service import BatchSimulationService, RETRY_ALL
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Um job "running" sem heartbeat por mais que LEASE_TIMEOUT é considerado
+# abandonado (worker reiniciado) e pode ser retomado por outro worker.
+HEARTBEAT_INTERVAL = 30
+LEASE_TIMEOUT = int(os.getenv("BATCH_JOB_LEASE_TIMEOUT", "120"))
+WATCH_INTERVAL = 60
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_running_jobs: Dict[str, asyncio.Task] = {}
+_watcher_task: Optional[asyncio.Task] = None
+
+
+class BatchJobService:
+    """Executa simulações em lote em segundo plano com progresso persistido"""
+
+    def __init__(self, client: Optional[AsyncIOMotorClient] = None):
+        self.client = client or get_async_mongo_client()
+        self.db = self.client["fgts_agent"]
+        self.jobs = self.db["batch_jobs"]
+        self.job_results = self.db["batch_job_results"]
+
+    async def ensure_indexes(self):
+        await self.jobs.create_index("job_id", unique=True)
+        await self.jobs.create_index(
+            [("status", ASCENDING), ("heartbeat_at", ASCENDING)]
+        )
+        await self.job_results.create_index([("job_id", ASCENDING), ("_id", ASCENDING)])
+        await self.job_results.create_index([("job_id", ASCENDING), ("cpf", ASCENDING)])
+        # Consulta de resultados existentes no modo incremental
+        await self.db["batch_simulations"].create_index("cpf")
+
+    async def create_job(
+        self,
+        bank_name: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        incremental: bool = False,
+        retry_errors: str = RETRY_ALL,
+        freshness_hours: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Cria um job de simulação em lote e o coloca em execução
+
+        O total de sessões é contado pelo próprio job, em paralelo com o
+        processamento, para que a criação retorne sem varrer as sessões.
+        """
+        now = datetime.utcnow()
+
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "status": JOB_QUEUED,
+            "bank_name": bank_name,
+            "concurrency": concurrency,
+            "incremental": incremental,
+            "retry_errors": retry_errors,
+            "freshness_hours": freshness_hours,
+            "total_sessions": None,
+            "scanned_sessions": 0,
+            "processed_count": 0,
+            "success_count": 0,
+            "error_count": 0,
+            "checkpoint": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.jobs.insert_one(job)
+        logger.info(f"Job de simulação em lote criado: {job['job_id']}")
+
+        self.start_job(job["job_id"])
+        return self._format_job(job)
+
+    def start_job(self, job_id: str):
+        """Agenda a execução do job neste worker"""
+        if job_id in _running_jobs:
+            return
+        _running_jobs[job_id] = asyncio.create_task(self._run_job(job_id))
+
+    async def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.jobs.find_one({"job_id": job_id})
+        if not job:
+            return None
+        return self._format_job(job)
+
+    async def get_job_results(
+        self,
+        job_id: str,
+        page: int = 1,
+        per_page: int = 50,
+        success: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Retorna os resultados por CPF de um job com paginação"""
+        query: Dict[str, Any] = {"job_id": job_id}
+        if success is not None:
+            query["success"] = success
+
+        total = await self.job_results.count_documents(query)
+        total_pages = math.ceil(total / per_page) if total > 0 else 1
+
+        cursor = (
+            self.job_results.find(query, {"_id": 0, "job_id": 0})
+            .sort("_id", ASCENDING)
+            .skip((page - 1) * per_page)
+            .limit(per_page)
+        )
+
+        return {
+            "items": await cursor.to_list(length=per_page),
+            "page": page,
+            "per_page": per_page,
+            "total_pages": total_pages,
+            "total_items": total,
+            "has_next": page < total_pages,
+            "has_prev": page > 1,
+        }
+
+    async def list_jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        cursor = self.jobs.find({}).sort("created_at", DESCENDING).limit(limit)
+        return [self._format_job(job) for job in await cursor.to_list(length=limit)]
+
+    async def resume_pending_jobs(self):
+        """Retoma jobs na fila ou abandonados por um worker que parou"""
+        try:
+            stale = datetime.utcnow() - timedelta(seconds=LEASE_TIMEOUT)
+            cursor = self.jobs.find(
+                {
+                    "$or": [
+                        {"status": JOB_QUEUED},
+                        {"status": JOB_RUNNING, "heartbeat_at": {"$lt": stale}},
+                    ]
+                },
+                {"job_id": 1},
+            )
+            async for job in cursor:
+                logger.info(f"Retomando job de simulação em lote: {job['job_id']}")
+                self.start_job(job["job_id"])
+        except Exception as e:
+            logger.error(f"Erro ao retomar jobs de simulação em lote: {str(e)}")
+
+    async def _claim_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Marca o job como em execução por este worker, se estiver livre"""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=LEASE_TIMEOUT)
+        job = await self.jobs.find_one_and_update(
+            {
+                "job_id": job_id,
+                "$or": [
+                    {"status": JOB_QUEUED},
+                    {"status": JOB_RUNNING, "heartbeat_at": {"$lt": stale}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "worker_id": WORKER_ID,
+                    "heartbeat_at": now,
+                    "updated_at": now,
+                }
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if not job:
+            return None
+
+        # Base do cálculo de vazão desta execução
+        await self.jobs.update_one(
+            {"job_id": job_id},
+            {
+                "$set": {
+                    "run_started_at": now,
+                    "run_scanned_start": job.get("scanned_sessions", 0),
+                    "started_at": job.get("started_at") or now,
+                }
+            },
+        )
+        return job
+
+    async def _run_job(self, job_id: str):
+        job = None
+        heartbeat = None
+        counter = None
+        try:
+            job = await self._claim_job(job_id)
+            if not job:
+                logger.info(f"Job {job_id} já está em execução em outro worker")
+                return
+
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            batch_service = BatchSimulationService()
+            if job.get("total_sessions") is None:
+                counter = asyncio.create_task(
+                    self._count_sessions(job_id, batch_service)
+                )
+            skip_cpfs = set(
+                await self.job_results.distinct(
+                    "cpf", {"job_id": job_id, "cpf": {"$ne": None}}
+                )
+            )
+
+            async def on_flush(records, checkpoint, completed):
+                await self._record_progress(job_id, records, checkpoint, completed)
+
+            await batch_service.process_batch_simulations(
+                bank_name=job.get("bank_name"),
+                concurrency=job.get("concurrency"),
+                start_after=job.get("checkpoint"),
+                skip_cpfs=skip_cpfs,
+                on_flush=on_flush,
+                collect_results=False,
+                incremental=job.get("incremental", False),
+                retry_errors=job.get("retry_errors", RETRY_ALL),
+                freshness_hours=job.get("freshness_hours"),
+            )
+
+            await self._finish_job(job_id, JOB_COMPLETED)
+            logger.info(f"Job de simulação em lote concluído: {job_id}")
+
+        except asyncio.CancelledError:
+            # Desligamento do worker: devolve o job para a fila
+            if job:
+                await self.jobs.update_one(
+                    {"job_id": job_id, "worker_id": WORKER_ID},
+                    {"$set": {"status": JOB_QUEUED, "updated_at": datetime.utcnow()}},
+                )
+                logger.info(f"Job {job_id} interrompido, será retomado do checkpoint")
+            raise
+        except Exception as e:
+            logger.error(f"Erro no job de simulação em lote {job_id}: {str(e)}")
+            await self._finish_job(job_id, JOB_FAILED, str(e))
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+            if counter:
+                counter.cancel()
+            _running_jobs.pop(job_id, None)
+
+    async def _count_sessions(self, job_id: str, batch_service: BatchSimulationService):
+        """Conta as sessões do lote e grava o total usado no progresso e ETA"""
+        try:
+            total = await batch_service.count_source_sessions()
+            await self.jobs.update_one(
+                {"job_id": job_id}, {"$set": {"total_sessions": total}}
+            )
+        except Exception as e:
+            # Sem o total o job continua, apenas sem progresso e ETA
+            logger.error(f"Erro ao contar sessões do job {job_id}: {str(e)}")
+
+    async def _record_progress(
+        self,
+        job_id: str,
+        records: List[Dict[str, Any]],
+        checkpoint: Optional[ObjectId],
+        completed: int,
+    ):
+        """Persiste os resultados gravados e avança contadores e checkpoint"""
+        now = datetime.utcnow()
+        if records:
+            await self.job_results.insert_many(
+                [{**record, "job_id": job_id, "created_at": now} for record in records],
+                ordered=False,
+            )
+
+        update: Dict[str, Any] = {
+            "$inc": {
+                "scanned_sessions": completed,
+                "processed_count": len(records),
+                "success_count": sum(1 for r in records if r.get("success")),
+                "error_count": sum(1 for r in records if not r.get("success")),
+            },
+            "$set": {"updated_at": now, "heartbeat_at": now},
+        }
+        if checkpoint is not None:
+            update["$set"]["checkpoint"] = checkpoint
+
+        await self.jobs.update_one({"job_id": job_id}, update)
+
+    async def _finish_job(
+        self, job_id: str, status: str, error_message: Optional[str] = None
+    ):
+        now = datetime.utcnow()
+        await self.jobs.update_one(
+            {"job_id": job_id},
+            {
+                "$set": {
+                    "status": status,
+                    "error_message": error_message,
+                    "finished_at": now,
+                    "updated_at": now,
+                }
+            },
+        )
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self.jobs.update_one(
+                    {"job_id": job_id, "worker_id": WORKER_ID},
+                    {"$set": {"heartbeat_at": datetime.utcnow()}},
+                )
+            except Exception as e:
+                logger.error(f"Erro ao atualizar heartbeat do job {job_id}: {str(e)}")
+
+    def _format_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Monta o status do job com vazão e ETA da execução atual
+
+        Enquanto o total de sessões não foi contado, progresso e ETA são None.
+        """
+        total = job.get("total_sessions")
+        scanned = job.get("scanned_sessions", 0)
+
+        throughput = None
+        eta_seconds = None
+        run_started_at = job.get("run_started_at")
+        if job.get("status") == JOB_RUNNING and run_started_at:
+            elapsed = (datetime.utcnow() - run_started_at).total_seconds()
+            run_scanned = scanned - job.get("run_scanned_start", 0)
+            if elapsed > 0 and run_scanned > 0:
+                throughput = run_scanned / elapsed
+                if total is not None:
+                    eta_seconds = max(total - scanned, 0) / throughput
+
+        if total is None:
+            progress = 100.0 if job.get("status") == JOB_COMPLETED else None
+        else:
+            progress = round(scanned / total * 100, 2) if total else 100.0
+
+        return {
+            "job_id": job["job_id"],
+            "status": job.get("status"),
+            "bank_name": job.get("bank_name"),
+            "incremental": job.get("incremental", False),
+            "total_sessions": total,
+            "scanned_sessions": scanned,
+            "processed_count": job.get("processed_count", 0),
+            "success_count": job.get("success_count", 0),
+            "error_count": job.get("error_count", 0),
+            "progress": progress,
+            "throughput_per_second": round(throughput, 3) if throughput else None,
+            "eta_seconds": round(eta_seconds) if eta_seconds is not None else None,
+            "error_message": job.get("error_message"),
+            "created_at": job.get("created_at"),
+            "started_at": job.get("started_at"),
+            "finished_at": job.get("finished_at"),
+            "updated_at": job.get("updated_at"),
+        }
+
+
+async def _watch_jobs():
+    service = BatchJobService()
+    while True:
+        await service.resume_pending_jobs()
+        await asyncio.sleep(WATCH_INTERVAL)
+
+
+async def start_batch_job_runner():
+    """Cria os índices e inicia a retomada periódica de jobs pendentes"""
+    global _watcher_task
+    try:
+        await BatchJobService().ensure_indexes()
+    except Exception as e:
+        logger.error(f"Erro ao criar índices de jobs em lote: {str(e)}")
+    if _watcher_task is None or _watcher_task.done():
+        _watcher_task = asyncio.create_task(_watch_jobs())
+
+
+async def stop_batch_job_runner():
+    """Interrompe os jobs deste worker, devolvendo-os para a fila"""
+    global _watcher_task
+    if _watcher_task:
+        _watcher_task.cancel()
+        _watcher_task = None
+
+    tasks = list(_running_jobs.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, Query
-from typing import Dict, Any, Optional
-from .batch_service import BatchSimulationService
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Dict, Any, List, Optional
+from .batch_service import BatchSimulationService, RETRY_ALL
+from .batch_jobs import BatchJobService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,11 +13,29 @@ def get_batch_service():
     return BatchSimulationService()
 
 
+def get_batch_job_service():
+    return BatchJobService()
+
+
 @router.post("/run", response_model=Dict[str, Any])
 async def run_batch_simulations(
     bank_name: Optional[str] = Query(
         None, description="Nome do banco específico ou todos"
     ),
+    concurrency: Optional[int] = Query(
+        None, ge=1, le=100, description="CPFs simulados ao mesmo tempo"
+    ),
+    incremental: bool = Query(
+        False, description="Simula apenas bancos sem resultado válido recente"
+    ),
+    retry_errors: str = Query(
+        RETRY_ALL,
+        pattern="^(all|transient|none)$",
+        description="Falhas a repetir no modo incremental: all, transient ou none",
+    ),
+    freshness_hours: Optional[float] = Query(
+        None, gt=0, description="Janela de validade dos resultados (horas)"
+    ),
     service: BatchSimulationService = Depends(get_batch_service),
 ):
     """
@@ -24,10 +43,17 @@ async def run_batch_simulations(
     em uma tabela auxiliar específica de forma simplificada
     """
     try:
-        result = await service.process_batch_simulations(bank_name)
+        result = await service.process_batch_simulations(
+            bank_name,
+            concurrency=concurrency,
+            incremental=incremental,
+            retry_errors=retry_errors,
+            freshness_hours=freshness_hours,
+        )
         return {
             "success": True,
             "processed_count": result["processed_count"],
+            "skipped_fresh_count": result["skipped_fresh_count"],
             "success_count": result["success_count"],
             "error_count": result["error_count"],
             "results": result["results"],
@@ -54,3 +80,68 @@ async def get_batch_simulation_results(
     except Exception as e:
         logger.error(f"Erro ao buscar resultados de simulações em lote: {str(e)}")
         return {"success": False, "error": str(e)}
+
+
+@router.post("/jobs", response_model=Dict[str, Any], status_code=202)
+async def create_batch_job(
+    bank_name: Optional[str] = Query(
+        None, description="Nome do banco específico ou todos"
+    ),
+    concurrency: Optional[int] = Query(
+        None, ge=1, le=100, description="CPFs simulados ao mesmo tempo"
+    ),
+    incremental: bool = Query(
+        False, description="Simula apenas bancos sem resultado válido recente"
+    ),
+    retry_errors: str = Query(
+        RETRY_ALL,
+        pattern="^(all|transient|none)$",
+        description="Falhas a repetir no modo incremental: all, transient ou none",
+    ),
+    freshness_hours: Optional[float] = Query(
+        None, gt=0, description="Janela de validade dos resultados (horas)"
+    ),
+    service: BatchJobService = Depends(get_batch_job_service),
+):
+    """
+    Cria um job de simulações em lote executado em segundo plano e retorna
+    imediatamente o identificador para acompanhamento do progresso
+    """
+    return await service.create_job(
+        bank_name, concurrency, incremental, retry_errors, freshness_hours
+    )
+
+
+@router.get("/jobs", response_model=List[Dict[str, Any]])
+async def list_batch_jobs(
+    limit: int = Query(20, ge=1, le=100, description="Quantidade de jobs"),
+    service: BatchJobService = Depends(get_batch_job_service),
+):
+    """Lista os jobs de simulação em lote mais recentes"""
+    return await service.list_jobs(limit)
+
+
+@router.get("/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_batch_job_status(
+    job_id: str,
+    service: BatchJobService = Depends(get_batch_job_service),
+):
+    """Retorna progresso, vazão e ETA de um job de simulação em lote"""
+    job = await service.get_job_status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job não encontrado: {job_id}")
+    return job
+
+
+@router.get("/jobs/{job_id}/results", response_model=Dict[str, Any])
+async def get_batch_job_results(
+    job_id: str,
+    page: int = Query(1, ge=1, description="Número da página"),
+    per_page: int = Query(50, ge=1, le=500, description="Itens por página"),
+    success: Optional[bool] = Query(None, description="Filtrar por sucesso"),
+    service: BatchJobService = Depends(get_batch_job_service),
+):
+    """Retorna os resultados por CPF de um job com paginação"""
+    if not await service.get_job_status(job_id):
+        raise HTTPException(status_code=404, detail=f"Job não encontrado: {job_id}")
+    return await service.get_job_results(job_id, page, per_page, success)
@@ -1,248 +1,370 @@
-from typing import Dict, List, Any, Optional
-from pymongo import MongoClient, DESCENDING
-from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Set, Tuple
+from pymongo import DESCENDING, UpdateOne
+from bson.objectid import ObjectId
+from collections import deque
+from datetime import datetime, timedelta
+import asyncio
 import logging
 import os
 import math
+import re
+from utils.cpf import CPF_FIELDS, CPF_NORMALIZED_FIELD
+from repositories import (
+    BATCH_RESULT_PROJECTION,
+    BatchResultRepository,
+    SessionRepository,
+)
 from .services import SimulationService
+from .rate_limit import BankRateLimiter
 from .banks.vctex_bank import VCTEXBankSimulator
 from .banks.facta_bank import FactaBankSimulator
 
 logger = logging.getLogger(__name__)
 
 
+# Limites por banco no lote. A FACTA aceita 2 req/s e cada simulação faz
+# três chamadas (base offline, saldo e cálculo), logo ~0.66 simulação/s.
+DEFAULT_BANK_LIMITS = {
+    "FACTA": {"max_concurrency": 1, "rate_per_second": 2 / 3},
+    "VCTEX": {"max_concurrency": 5, "rate_per_second": None},
+}
+
+# Modo incremental: validade padrão de um resultado e CPFs por consulta
+DEFAULT_FRESHNESS = timedelta(hours=24)
+INCREMENTAL_LOOKUP_SIZE = 200
+
+# Falhas a repetir no modo incremental
+RETRY_ALL = "all"
+RETRY_TRANSIENT = "transient"
+RETRY_NONE = "none"
+
+# Padrões (palavras inteiras) de mensagens de erro que indicam falha
+# temporária (vale repetir). Os códigos HTTP só contam em contexto HTTP
+# ("status 503", "HTTP 502", "erro 504" ou o "503, message=" do aiohttp),
+# para não casar com valores como "R$ 500". Timeouts são identificados pelo
+# `timed_out` do resultado.
+TRANSIENT_ERROR_PATTERNS = re.compile(
+    r"|".join(
+        [
+            r"\btempo limite\b",
+            r"\bdeadline\b",
+            r"\btime ?out\b",
+            r"\btimed out\b",
+            r"\b(?:http|status|code|c[óo]digo|erro|error)\W{0,3}(?:429|50[0234])\b",
+            r"\b(?:429|50[0234]), message=",
+            r"\blimite de requisições\b",
+            r"\btoo many requests\b",
+            r"\binternal server error\b",
+            r"\bbad gateway\b",
+            r"\bservice unavailable\b",
+            r"\bgateway time-?out\b",
+            r"\bcannot connect\b",
+            r"\bconnection (?:refused|reset|aborted|timed out|closed)\b",
+            r"\bserver disconnected\b",
+            r"\bfalha de conexão\b",
+            r"\berro de conexão\b",
+            r"\bcircuito aberto\b",
+        ]
+    ),
+    re.IGNORECASE,
+)
+
+
+def is_transient_error(message: Optional[str]) -> bool:
+    """Indica se a mensagem de erro do banco corresponde a uma falha temporária"""
+    if not message:
+        return False
+    return TRANSIENT_ERROR_PATTERNS.search(str(message)) is not None
+
+
+# (registros gravados, checkpoint, sessões concluídas desde a última chamada)
+FlushCallback = Callable[
+    [List[Dict[str, Any]], Optional[ObjectId], int], Awaitable[None]
+]
+
+DEFAULT_CONCURRENCY = int(os.getenv("BATCH_SIMULATION_CONCURRENCY", "10"))
+DEFAULT_WRITE_BATCH_SIZE = int(os.getenv("BATCH_SIMULATION_WRITE_BATCH_SIZE", "100"))
+
+
 class BatchSimulationService:
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
-        self.db = self.client["fgts_agent"]
-        self.batch_results = self.db["batch_simulations"]
+    def __init__(
+        self,
+        sessions: Optional[SessionRepository] = None,
+        batch_results: Optional[BatchResultRepository] = None,
+    ):
+        self.sessions = sessions or SessionRepository()
+        self.batch_results = batch_results or BatchResultRepository()
 
         self.simulation_service = SimulationService()
         self.simulation_service.register_bank(VCTEXBankSimulator())
         self.simulation_service.register_bank(FactaBankSimulator())
 
-    def list_collections(self) -> List[str]:
+        for bank_name, limits in DEFAULT_BANK_LIMITS.items():
+            self.simulation_service.set_bank_limiter(
+                bank_name, BankRateLimiter(**limits)
+            )
+
+    async def list_collections(self) -> List[str]:
         """Lista todas as coleções disponíveis no banco de dados"""
-        return self.db.list_collection_names()
+        return await self.sessions.db.list_collection_names()
 
     async def process_batch_simulations(
         self,
         bank_name: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        write_batch_size: Optional[int] = None,
+        start_after: Optional[ObjectId] = None,
+        skip_cpfs: Optional[Set[str]] = None,
+        on_flush: Optional[FlushCallback] = None,
+        collect_results: bool = True,
+        incremental: bool = False,
+        retry_errors: str = RETRY_ALL,
+        freshness_hours: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         Processa simulações em lote para propostas na esteira
 
+        Os CPFs são extraídos e deduplicados no Mongo (ver
+        `_build_cpf_pipeline`), simulados por `concurrency` workers e gravados
+        em `batch_simulations` em lotes de `UpdateOne(upsert=True)`.
+
         Args:
             bank_name: Nome do banco específico para simulação ou None para todos
-            collection_name: Nome da coleção a consultar
+            concurrency: Quantidade de CPFs simulados ao mesmo tempo
+            write_batch_size: Quantidade de resultados por bulk_write
+            start_after: Retoma o processamento após esta sessão (checkpoint)
+            skip_cpfs: CPFs já processados que devem ser ignorados
+            on_flush: Callback chamado após cada gravação com os registros
+                gravados, o checkpoint e a quantidade de sessões concluídas
+            collect_results: Se False, não acumula os registros na resposta
+            incremental: Se True, simula apenas os bancos sem resultado, com
+                resultado vencido (janela de validade por banco) ou com falha
+            retry_errors: Falhas a repetir no modo incremental: "all",
+                "transient" (timeouts, 429, 5xx, conexão) ou "none"
+            freshness_hours: Janela de validade para todos os bancos; se None,
+                usa BATCH_FRESHNESS_HOURS_<BANCO> ou BATCH_FRESHNESS_HOURS
 
         Returns:
             Dict com resultados do processamento
         """
+        concurrency = max(1, concurrency or DEFAULT_CONCURRENCY)
+        write_batch_size = max(1, write_batch_size or DEFAULT_WRITE_BATCH_SIZE)
+
+        if retry_errors not in (RETRY_ALL, RETRY_TRANSIENT, RETRY_NONE):
+            raise ValueError(f"Modo de repetição inválido: {retry_errors}")
+
         try:
-            collection = self.db["sessions"]
-
-            query = {
-                "$or": [
-                    {"customer_data.customer_info.cpf": {"$exists": True, "$ne": None}},
-                    {"customer_data.borrower.cpf": {"$exists": True, "$ne": None}},
-                    {"cpf": {"$exists": True, "$ne": None}},
-                    {"customer_data.cpf": {"$exists": True, "$ne": None}},
-                    {"personal_info.cpf": {"$exists": True, "$ne": None}},
-                    {"document.cpf": {"$exists": True, "$ne": None}},
-                    {"user.cpf": {"$exists": True, "$ne": None}},
-                ]
+            target_banks = await self._get_target_banks(bank_name)
+            freshness = {
+                bank: self._get_freshness_window(bank, freshness_hours)
+                for bank in target_banks
             }
 
-            total_propostas = collection.count_documents(query)
+            total_propostas = await self.sessions.count_documents(
+                self._build_source_query(start_after)
+            )
             logger.info(
-                f"Total de propostas encontradas com CPF na coleção {"sessions"}: {total_propostas}"
+                f"Total de propostas encontradas com CPF na coleção sessions: {total_propostas}"
             )
 
-            pipeline_items = list(collection.find(query))
+            results = []
+            counters = {"success": 0, "error": 0, "fresh": 0}
+            processed_cpfs = set(skip_cpfs or ())
+            skipped_count = len(processed_cpfs)
+            pending_writes: List[UpdateOne] = []
+            pending_records: List[Dict[str, Any]] = []
+            # Sessões na ordem do cursor: [_id, concluída]. O checkpoint avança
+            # apenas sobre o prefixo contíguo de sessões concluídas.
+            in_flight: deque = deque()
+            write_lock = asyncio.Lock()
+            queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+            def add_record(entry: list, record: Dict[str, Any], operation=None):
+                counters["success" if record["success"] else "error"] += 1
+                if collect_results:
+                    results.append(record)
+                pending_records.append(record)
+                if operation is not None:
+                    pending_writes.append(operation)
+                entry[1] = True
+
+            def completed_prefix() -> int:
+                """Sessões concluídas no início de `in_flight`"""
+                completed = 0
+                for entry in in_flight:
+                    if not entry[1]:
+                        break
+                    completed += 1
+                return completed
+
+            def advance_checkpoint(completed: int):
+                for _ in range(completed):
+                    in_flight.popleft()
+
+            async def flush_writes(force: bool = False):
+                async with write_lock:
+                    if not pending_records or (
+                        not force and len(pending_records) < write_batch_size
+                    ):
+                        if force and on_flush:
+                            completed = completed_prefix()
+                            if completed:
+                                await on_flush(
+                                    [], in_flight[completed - 1][0], completed
+                                )
+                                advance_checkpoint(completed)
+                        return
+                    # Sessões concluídas até aqui: seus registros estão todos
+                    # neste lote (as concluídas durante a gravação ficam para
+                    # o próximo)
+                    completed = completed_prefix()
+                    checkpoint = in_flight[completed - 1][0] if completed else None
+                    operations = pending_writes[:]
+                    records = pending_records[:]
+                    pending_writes.clear()
+                    pending_records.clear()
+                    written = False
+                    try:
+                        if operations:
+                            await self.batch_results.bulk_write(
+                                operations, ordered=False
+                            )
+                        written = True
+                        logger.info(f"{len(operations)} resultados gravados em lote")
+                        if on_flush:
+                            await on_flush(records, checkpoint, completed)
+                        # O checkpoint só avança depois de gravado e registrado
+                        advance_checkpoint(completed)
+                    except Exception as e:
+                        logger.error(f"Erro ao gravar resultados em lote: {str(e)}")
+                        # Devolve o lote para a próxima gravação
+                        if not written:
+                            pending_writes[:0] = operations
+                        pending_records[:0] = records
+                        if force:
+                            raise
+
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    try:
+                        if item is None:
+                            return
+                        entry, cpf, session_id, banks, previous = item
+                        try:
+                            record, operation = await self._simulate_cpf(
+                                cpf, session_id, bank_name, banks, previous
+                            )
+                        except Exception as e:
+                            logger.error(f"Erro ao processar proposta: {str(e)}")
+                            record, operation = {
+                                "session_id": session_id,
+                                "cpf": cpf,
+                                "success": False,
+                                "error": str(e),
+                            }, None
+
+                        add_record(entry, record, operation)
+                        await flush_writes()
+                    finally:
+                        queue.task_done()
+
+            async def dispatch(candidates: List[Tuple[list, str, str]]):
+                if not incremental:
+                    for entry, cpf, session_id in candidates:
+                        await queue.put((entry, cpf, session_id, None, None))
+                    return
+
+                # Uma consulta (índice em cpf) para todo o bloco de candidatos
+                previous_docs = await self.batch_results.find(
+                    {"cpf": {"$in": [cpf for _, cpf, _ in candidates]}},
+                    {"cpf": 1, "results": 1, "last_updated": 1},
+                )
+                existing = {doc["cpf"]: doc for doc in previous_docs}
+                now = datetime.utcnow()
+
+                for entry, cpf, session_id in candidates:
+                    previous = existing.get(cpf)
+                    banks = self._get_due_banks(
+                        previous, target_banks, freshness, retry_errors, now
+                    )
+                    if not banks:
+                        counters["fresh"] += 1
+                        entry[1] = True
+                        continue
+                    await queue.put(
+                        (
+                            entry,
+                            cpf,
+                            session_id,
+                            banks,
+                            previous.get("results", []) if previous else [],
+                        )
+                    )
 
-            logger.info(f"Quantidade de propostas a processar: {len(pipeline_items)}")
+            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+            candidates: List[Tuple[list, str, str]] = []
 
-            results = []
-            success_count = 0
-            error_count = 0
-            processed_cpfs = set()
-
-            for item in pipeline_items:
-                try:
-                    cpf = None
-
-                    possible_paths = [
-                        item.get("customer_data", {})
-                        .get("customer_info", {})
-                        .get("cpf"),
-                        item.get("customer_data", {}).get("borrower", {}).get("cpf"),
-                        item.get("cpf"),
-                        item.get("customer_data", {}).get("cpf"),
-                        item.get("personal_info", {}).get("cpf"),
-                        item.get("document", {}).get("cpf"),
-                        item.get("user", {}).get("cpf"),
-                    ]
-
-                    for path in possible_paths:
-                        if path and isinstance(path, str) and len(path) >= 11:
-                            cpf = path
-                            break
-
-                    session_id = item.get("session_id", str(item.get("_id")))
+            try:
+                # Cursor direto (sem materializar a lista) para varrer as sessões
+                cursor = self.sessions.collection.aggregate(
+                    self._build_cpf_pipeline(start_after), allowDiskUse=True
+                )
+                async for item in cursor:
+                    entry = [item["source_id"], False]
+                    in_flight.append(entry)
+
+                    session_id = item["session_id"]
+                    cpf = item.get("cpf")
 
                     if not cpf:
                         logger.warning(f"Proposta sem CPF válido: {session_id}")
-                        error_count += 1
-                        results.append(
+                        add_record(
+                            entry,
                             {
                                 "session_id": session_id,
                                 "cpf": None,
                                 "success": False,
                                 "error": "CPF não encontrado na proposta",
-                            }
+                            },
                         )
                         continue
 
-                    normalized_cpf = cpf.replace(".", "").replace("-", "")
-
-                    if normalized_cpf in processed_cpfs:
-                        logger.info(
-                            f"CPF {normalized_cpf} já processado neste batch, pulando..."
-                        )
+                    if cpf in processed_cpfs:
+                        logger.info(f"CPF {cpf} já processado, pulando...")
+                        entry[1] = True
                         continue
 
-                    processed_cpfs.add(normalized_cpf)
+                    processed_cpfs.add(cpf)
+                    candidates.append((entry, cpf, session_id))
+                    if not incremental or len(candidates) >= INCREMENTAL_LOOKUP_SIZE:
+                        await dispatch(candidates)
+                        candidates = []
 
-                    logger.info(
-                        f"Processando simulação para CPF: {normalized_cpf}, Sessão: {session_id}"
-                    )
+                if candidates:
+                    await dispatch(candidates)
 
-                    simulation_results = await self.simulation_service.simulate(
-                        normalized_cpf, bank_name
-                    )
-
-                    logger.info(
-                        f"Resultado da simulação para CPF {normalized_cpf}: {len(simulation_results)} bancos processados"
-                    )
-
-                    bank_results = []
-                    has_success = False
-
-                    for result in simulation_results:
-                        result_success = (
-                            result.available_amount > 0
-                            and result.financial_id is not None
-                            and result.financial_id != ""
-                        )
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
 
-                        bank_result = {
-                            "bank": result.bank_name,
-                            "financial_id": result.financial_id or "",
-                            "amount": result.available_amount or 0,
-                            "success": result_success,
-                        }
-
-                        if not result_success:
-                            if isinstance(result.raw_response, dict):
-                                if "message" in result.raw_response:
-                                    bank_result["error"] = result.raw_response.get(
-                                        "message"
-                                    )
-                                elif "error" in result.raw_response:
-                                    bank_result["error"] = result.raw_response.get(
-                                        "error"
-                                    )
-                                elif "mensagem" in result.raw_response:
-                                    bank_result["error"] = result.raw_response.get(
-                                        "mensagem"
-                                    )
-
-                        if result_success:
-                            has_success = True
-
-                        bank_results.append(bank_result)
-
-                    simulation_record = {
-                        "cpf": normalized_cpf,
-                        "session_id": session_id,
-                        "timestamp": datetime.utcnow(),
-                        "results": bank_results,
-                        "any_success": has_success,
-                    }
-
-                    existing_record = self.batch_results.find_one(
-                        {"cpf": normalized_cpf}
-                    )
-
-                    if existing_record:
-                        self.batch_results.update_one(
-                            {"cpf": normalized_cpf},
-                            {
-                                "$set": {
-                                    "last_updated": datetime.utcnow(),
-                                    "results": bank_results,
-                                    "any_success": has_success,
-                                },
-                                "$push": {
-                                    "simulations": {
-                                        "timestamp": datetime.utcnow(),
-                                        "results": bank_results,
-                                        "any_success": has_success,
-                                    }
-                                },
-                            },
-                        )
-                        logger.info(
-                            f"Atualizado registro existente para CPF {normalized_cpf}"
-                        )
-                    else:
-                        self.batch_results.insert_one(
-                            {
-                                "cpf": normalized_cpf,
-                                "session_id": session_id,
-                                "created_at": datetime.utcnow(),
-                                "last_updated": datetime.utcnow(),
-                                "results": bank_results,
-                                "any_success": has_success,
-                            }
-                        )
-                        logger.info(f"Criado novo registro para CPF {normalized_cpf}")
-
-                    if has_success:
-                        success_count += 1
-                    else:
-                        error_count += 1
-
-                    results.append(
-                        {
-                            "cpf": normalized_cpf,
-                            "session_id": session_id,
-                            "success": has_success,
-                            "banks": [r["bank"] for r in bank_results],
-                            "success_banks": [
-                                r["bank"] for r in bank_results if r["success"]
-                            ],
-                        }
-                    )
+            await flush_writes(force=True)
 
-                except Exception as e:
-                    logger.error(f"Erro ao processar proposta: {str(e)}")
-                    error_count += 1
-                    results.append(
-                        {
-                            "session_id": item.get("session_id", str(item.get("_id"))),
-                            "cpf": cpf if "cpf" in locals() else None,
-                            "success": False,
-                            "error": str(e),
-                        }
-                    )
+            if incremental:
+                logger.info(
+                    f"Modo incremental: {counters['fresh']} CPFs com resultado válido ignorados"
+                )
 
             return {
-                "processed_count": len(processed_cpfs),
-                "success_count": success_count,
-                "error_count": error_count,
+                "processed_count": len(processed_cpfs)
+                - skipped_count
+                - counters["fresh"],
+                "skipped_fresh_count": counters["fresh"],
+                "success_count": counters["success"],
+                "error_count": counters["error"],
                 "results": results,
             }
 
@@ -250,6 +372,242 @@ class BatchSimulationService:
             logger.error(f"Erro geral no processamento em lote: {str(e)}")
             raise
 
+    async def _get_target_banks(self, bank_name: Optional[str]) -> List[str]:
+        """Bancos que participam do lote"""
+        if bank_name:
+            return [bank_name]
+        active_banks = await self.simulation_service.get_active_banks(
+            feature="simulation"
+        )
+        return [bank for bank in active_banks if bank in self.simulation_service._banks]
+
+    @staticmethod
+    def _get_freshness_window(
+        bank_name: str, override_hours: Optional[float] = None
+    ) -> timedelta:
+        """Janela de validade de um resultado do banco no modo incremental"""
+        if override_hours is not None:
+            return timedelta(hours=override_hours)
+
+        value = os.getenv(f"BATCH_FRESHNESS_HOURS_{bank_name}") or os.getenv(
+            "BATCH_FRESHNESS_HOURS"
+        )
+        try:
+            return timedelta(hours=float(value)) if value else DEFAULT_FRESHNESS
+        except ValueError:
+            logger.warning(f"Janela de validade inválida para {bank_name}: {value}")
+            return DEFAULT_FRESHNESS
+
+    @staticmethod
+    def _get_due_banks(
+        previous: Optional[Dict[str, Any]],
+        target_banks: List[str],
+        freshness: Dict[str, timedelta],
+        retry_errors: str,
+        now: datetime,
+    ) -> List[str]:
+        """Retorna os bancos que precisam ser simulados novamente para o CPF"""
+        if not previous:
+            return list(target_banks)
+
+        by_bank = {r.get("bank"): r for r in previous.get("results", [])}
+        due = []
+        for bank in target_banks:
+            result = by_bank.get(bank)
+            if not result:
+                due.append(bank)
+                continue
+
+            if not result.get("success"):
+                transient = result.get("transient")
+                if transient is None:
+                    transient = is_transient_error(result.get("error"))
+                if retry_errors == RETRY_ALL or (
+                    retry_errors == RETRY_TRANSIENT and transient
+                ):
+                    due.append(bank)
+                    continue
+
+            simulated_at = result.get("timestamp") or previous.get("last_updated")
+            if not simulated_at or now - simulated_at > freshness[bank]:
+                due.append(bank)
+
+        return due
+
+    def _build_source_query(
+        self, start_after: Optional[ObjectId] = None
+    ) -> Dict[str, Any]:
+        """Monta o filtro de sessões com algum CPF candidato"""
+        query = {
+            "$or": [{field: {"$exists": True, "$ne": None}} for field in CPF_FIELDS]
+        }
+        if start_after is not None:
+            query["_id"] = {"$gt": start_after}
+        return query
+
+    def _build_cpf_pipeline(
+        self, start_after: Optional[ObjectId] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Monta a agregação que extrai e deduplica os CPFs das sessões no Mongo
+
+        Projeta apenas os caminhos candidatos, escolhe o primeiro CPF válido
+        (string com 11+ caracteres, sem "." e "-") com uma cadeia de `$ifNull`
+        e agrupa por CPF mantendo a primeira sessão. Sessões sem CPF válido
+        ficam em grupos próprios (cpf None). Retorna pares
+        `{cpf, session_id, source_id}` ordenados por `source_id`.
+        """
+        candidates = [
+            {
+                "$cond": [
+                    {
+                        "$and": [
+                            {"$eq": [{"$type": f"${field}"}, "string"]},
+                            {"$gte": [{"$strLenCP": f"${field}"}, 11]},
+                        ]
+                    },
+                    f"${field}",
+                    None,
+                ]
+            }
+            for field in CPF_FIELDS
+        ]
+        cpf = candidates[-1]
+        for candidate in reversed(candidates[:-1]):
+            cpf = {"$ifNull": [candidate, cpf]}
+        for char in (".", "-"):
+            cpf = {"$replaceAll": {"input": cpf, "find": char, "replacement": ""}}
+        # Sessões com o campo canônico preenchido dispensam a extração
+        cpf = {"$ifNull": [f"${CPF_NORMALIZED_FIELD}", cpf]}
+
+        return [
+            {"$match": self._build_source_query(start_after)},
+            {"$sort": {"_id": 1}},
+            {
+                "$project": {
+                    "cpf": cpf,
+                    "session_id": {"$ifNull": ["$session_id", {"$toString": "$_id"}]},
+                }
+            },
+            {
+                "$group": {
+                    "_id": {"$ifNull": ["$cpf", "$_id"]},
+                    "cpf": {"$first": "$cpf"},
+                    "session_id": {"$first": "$session_id"},
+                    "source_id": {"$first": "$_id"},
+                }
+            },
+            {"$sort": {"source_id": 1}},
+            {"$project": {"_id": 0, "cpf": 1, "session_id": 1, "source_id": 1}},
+        ]
+
+    async def count_source_sessions(self) -> int:
+        """Conta os CPFs distintos (e sessões sem CPF) que entram no lote"""
+        pipeline = self._build_cpf_pipeline() + [{"$count": "total"}]
+        result = await self.sessions.aggregate(pipeline, allowDiskUse=True)
+        return result[0]["total"] if result else 0
+
+    async def _simulate_cpf(
+        self,
+        cpf: str,
+        session_id: str,
+        bank_name: Optional[str],
+        banks: Optional[List[str]] = None,
+        previous_results: Optional[List[Dict[str, Any]]] = None,
+    ) -> Tuple[Dict[str, Any], UpdateOne]:
+        """
+        Simula um CPF e monta o resumo e a operação de gravação do resultado
+
+        Com `banks`, simula apenas esses bancos e mantém de `previous_results`
+        os resultados dos demais.
+        """
+        logger.info(f"Processando simulação para CPF: {cpf}, Sessão: {session_id}")
+
+        if banks is None:
+            simulation_results = await self.simulation_service.simulate(cpf, bank_name)
+        else:
+            per_bank = await asyncio.gather(
+                *(self.simulation_service.simulate(cpf, bank) for bank in banks)
+            )
+            simulation_results = [result for results in per_bank for result in results]
+
+        logger.info(
+            f"Resultado da simulação para CPF {cpf}: {len(simulation_results)} bancos processados"
+        )
+
+        now = datetime.utcnow()
+        bank_results = []
+        has_success = False
+
+        for result in simulation_results:
+            result_success = (
+                result.available_amount > 0
+                and result.financial_id is not None
+                and result.financial_id != ""
+            )
+
+            bank_result = {
+                "bank": result.bank_name,
+                "financial_id": result.financial_id or "",
+                "amount": result.available_amount or 0,
+                "success": result_success,
+                "timestamp": now,
+            }
+
+            if not result_success:
+                if isinstance(result.raw_response, dict):
+                    if "message" in result.raw_response:
+                        bank_result["error"] = result.raw_response.get("message")
+                    elif "error" in result.raw_response:
+                        bank_result["error"] = result.raw_response.get("error")
+                    elif "mensagem" in result.raw_response:
+                        bank_result["error"] = result.raw_response.get("mensagem")
+
+                bank_result["transient"] = result.timed_out or is_transient_error(
+                    bank_result.get("error") or result.error_message
+                )
+
+            if result_success:
+                has_success = True
+
+            bank_results.append(bank_result)
+
+        simulated_banks = {r["bank"] for r in bank_results}
+        for previous in previous_results or []:
+            if previous.get("bank") not in simulated_banks:
+                bank_results.append(previous)
+                has_success = has_success or bool(previous.get("success"))
+
+        operation = UpdateOne(
+            {"cpf": cpf},
+            {
+                "$setOnInsert": {"session_id": session_id, "created_at": now},
+                "$set": {
+                    "last_updated": now,
+                    "results": bank_results,
+                    "any_success": has_success,
+                },
+                "$push": {
+                    "simulations": {
+                        "timestamp": now,
+                        "results": bank_results,
+                        "any_success": has_success,
+                    }
+                },
+            },
+            upsert=True,
+        )
+
+        record = {
+            "cpf": cpf,
+            "session_id": session_id,
+            "success": has_success,
+            "banks": [r["bank"] for r in bank_results],
+            "success_banks": [r["bank"] for r in bank_results if r["success"]],
+        }
+
+        return record, operation
+
     async def get_batch_results(
         self,
         page: int = 1,
@@ -270,31 +628,21 @@ class BatchSimulationService:
             if bank_name:
                 query["results.bank"] = bank_name
 
-            total = self.batch_results.count_documents(query)
-            total_pages = math.ceil(total / per_page) if total > 0 else 1
-
-            skip = (page - 1) * per_page
-            cursor = (
+            # Contagem e página consultadas ao mesmo tempo
+            total, items = await asyncio.gather(
+                self.batch_results.count_documents(query),
                 self.batch_results.find(
                     query,
-                    {
-                        "_id": 0,
-                        "cpf": 1,
-                        "customer_name": 1,
-                        "session_id": 1,
-                        "last_updated": 1,
-                        "results": 1,
-                        "any_success": 1,
-                        "simulations": {"$slice": -1},
-                    },
-                )
-                .sort("last_updated", DESCENDING)
-                .skip(skip)
-                .limit(per_page)
+                    BATCH_RESULT_PROJECTION,
+                    sort=[("last_updated", DESCENDING)],
+                    skip=(page - 1) * per_page,
+                    limit=per_page,
+                ),
             )
+            total_pages = math.ceil(total / per_page) if total > 0 else 1
 
             return {
-                "items": list(cursor),
+                "items": items,
                 "page": page,
                 "per_page": per_page,
                 "total_pages": total_pages,
@@ -16,7 +16,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/proposals", tags=["proposals"])
 
 
-def get_proposal_service() -> ProposalService:
+async def get_proposal_service() -> ProposalService:
     """Dependency que configura e retorna o serviço de propostas"""
     service = ProposalService()
 
@@ -30,7 +30,7 @@ def get_proposal_service() -> ProposalService:
     }
 
     # Consultar quais provedores estão ativos
-    active_providers = service.get_active_banks(feature="proposal")
+    active_providers = await service.get_active_banks(feature="proposal")
 
     # Registrar apenas os provedores ativos
     for provider_name, provider in all_providers.items():
@@ -112,7 +112,7 @@ async def get_proposal_history(
         )
 
     try:
-        return service.get_proposal_history(financial_id, contract_number)
+        return await service.get_proposal_history(financial_id, contract_number)
     except Exception as e:
         logger.error(f"Erro ao buscar histórico: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -128,7 +128,7 @@ async def list_proposals(
 ):
     """Lista todas as propostas com paginação e filtros opcionais"""
     try:
-        return service.get_all_proposals(page, per_page, bank_name, success)
+        return await service.get_all_proposals(page, per_page, bank_name, success)
     except Exception as e:
         logger.error(f"Erro ao listar propostas: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -137,4 +137,4 @@ async def list_proposals(
 @router.get("/providers", response_model=List[str])
 async def list_providers(service: ProposalService = Depends(get_proposal_service)):
     """Lista todos os provedores de proposta disponíveis"""
-    return service.list_providers()
+    return await service.list_providers()
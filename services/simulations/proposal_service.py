@@ -1,32 +1,43 @@
 from typing import Dict, List, Any, Optional, Union
 from .banks.base import BankProposal, ProposalResult
-from pymongo import MongoClient, DESCENDING
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING
+from repositories import (
+    BANK_CONFIGS,
+    PROPOSAL_SUMMARY_PROJECTION,
+    ConfigCache,
+    ProposalRepository,
+    SessionRepository,
+    SimulationRepository,
+    get_config_cache,
+)
 from .adapters.base import BankAdapter
+import asyncio
 import logging
-import os
 from math import ceil
 from datetime import datetime
-from memory import MongoDBMemoryManager
 from models.normalized.proposal import NormalizedProposalRequest
 
 logger = logging.getLogger(__name__)
 
 
 class ProposalService:
-    def __init__(self):
+    def __init__(
+        self,
+        mongo_client: Optional[AsyncIOMotorClient] = None,
+        config_cache: Optional[ConfigCache] = None,
+    ):
         self._proposal_providers: Dict[str, BankProposal] = {}
         self._adapters: Dict[str, BankAdapter] = {}
-        self.mongo_client = MongoClient(os.getenv("MONGODB_URL"))
-        self.db = self.mongo_client["fgts_agent"]
-        self.proposals = self.db["fgts_proposals"]
-        self.simulations = self.db["fgts_simulations"]
-        self.memory_manager = MongoDBMemoryManager()
-        self.bank_config_collection = self.db["bank_configs"]
-
-    def get_active_banks(self, feature: str = "proposal") -> List[str]:
+        self.proposals = ProposalRepository(mongo_client)
+        self.simulations = SimulationRepository(mongo_client)
+        self.sessions = SessionRepository(mongo_client)
+        self.config_cache = config_cache or get_config_cache()
+
+    async def get_active_banks(self, feature: str = "proposal") -> List[str]:
         """Retorna a lista de bancos ativos para uma determinada feature"""
         try:
-            config = self.bank_config_collection.find_one({})
+            config = await self.config_cache.get_async(BANK_CONFIGS)
             if not config or "banks" not in config:
                 return list(self._proposal_providers.keys())
 
@@ -42,10 +53,10 @@ class ProposalService:
             logger.error(f"Erro ao obter bancos ativos: {str(e)}")
             return list(self._proposal_providers.keys())
 
-    def is_bank_active(self, bank_name: str, feature: str = "proposal") -> bool:
+    async def is_bank_active(self, bank_name: str, feature: str = "proposal") -> bool:
         """Verifica se um banco está ativo para uma determinada feature"""
         try:
-            config = self.bank_config_collection.find_one({})
+            config = await self.config_cache.get_async(BANK_CONFIGS)
             if not config or "banks" not in config:
                 return True
 
@@ -60,6 +71,16 @@ class ProposalService:
             logger.error(f"Erro ao verificar se banco está ativo: {str(e)}")
             return True
 
+    async def _update_session(self, session_id: str, fields: Dict[str, Any]):
+        """Grava os campos da sessão em um único update; falhas só são logadas"""
+        try:
+            await self.sessions.set_fields(session_id, fields)
+            logger.info(
+                f"Dados da sessão atualizados: {session_id}, chaves: {list(fields)}"
+            )
+        except Exception as e:
+            logger.error(f"Erro ao definir dados da sessão {session_id}: {e}")
+
     def register_provider(self, provider: BankProposal):
         """Registra um novo provedor de proposta no serviço"""
         self._proposal_providers[provider.bank_name] = provider
@@ -87,11 +108,11 @@ class ProposalService:
             else:
                 financial_id = proposal_data.financial_id
 
-            # 2. Buscar dados da simulação armazenada
-            simulation_data = self._get_simulation_data(financial_id)
-
-            # 3. Buscar dados do cliente relacionados a esta simulação
-            customer_data = self._get_customer_data(financial_id)
+            # 2 e 3. Buscar dados da simulação armazenada e do cliente
+            simulation_data, customer_data = await asyncio.gather(
+                self._get_simulation_data(financial_id),
+                self._get_customer_data(financial_id),
+            )
 
             # Se não encontrou dados do cliente, extrair da própria proposta
             if not customer_data and isinstance(proposal_data, dict):
@@ -127,13 +148,13 @@ class ProposalService:
                     customer_data = {"customer_data": extracted_customer}
 
                     # Salva os dados extraídos na sessão para uso futuro
-                    self.memory_manager.set_session_data(
-                        financial_id, "customer_data", extracted_customer
+                    await self._update_session(
+                        financial_id, {"customer_data": extracted_customer}
                     )
 
             if not target_bank:
                 # Se não foi especificado, consulta pelo financialId
-                target_bank = self._get_bank_for_financial_id(financial_id)
+                target_bank = await self._get_bank_for_financial_id(financial_id)
 
                 if not target_bank:
                     # Padrão para VCTEX se não encontrar
@@ -143,7 +164,7 @@ class ProposalService:
                     )
 
             # Verificar se o banco está ativo para propostas
-            active_banks = self.get_active_banks(feature="proposal")
+            active_banks = await self.get_active_banks(feature="proposal")
             if target_bank not in active_banks:
                 error_msg = f"Banco {target_bank} não está ativo para propostas"
                 logger.error(error_msg)
@@ -177,7 +198,7 @@ class ProposalService:
                 )
 
             # Obter a tabela ativa para o banco alvo
-            table_id = self._get_active_table_for_bank(target_bank)
+            table_id = await self._get_active_table_for_bank(target_bank)
             if table_id:
                 logger.info(
                     f"Usando tabela {table_id} para proposta com banco {target_bank}"
@@ -262,17 +283,12 @@ class ProposalService:
             result = await provider.submit_proposal(bank_specific_data)
 
             # Salvar o resultado enriquecido com os dados da simulação e do cliente
-            self._save_proposal_result(
+            await self._save_proposal_result(
                 financial_id, result, simulation_data, customer_data, normalized_data
             )
 
             # Se for bem-sucedido, atualizar a sessão com o número do contrato
             if result.success and result.contract_number:
-                # Atualiza por financial_id
-                self.memory_manager.set_session_data(
-                    financial_id, "contract_number", result.contract_number
-                )
-
                 # Converter objetos Pydantic para dicionários antes de salvar
                 original_data_dict = {}
                 if hasattr(normalized_data, "model_dump"):
@@ -280,17 +296,6 @@ class ProposalService:
                 elif isinstance(normalized_data, dict):
                     original_data_dict = normalized_data
 
-                # Salva também os metadados
-                metadata = {
-                    "proposal_created_at": datetime.utcnow(),
-                    "proposal_bank": target_bank,
-                    "proposal_sent": True,
-                    "formalization_link": result.formalization_link,
-                }
-
-                for key, value in metadata.items():
-                    self.memory_manager.set_session_data(financial_id, key, value)
-
                 # Salva separadamente os dados da proposta para evitar problemas de serialização
                 proposal_data_dict = {
                     "simulation_summary": {
@@ -314,20 +319,20 @@ class ProposalService:
                     "timestamp": datetime.utcnow().isoformat(),
                 }
 
-                self.memory_manager.set_session_data(
-                    financial_id, "proposal_data", proposal_data_dict
-                )
-
-                # Define os dados na collection customer_data
-                self.memory_manager.set_session_data(
-                    financial_id, "customer_data.proposal_sent", True
-                )
-
-                self.memory_manager.set_session_data(
-                    financial_id,
-                    "customer_data.proposal_created_at",
-                    datetime.utcnow(),
-                )
+                # Número do contrato, metadados e dados da proposta (por
+                # financial_id) gravados em um único update da sessão
+                session_fields = {
+                    "contract_number": result.contract_number,
+                    "proposal_created_at": datetime.utcnow(),
+                    "proposal_bank": target_bank,
+                    "proposal_sent": True,
+                    "formalization_link": result.formalization_link,
+                    "proposal_data": proposal_data_dict,
+                    "customer_data.proposal_sent": True,
+                    "customer_data.proposal_created_at": datetime.utcnow(),
+                    # Armazena o request original como dicionário serializado
+                    "customer_data.proposal_request": original_data_dict,
+                }
 
                 # Armazena dados da simulação que foram usados (garantindo que não são objetos Pydantic)
                 if simulation_data:
@@ -338,18 +343,11 @@ class ProposalService:
                         else:
                             simulation_data_serializable[key] = value
 
-                    self.memory_manager.set_session_data(
-                        financial_id,
-                        "customer_data.simulation_data",
-                        simulation_data_serializable,
+                    session_fields["customer_data.simulation_data"] = (
+                        simulation_data_serializable
                     )
 
-                # Armazena o request original como dicionário serializado
-                self.memory_manager.set_session_data(
-                    financial_id,
-                    "customer_data.proposal_request",
-                    original_data_dict,
-                )
+                await self._update_session(financial_id, session_fields)
 
             return result
 
@@ -376,7 +374,7 @@ class ProposalService:
             Dict com informações de status
         """
         if not bank_name:
-            bank_name = self._get_bank_for_contract(contract_number)
+            bank_name = await self._get_bank_for_contract(contract_number)
 
             if not bank_name:
                 return {
@@ -395,7 +393,7 @@ class ProposalService:
         provider = self._proposal_providers[bank_name]
         return await provider.check_status(contract_number)
 
-    def _get_bank_for_financial_id(self, financial_id: str) -> Optional[str]:
+    async def _get_bank_for_financial_id(self, financial_id: str) -> Optional[str]:
         """
         Determina qual banco usar baseado no financial_id.
 
@@ -411,31 +409,28 @@ class ProposalService:
             return "BMG"
 
         # Consulta na collection de simulações
-        simulation = self.db["fgts_simulations"].find_one(
-            {"financial_id": financial_id}
+        simulation = await self.simulations.get_by_financial_id(
+            financial_id, {"bank_provider": 1, "bank_name": 1}
         )
 
         if simulation:
             return simulation.get("bank_provider") or simulation.get("bank_name")
 
         # Consulta na memória da sessão
-        from memory import MongoDBMemoryManager
+        return await self.sessions.get_field(financial_id, "bank_provider")
 
-        memory_manager = MongoDBMemoryManager()
-        bank_provider = memory_manager.get_session_data(financial_id, "bank_provider")
-
-        return bank_provider
-
-    def _get_bank_for_contract(self, contract_number: str) -> Optional[str]:
+    async def _get_bank_for_contract(self, contract_number: str) -> Optional[str]:
         """Determina o banco para um número de contrato"""
-        proposal = self.proposals.find_one({"contract_number": contract_number})
+        proposal = await self.proposals.get_by_contract(
+            contract_number, {"bank_name": 1}
+        )
 
         if proposal:
             return proposal.get("bank_name")
 
         return None
 
-    def _save_proposal_result(
+    async def _save_proposal_result(
         self,
         financial_id: str,
         result: ProposalResult,
@@ -570,11 +565,6 @@ class ProposalService:
             else:
                 formatted_phone = ""
 
-            from memory import MongoDBMemoryManager
-
-            memory_manager = MongoDBMemoryManager()
-            sessions_collection = memory_manager.db["sessions"]
-
             clean_customer_data = {
                 "customer_info": {
                     **extracted_customer,
@@ -588,7 +578,7 @@ class ProposalService:
             }
 
             session_id = formatted_phone if formatted_phone else financial_id
-            sessions_collection.update_one(
+            await self.sessions.update_one(
                 {"session_id": session_id},
                 {
                     "$set": {
@@ -632,12 +622,12 @@ class ProposalService:
                 "timestamp": result.timestamp,
             }
 
-            self.proposals.update_one(
+            await self.proposals.update_one(
                 {"financial_id": financial_id}, {"$set": proposal_doc}, upsert=True
             )
 
             if result.contract_number:
-                self.proposals.update_one(
+                await self.proposals.update_one(
                     {"contract_number": result.contract_number},
                     {"$set": proposal_doc},
                     upsert=True,
@@ -650,7 +640,7 @@ class ProposalService:
         except Exception as e:
             logger.error(f"Erro ao salvar proposta: {str(e)}")
 
-    def get_proposal_history(
+    async def get_proposal_history(
         self, financial_id: Optional[str] = None, contract_number: Optional[str] = None
     ) -> List[Dict]:
         """
@@ -666,23 +656,11 @@ class ProposalService:
         if contract_number:
             query["contract_number"] = contract_number
 
-        return list(
-            self.proposals.find(
-                query,
-                {
-                    "_id": 0,
-                    "financial_id": 1,
-                    "bank_name": 1,
-                    "contract_number": 1,
-                    "formalization_link": 1,
-                    "success": 1,
-                    "error_message": 1,
-                    "timestamp": 1,
-                },
-            ).sort("timestamp", DESCENDING)
+        return await self.proposals.find(
+            query, PROPOSAL_SUMMARY_PROJECTION, sort=[("timestamp", DESCENDING)]
         )
 
-    def get_all_proposals(
+    async def get_all_proposals(
         self,
         page: int = 1,
         per_page: int = 10,
@@ -696,49 +674,37 @@ class ProposalService:
         if success is not None:
             query["success"] = success
 
-        # Calcula o total de documentos e páginas
-        total_docs = self.proposals.count_documents(query)
-        total_pages = ceil(total_docs / per_page)
-
-        # Aplica paginação
-        skip = (page - 1) * per_page
-        cursor = (
+        # Total de documentos e página consultados ao mesmo tempo
+        total_docs, items = await asyncio.gather(
+            self.proposals.count_documents(query),
             self.proposals.find(
                 query,
-                {
-                    "_id": 0,
-                    "financial_id": 1,
-                    "bank_name": 1,
-                    "contract_number": 1,
-                    "formalization_link": 1,
-                    "success": 1,
-                    "error_message": 1,
-                    "timestamp": 1,
-                },
-            )
-            .sort("timestamp", DESCENDING)
-            .skip(skip)
-            .limit(per_page)
+                PROPOSAL_SUMMARY_PROJECTION,
+                sort=[("timestamp", DESCENDING)],
+                skip=(page - 1) * per_page,
+                limit=per_page,
+            ),
         )
+        total_pages = ceil(total_docs / per_page)
 
         return {
-            "items": list(cursor),
+            "items": items,
             "page": page,
             "per_page": per_page,
             "total_pages": total_pages,
             "total_items": total_docs,
         }
 
-    def list_providers(self) -> List[str]:
+    async def list_providers(self) -> List[str]:
         """Lista todos os provedores de proposta disponíveis e ativos"""
-        active_providers = self.get_active_banks("proposal")
+        active_providers = await self.get_active_banks("proposal")
         return [bank for bank in active_providers if bank in self._proposal_providers]
 
-    def _get_simulation_data(self, financial_id: str) -> Dict[str, Any]:
+    async def _get_simulation_data(self, financial_id: str) -> Dict[str, Any]:
         """Busca os dados de simulação associados ao financial_id"""
         try:
             # Busca na coleção de simulações
-            simulation = self.simulations.find_one({"financial_id": financial_id})
+            simulation = await self.simulations.get_by_financial_id(financial_id)
             if simulation:
                 # Remove o ID do MongoDB para evitar problemas de serialização
                 if "_id" in simulation:
@@ -753,7 +719,7 @@ class ProposalService:
                 }
 
             # Busca na memória da sessão
-            session_simulation = self.memory_manager.get_session_data(
+            session_simulation = await self.sessions.get_field(
                 financial_id, "simulation_data"
             )
             if session_simulation:
@@ -768,19 +734,19 @@ class ProposalService:
             logger.error(f"Erro ao buscar dados da simulação: {str(e)}")
             return {}
 
-    def _get_customer_data(self, financial_id: str) -> Dict[str, Any]:
+    async def _get_customer_data(self, financial_id: str) -> Dict[str, Any]:
         """Busca os dados do cliente associados ao financial_id"""
         try:
             # Busca na memória da sessão
-            customer_data = self.memory_manager.get_session_data(
-                financial_id, "customer_data"
-            )
+            customer_data = await self.sessions.get_field(financial_id, "customer_data")
             if customer_data:
                 logger.info(f"Dados do cliente encontrados para {financial_id}")
                 return {"customer_data": customer_data}
 
             # Tenta encontrar por sessão que tenha este financial_id
-            sessions = self.db["sessions"].find_one({"financial_id": financial_id})
+            sessions = await self.sessions.get_by_financial_id(
+                financial_id, {"customer_data": 1}
+            )
             if sessions:
                 customer_data = sessions.get("customer_data", {})
                 logger.info(
@@ -789,7 +755,9 @@ class ProposalService:
                 return {"customer_data": customer_data}
 
             # Também busca nas propostas anteriores (se for um reenvio)
-            previous_proposal = self.proposals.find_one({"financial_id": financial_id})
+            previous_proposal = await self.proposals.get_by_financial_id(
+                financial_id, {"customer_details": 1}
+            )
             if previous_proposal:
                 customer_data = previous_proposal.get("customer_details", {})
                 if customer_data:
@@ -800,7 +768,7 @@ class ProposalService:
 
             # Busca também diretamente na sessão pelo financial_id como session_id
             # (alguns sistemas usam o financial_id como session_id)
-            session = self.db["sessions"].find_one({"session_id": financial_id})
+            session = await self.sessions.get(financial_id, {"customer_data": 1})
             if session:
                 customer_data = session.get("customer_data", {})
                 logger.info(
@@ -814,7 +782,7 @@ class ProposalService:
             logger.error(f"Erro ao buscar dados do cliente: {str(e)}")
             return {}
 
-    def _get_active_table_for_bank(self, bank_name: str) -> Optional[str]:
+    async def _get_active_table_for_bank(self, bank_name: str) -> Optional[str]:
         """
         Retorna o ID da tabela ativa para um banco específico
 
@@ -825,17 +793,8 @@ class ProposalService:
             ID da tabela ativa ou None se não encontrar
         """
         try:
-            config = self.db["table_configs"].find_one({})
-            if not config or "tables" not in config:
-                return None
-
-            for table_id, table_info in config["tables"].items():
-                if table_info.get("bank_name") == bank_name and table_info.get(
-                    "active", True
-                ):
-                    return table_id
-
-            return None
+            active_tables = await self.config_cache.active_tables_async()
+            return active_tables.get(bank_name)
         except Exception as e:
             logger.error(f"Erro ao obter tabela ativa para banco {bank_name}: {str(e)}")
             return None
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class BankRateLimiter:
+    """
+    Limita a concorrência e a taxa de simulações enviadas a um banco.
+
+    Combina um semáforo (simulações simultâneas) com um espaçamento mínimo
+    entre o início de cada simulação (simulações por segundo).
+    """
+
+    def __init__(
+        self, max_concurrency: int = 1, rate_per_second: Optional[float] = None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_per_second = rate_per_second
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def _wait_for_slot(self) -> None:
+        if not self.rate_per_second:
+            return
+
+        interval = 1 / self.rate_per_second
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + interval
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self) -> "BankRateLimiter":
+        await self._semaphore.acquire()
+        try:
+            await self._wait_for_slot()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._semaphore.release()
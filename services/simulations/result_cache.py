@@ -0,0 +1,222 @@
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from cachetools import LRUCache
+import asyncio
+import json
+import logging
+import os
+import time
+from services.inapi.redis_cache import get_async_redis_connection
+from .banks.base import SimulationResult
+
+logger = logging.getLogger(__name__)
+
+# Validade padrão (s) de uma simulação bem-sucedida e de um erro determinístico
+DEFAULT_TTL = 300
+DEFAULT_NEGATIVE_TTL = 3600
+DEFAULT_LOCAL_MAXSIZE = 2048
+
+# Após uma falha do Redis, usa apenas o cache local por este tempo (s)
+REDIS_RETRY_INTERVAL = 30
+# Tempo máximo (s) de uma leitura/escrita no Redis antes de seguir sem ele
+REDIS_TIMEOUT = 0.5
+
+KEY_PREFIX = "simulation"
+
+# (resultado, tempo em ms, timed_out)
+Outcome = Tuple[SimulationResult, float, bool]
+
+# Erros que se repetem para o mesmo CPF até a situação do cliente mudar
+DETERMINISTIC_ERROR_MARKERS = [
+    "não autorizado",
+    "nao autorizado",
+    "sem saldo",
+    "saldo insuficiente",
+    "não possui saldo",
+    "nao possui saldo",
+    "cpf inválido",
+    "cpf invalido",
+    "não possui autorização",
+    "instituição fiduciária não possui autorização",
+]
+
+
+def is_deterministic_error(result: SimulationResult) -> bool:
+    """Indica se a falha da simulação se repetiria para o mesmo CPF"""
+    message = (result.error_message or "").lower()
+    return any(marker in message for marker in DETERMINISTIC_ERROR_MARKERS)
+
+
+class SimulationResultCache:
+    """
+    Cache de resultados de simulação por (banco, CPF, tabela)
+
+    Um LRU em memória fica na frente do Redis compartilhado entre workers.
+    Simulações idênticas em andamento são agrupadas: apenas uma chama o banco.
+    """
+
+    def __init__(self, local_maxsize: int = DEFAULT_LOCAL_MAXSIZE):
+        self._local: LRUCache = LRUCache(maxsize=local_maxsize)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # O Redis usa o pool assíncrono compartilhado do processo
+        self._use_redis = bool(os.getenv("REDIS_HOST"))
+        self._redis_disabled_until = 0.0
+
+    @staticmethod
+    def _key(bank_name: str, cpf: str, table_id: Optional[str]) -> str:
+        return f"{KEY_PREFIX}:{bank_name}:{cpf}:{table_id or 'default'}"
+
+    @staticmethod
+    def _get_ttl(bank_name: str, result: SimulationResult) -> int:
+        """TTL por banco: SIMULATION_CACHE_TTL_<BANCO> ou SIMULATION_CACHE_TTL"""
+        if result.success:
+            value = os.getenv(f"SIMULATION_CACHE_TTL_{bank_name}") or os.getenv(
+                "SIMULATION_CACHE_TTL"
+            )
+            default = DEFAULT_TTL
+        elif is_deterministic_error(result):
+            value = os.getenv(
+                f"SIMULATION_CACHE_NEGATIVE_TTL_{bank_name}"
+            ) or os.getenv("SIMULATION_CACHE_NEGATIVE_TTL")
+            default = DEFAULT_NEGATIVE_TTL
+        else:
+            # Falhas temporárias (timeout, 5xx, conexão) não são guardadas
+            return 0
+
+        try:
+            return int(value) if value else default
+        except ValueError:
+            logger.warning(f"TTL de cache inválido para {bank_name}: {value}")
+            return default
+
+    def _redis_available(self) -> bool:
+        return self._use_redis and time.time() >= self._redis_disabled_until
+
+    def _disable_redis(self, error: Exception):
+        logger.warning(f"Cache de simulação sem Redis: {str(error)}")
+        self._redis_disabled_until = time.time() + REDIS_RETRY_INTERVAL
+
+    async def get(
+        self, bank_name: str, cpf: str, table_id: Optional[str]
+    ) -> Optional[SimulationResult]:
+        key = self._key(bank_name, cpf, table_id)
+
+        entry = self._local.get(key)
+        if entry:
+            expires_at, result = entry
+            if expires_at > time.time():
+                return result
+            self._local.pop(key, None)
+
+        if not self._redis_available():
+            return None
+
+        try:
+            data = await asyncio.wait_for(
+                get_async_redis_connection().get(key), REDIS_TIMEOUT
+            )
+        except Exception as e:
+            self._disable_redis(e)
+            return None
+        if data is None:
+            return None
+
+        payload = json.loads(data)
+        result = SimulationResult.model_validate(payload["result"])
+        self._local[key] = (payload["expires_at"], result)
+        return result
+
+    async def set(
+        self,
+        bank_name: str,
+        cpf: str,
+        table_id: Optional[str],
+        result: SimulationResult,
+    ):
+        ttl = self._get_ttl(bank_name, result)
+        if ttl <= 0:
+            return
+
+        key = self._key(bank_name, cpf, table_id)
+        expires_at = time.time() + ttl
+        self._local[key] = (expires_at, result)
+
+        if not self._redis_available():
+            return
+
+        payload = {
+            "expires_at": expires_at,
+            "result": result.model_dump(mode="json"),
+        }
+        try:
+            await asyncio.wait_for(
+                get_async_redis_connection().set(key, json.dumps(payload), ex=ttl),
+                REDIS_TIMEOUT,
+            )
+        except Exception as e:
+            self._disable_redis(e)
+
+    async def get_or_simulate(
+        self,
+        bank_name: str,
+        cpf: str,
+        table_id: Optional[str],
+        loader: Callable[[], Awaitable[Outcome]],
+    ) -> Tuple[Outcome, bool]:
+        """
+        Retorna o resultado em cache ou executa `loader` uma única vez
+
+        `loader` retorna (resultado, tempo em ms, timed_out); resultados com
+        timeout não são guardados.
+
+        Returns:
+            (resultado, tempo em ms, timed_out) e se o resultado veio do cache
+            ou de uma simulação disparada por outro solicitante, ou seja, se
+            esta chamada não consultou o banco
+        """
+        started_at = time.perf_counter()
+        cached = await self.get(bank_name, cpf, table_id)
+        if cached is not None:
+            logger.info(f"Simulação {bank_name} do CPF {cpf} obtida do cache")
+            return (cached, (time.perf_counter() - started_at) * 1000, False), True
+
+        key = self._key(bank_name, cpf, table_id)
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(
+                self._load(bank_name, cpf, table_id, key, loader)
+            )
+            self._inflight[key] = task
+        else:
+            logger.info(f"Aguardando simulação {bank_name} em andamento do CPF {cpf}")
+
+        # shield: o cancelamento de um solicitante não cancela os demais
+        return await asyncio.shield(task), shared
+
+    async def _load(
+        self,
+        bank_name: str,
+        cpf: str,
+        table_id: Optional[str],
+        key: str,
+        loader: Callable[[], Awaitable[Outcome]],
+    ) -> Outcome:
+        try:
+            outcome = await loader()
+            result, _, timed_out = outcome
+            if not timed_out:
+                await self.set(bank_name, cpf, table_id, result)
+            return outcome
+        finally:
+            self._inflight.pop(key, None)
+
+
+_simulation_cache: Optional[SimulationResultCache] = None
+
+
+def get_simulation_cache() -> SimulationResultCache:
+    """Retorna a instância compartilhada do cache de simulações"""
+    global _simulation_cache
+    if _simulation_cache is None:
+        _simulation_cache = SimulationResultCache()
+    return _simulation_cache
@@ -7,6 +7,8 @@ from .banks.facta_bank import FactaBankSimulator
 from pydantic import BaseModel
 from datetime import datetime
 from models.normalized.simulation import NormalizedSimulationResponse
+from apis.single_flight import get_single_flight_metrics
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,7 +26,7 @@ class SimulationHistoryItem(BaseModel):
 router = APIRouter(prefix="/api/v1/simulation", tags=["simulation"])
 
 
-def get_simulation_service() -> SimulationService:
+async def get_simulation_service() -> SimulationService:
     service = SimulationService()
 
     # Criar todos os bancos disponíveis
@@ -34,7 +36,7 @@ def get_simulation_service() -> SimulationService:
         "FACTA": FactaBankSimulator(),
     }
 
-    active_banks = service.get_active_banks(feature="simulation")
+    active_banks = await service.get_active_banks(feature="simulation")
 
     for bank_name, bank in all_banks.items():
         if bank_name in active_banks:
@@ -51,14 +53,39 @@ async def simulate_fgts(
     bank: str | None = Query(
         None, description="Nome do banco específico ou None para todos"
     ),
+    concurrent: bool = Query(
+        True, description="Consulta todos os bancos ao mesmo tempo"
+    ),
+    bank_timeout: float | None = Query(
+        None, gt=0, description="Tempo máximo (s) de resposta de cada banco"
+    ),
+    deadline: float | None = Query(
+        None, gt=0, description="Tempo máximo (s) da simulação completa"
+    ),
+    partial: bool = Query(
+        True, description="Retorna os bancos que responderam até o deadline"
+    ),
+    cache: bool = Query(
+        True, description="Reaproveita simulações recentes do mesmo CPF e tabela"
+    ),
     service: SimulationService = Depends(get_simulation_service),
 ):
     """Simula FGTS em um ou todos os bancos disponíveis com resposta normalizada"""
     try:
         cpf = cpf.replace(".", "").replace("-", "")
-        return await service.simulate(cpf, bank)
+        return await service.simulate(
+            cpf,
+            bank,
+            concurrent=concurrent,
+            bank_timeout=bank_timeout,
+            deadline=deadline,
+            partial_results=partial,
+            use_cache=cache,
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -70,7 +97,7 @@ async def get_simulation_history(
     service: SimulationService = Depends(get_simulation_service),
 ):
     """Retorna histórico de simulações para um CPF específico"""
-    return service.get_simulation_history(cpf, bank)
+    return await service.get_simulation_history(cpf, bank)
 
 
 @router.get("/history/all", response_model=Dict)
@@ -82,7 +109,7 @@ async def get_all_simulations(
     service: SimulationService = Depends(get_simulation_service),
 ):
     """Retorna histórico de todas as simulações com paginação"""
-    return service.get_all_simulations(page, per_page, bank, cpf)
+    return await service.get_all_simulations(page, per_page, bank, cpf)
 
 
 @router.get("/cpfs", response_model=List[str])
@@ -90,4 +117,10 @@ async def get_unique_cpfs(
     service: SimulationService = Depends(get_simulation_service),
 ):
     """Retorna lista de CPFs únicos que têm simulações"""
-    return service.get_unique_cpfs()
+    return await service.get_unique_cpfs()
+
+
+@router.get("/metrics/single-flight", response_model=Dict)
+async def get_single_flight_stats():
+    """Chamadas às APIs dos bancos executadas e agrupadas (single-flight)"""
+    return get_single_flight_metrics()
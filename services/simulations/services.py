@@ -1,27 +1,50 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from .banks.base import BankSimulator, SimulationResult
 from .adapters.base import BankAdapter
+from .rate_limit import BankRateLimiter
+from .result_cache import get_simulation_cache
 from .adapters.qi_adapter import QIBankAdapter
 from .adapters.vctex_adapter import VCTEXBankAdapter
 from .adapters.facta_adapter import FactaBankAdapter
 from models.normalized.simulation import NormalizedSimulationResponse
 from models.normalized.proposal import NormalizedProposalRequest
-from pymongo import MongoClient, DESCENDING
+from motor.motor_asyncio import AsyncIOMotorClient
+from apis.upstream_guard import is_upstream_degraded
+from pymongo import DESCENDING
+from repositories import (
+    BANK_CONFIGS,
+    SIMULATION_SUMMARY_PROJECTION,
+    ConfigCache,
+    SessionRepository,
+    SimulationRepository,
+    get_config_cache,
+)
+import asyncio
 import logging
+from contextlib import nullcontext
 import os
+import time
 from math import ceil
 
 logger = logging.getLogger(__name__)
 
+# Tempo máximo padrão (s) de cada banco na simulação
+DEFAULT_BANK_TIMEOUT = 30.0
+
 
 class SimulationService:
-    def __init__(self):
+    def __init__(
+        self,
+        mongo_client: Optional[AsyncIOMotorClient] = None,
+        config_cache: Optional[ConfigCache] = None,
+    ):
         self._banks: Dict[str, BankSimulator] = {}
         self._adapters: Dict[str, BankAdapter] = {}
-        self.mongo_client = MongoClient(os.getenv("MONGODB_URL"))
-        self.db = self.mongo_client["fgts_agent"]
-        self.simulations = self.db["fgts_simulations"]
-        self.bank_config_collection = self.db["bank_configs"]
+        self._limiters: Dict[str, BankRateLimiter] = {}
+        self._cache = get_simulation_cache()
+        self.simulations = SimulationRepository(mongo_client)
+        self.sessions = SessionRepository(mongo_client)
+        self.config_cache = config_cache or get_config_cache()
 
         # Adaptadores
         self.register_adapter(QIBankAdapter())
@@ -38,10 +61,18 @@ class SimulationService:
         self._adapters[adapter.bank_name] = adapter
         logger.info(f"Adaptador registrado: {adapter.bank_name}")
 
-    def is_bank_active(self, bank_name: str, feature: str = "simulation") -> bool:
+    def set_bank_limiter(self, bank_name: str, limiter: BankRateLimiter):
+        """Define o limitador de concorrência/taxa usado nas simulações de um banco"""
+        self._limiters[bank_name] = limiter
+        logger.info(
+            f"Limitador definido para {bank_name}: "
+            f"concorrência={limiter.max_concurrency}, taxa={limiter.rate_per_second}/s"
+        )
+
+    async def is_bank_active(self, bank_name: str, feature: str = "simulation") -> bool:
         """Verifica se um banco está ativo para uma determinada feature"""
         try:
-            config = self.bank_config_collection.find_one({})
+            config = await self.config_cache.get_async(BANK_CONFIGS)
             if not config or "banks" not in config:
                 return True
 
@@ -56,10 +87,10 @@ class SimulationService:
             logger.error(f"Erro ao verificar se banco está ativo: {str(e)}")
             return True
 
-    def get_active_banks(self, feature: str = "simulation") -> List[str]:
+    async def get_active_banks(self, feature: str = "simulation") -> List[str]:
         """Retorna a lista de bancos ativos para uma determinada feature"""
         try:
-            config = self.bank_config_collection.find_one({})
+            config = await self.config_cache.get_async(BANK_CONFIGS)
             if not config or "banks" not in config:
                 return list(self._banks.keys())
 
@@ -76,14 +107,33 @@ class SimulationService:
             return list(self._banks.keys())
 
     async def simulate(
-        self, cpf: str, bank_name: str | None = None
+        self,
+        cpf: str,
+        bank_name: str | None = None,
+        concurrent: bool = True,
+        bank_timeout: float | None = None,
+        deadline: float | None = None,
+        partial_results: bool = True,
+        use_cache: bool = True,
     ) -> List[NormalizedSimulationResponse]:
-        """Realiza simulação em um banco específico ou em todos e retorna resultados normalizados"""
-        raw_results = []
-        normalized_results = []
+        """
+        Realiza simulação em um banco específico ou em todos e retorna resultados normalizados
 
+        Args:
+            cpf: CPF do cliente
+            bank_name: Nome do banco específico ou None para todos
+            concurrent: Se True, consulta todos os bancos ao mesmo tempo
+            bank_timeout: Tempo máximo (s) por banco; None usa o padrão de cada banco
+            deadline: Tempo máximo (s) para a simulação inteira
+            partial_results: Se True, retorna os bancos que responderam até o deadline
+            use_cache: Se False, ignora o cache e consulta os bancos
+
+        Raises:
+            ValueError: Banco não suportado ou inativo
+            asyncio.TimeoutError: Deadline atingido com partial_results=False
+        """
         # Obter bancos ativos para simulação
-        active_banks = self.get_active_banks(feature="simulation")
+        active_banks = await self.get_active_banks(feature="simulation")
 
         if bank_name:
             if bank_name not in self._banks:
@@ -92,75 +142,245 @@ class SimulationService:
             if bank_name not in active_banks:
                 raise ValueError(f"Banco {bank_name} não está ativo para simulações")
 
-            # Buscar tabela ativa para o banco usando o método auxiliar
-            table_id = self._get_active_table_for_bank(bank_name)
-            if table_id:
-                logger.info(
-                    f"Usando tabela {table_id} para simulação com banco {bank_name}"
-                )
-            else:
-                logger.warning(
-                    f"Nenhuma tabela ativa encontrada para banco {bank_name}, usando padrão"
-                )
-
-            # Chama o simulador com a tabela (mesmo que seja None)
-            raw_results.append(
-                await self._banks[bank_name].simulate(cpf, table_id=table_id)
-            )
+            target_banks = [bank_name]
         else:
-            # Simular em todos os bancos ativos
-            for bank_name in active_banks:
-                if bank_name in self._banks:
-                    # Buscar tabela ativa para o banco usando o método auxiliar
-                    table_id = self._get_active_table_for_bank(bank_name)
-                    if table_id:
-                        logger.info(
-                            f"Usando tabela {table_id} para simulação com banco {bank_name}"
-                        )
-                    else:
-                        logger.warning(
-                            f"Nenhuma tabela ativa encontrada para banco {bank_name}, usando padrão"
-                        )
-
-                    raw_results.append(
-                        await self._banks[bank_name].simulate(cpf, table_id=table_id)
-                    )
+            target_banks = []
+            for name in active_banks:
+                if name in self._banks:
+                    target_banks.append(name)
                 else:
                     logger.warning(
-                        f"Banco ativo na configuração, mas não registrado: {bank_name}"
+                        f"Banco ativo na configuração, mas não registrado: {name}"
+                    )
+
+        # Tabela ativa de cada banco (mapa pré-calculado no cache de configurações)
+        table_ids = {
+            name: await self._get_active_table_for_bank(name) for name in target_banks
+        }
+
+        if concurrent:
+            outcomes = await self._simulate_concurrently(
+                cpf, table_ids, bank_timeout, deadline, partial_results, use_cache
+            )
+        else:
+            outcomes = []
+            for name, table_id in table_ids.items():
+                outcomes.append(
+                    await self._simulate_bank(
+                        cpf,
+                        name,
+                        table_id,
+                        self._get_bank_timeout(name, bank_timeout),
+                        use_cache,
                     )
+                )
 
         # Normaliza os resultados usando os adaptadores
-        for result in raw_results:
-            if result.bank_name in self._adapters and result.success:
-                adapter = self._adapters[result.bank_name]
-                normalized = adapter.normalize_simulation_response(result.raw_response)
-                normalized_results.append(normalized)
-
-                # Salva os resultados normalizados
-                self._save_normalized_result(cpf, normalized)
-            else:
-                # Se não tiver adaptador ou falhar, manter um formato mínimo
-                logger.warning(
-                    f"Sem adaptador para {result.bank_name} ou simulação falhou"
+        return list(
+            await asyncio.gather(
+                *(
+                    self._normalize_result(cpf, result, elapsed_ms, timed_out, cached)
+                    for result, elapsed_ms, timed_out, cached in outcomes
+                )
+            )
+        )
+
+    async def _simulate_concurrently(
+        self,
+        cpf: str,
+        table_ids: Dict[str, Optional[str]],
+        bank_timeout: float | None,
+        deadline: float | None,
+        partial_results: bool,
+        use_cache: bool = True,
+    ) -> List[Tuple[SimulationResult, float, bool, bool]]:
+        """Dispara a simulação em todos os bancos ao mesmo tempo respeitando o deadline"""
+        if not table_ids:
+            return []
+
+        started_at = time.perf_counter()
+        tasks = {
+            name: asyncio.create_task(
+                self._simulate_bank(
+                    cpf,
+                    name,
+                    table_id,
+                    self._get_bank_timeout(name, bank_timeout),
+                    use_cache,
+                )
+            )
+            for name, table_id in table_ids.items()
+        }
+
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            late_banks = [name for name, task in tasks.items() if task in pending]
+            logger.warning(
+                f"Deadline de {deadline}s atingido na simulação do CPF {cpf}, "
+                f"bancos sem resposta: {late_banks}"
+            )
+            if not partial_results:
+                raise asyncio.TimeoutError(
+                    f"Deadline de {deadline}s atingido aguardando: {', '.join(late_banks)}"
                 )
-                normalized_results.append(
-                    NormalizedSimulationResponse(
-                        bank_name=result.bank_name,
-                        financial_id="",
-                        available_amount=0,
-                        total_amount=0,
-                        interest_rate=0,
-                        iof_amount=0,
-                        error_message=result.error_message,
-                        success=result.success,
-                        raw_response=result.raw_response,
+
+        outcomes = []
+        for name, task in tasks.items():
+            if task in done:
+                outcomes.append(task.result())
+            else:
+                elapsed_ms = (time.perf_counter() - started_at) * 1000
+                outcomes.append(
+                    (
+                        self._timeout_result(
+                            name, f"Deadline de {deadline}s da simulação atingido"
+                        ),
+                        elapsed_ms,
+                        True,
+                        False,
                     )
                 )
 
-        return normalized_results
+        return outcomes
 
-    def _save_results(self, cpf: str, results: List[SimulationResult]):
+    async def _simulate_bank(
+        self,
+        cpf: str,
+        bank_name: str,
+        table_id: Optional[str],
+        timeout: float | None,
+        use_cache: bool = True,
+    ) -> Tuple[SimulationResult, float, bool, bool]:
+        """
+        Executa a simulação de um banco medindo o tempo e aplicando o timeout
+
+        Returns:
+            (resultado, tempo em ms, timed_out, cached); `cached` indica que o
+            resultado não veio de uma chamada feita por esta simulação
+        """
+        if table_id:
+            logger.info(
+                f"Usando tabela {table_id} para simulação com banco {bank_name}"
+            )
+        else:
+            logger.warning(
+                f"Nenhuma tabela ativa encontrada para banco {bank_name}, usando padrão"
+            )
+
+        if use_cache:
+            outcome, cached = await self._cache.get_or_simulate(
+                bank_name,
+                cpf,
+                table_id,
+                lambda: self._call_bank(cpf, bank_name, table_id, timeout),
+            )
+            return *outcome, cached
+        return *await self._call_bank(cpf, bank_name, table_id, timeout), False
+
+    async def _call_bank(
+        self,
+        cpf: str,
+        bank_name: str,
+        table_id: Optional[str],
+        timeout: float | None,
+    ) -> Tuple[SimulationResult, float, bool]:
+        # Aguarda vaga no limitador do banco (se houver) antes de medir o tempo
+        async with self._limiters.get(bank_name) or nullcontext():
+            started_at = time.perf_counter()
+            timed_out = False
+            try:
+                # Chama o simulador com a tabela (mesmo que seja None)
+                result = await asyncio.wait_for(
+                    self._banks[bank_name].simulate(cpf, table_id=table_id), timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Simulação do banco {bank_name} excedeu {timeout}s")
+                result = self._timeout_result(
+                    bank_name, f"Tempo limite de {timeout}s excedido"
+                )
+                timed_out = True
+            except Exception as e:
+                logger.error(f"Erro na simulação do banco {bank_name}: {str(e)}")
+                result = SimulationResult(
+                    bank_name=bank_name,
+                    error_message=str(e),
+                    success=False,
+                    raw_response={"error": str(e)},
+                )
+
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+        logger.info(f"Simulação {bank_name} concluída em {elapsed_ms:.0f}ms")
+        return result, elapsed_ms, timed_out
+
+    def _timeout_result(self, bank_name: str, message: str) -> SimulationResult:
+        return SimulationResult(
+            bank_name=bank_name,
+            error_message=message,
+            success=False,
+            raw_response={"error": message},
+        )
+
+    def _get_bank_timeout(
+        self, bank_name: str, override: float | None = None
+    ) -> float | None:
+        """Timeout por banco: parâmetro explícito, SIMULATION_TIMEOUT_<BANCO> ou SIMULATION_BANK_TIMEOUT"""
+        if override is not None:
+            return override
+
+        value = os.getenv(f"SIMULATION_TIMEOUT_{bank_name}") or os.getenv(
+            "SIMULATION_BANK_TIMEOUT"
+        )
+        if not value:
+            return DEFAULT_BANK_TIMEOUT
+
+        try:
+            return float(value)
+        except ValueError:
+            logger.warning(f"Timeout inválido para banco {bank_name}: {value}")
+            return DEFAULT_BANK_TIMEOUT
+
+    async def _normalize_result(
+        self,
+        cpf: str,
+        result: SimulationResult,
+        elapsed_ms: float,
+        timed_out: bool,
+        cached: bool = False,
+    ) -> NormalizedSimulationResponse:
+        if result.bank_name in self._adapters and result.success:
+            adapter = self._adapters[result.bank_name]
+            normalized = adapter.normalize_simulation_response(result.raw_response)
+            normalized.elapsed_ms = elapsed_ms
+
+            # Salva os resultados normalizados (resultados do cache já foram
+            # salvos pela simulação que consultou o banco)
+            if not cached:
+                await self._save_normalized_result(cpf, normalized)
+            return normalized
+
+        # Se não tiver adaptador ou falhar, manter um formato mínimo
+        logger.warning(f"Sem adaptador para {result.bank_name} ou simulação falhou")
+        return NormalizedSimulationResponse(
+            bank_name=result.bank_name,
+            financial_id="",
+            available_amount=0,
+            total_amount=0,
+            interest_rate=0,
+            iof_amount=0,
+            error_message=result.error_message,
+            success=result.success,
+            raw_response=result.raw_response,
+            elapsed_ms=elapsed_ms,
+            timed_out=timed_out,
+        )
+
+    async def _save_results(self, cpf: str, results: List[SimulationResult]):
         """Salva resultados no MongoDB com informações adicionais"""
         try:
             for result in results:
@@ -181,58 +401,48 @@ class SimulationService:
                 }
 
                 # Insere o documento
-                self.simulations.insert_one(simulation_doc)
+                await self.simulations.insert_one(simulation_doc)
 
                 if result.raw_response.get("financialId"):
-                    self._update_session_with_bank_provider(
+                    await self._update_session_with_bank_provider(
                         result.raw_response["financialId"], result.bank_name
                     )
 
         except Exception as e:
             logger.error(f"Erro ao salvar resultados: {str(e)}")
 
-    def _update_session_with_bank_provider(self, financial_id: str, bank_name: str):
+    async def _update_session_with_bank_provider(
+        self, financial_id: str, bank_name: str
+    ):
         """
         Atualiza a sessão com o provedor do banco
         """
-        from memory import MongoDBMemoryManager
-
-        memory_manager = MongoDBMemoryManager()
-        memory_manager.set_session_data(financial_id, "bank_provider", bank_name)
+        await self.sessions.set_fields(financial_id, {"bank_provider": bank_name})
         logger.info(f"Provedor {bank_name} salvo para sessão {financial_id}")
 
-    def get_bank_provider_for_financial_id(self, financial_id: str) -> str:
+    async def get_bank_provider_for_financial_id(self, financial_id: str) -> str:
         """
         Recupera o provedor do banco para um financial_id específico
         """
-        simulation = self.simulations.find_one({"financial_id": financial_id})
+        simulation = await self.simulations.get_by_financial_id(
+            financial_id, {"bank_provider": 1}
+        )
         if simulation:
             return simulation.get("bank_provider")
         return None
 
-    def get_simulation_history(
+    async def get_simulation_history(
         self, cpf: str, bank_name: str | None = None
     ) -> List[Dict]:
         """Recupera histórico de simulações para um CPF"""
         query = {"cpf": cpf}
         if bank_name:
             query["bank_name"] = bank_name
-        return list(
-            self.simulations.find(
-                query,
-                {
-                    "_id": 0,
-                    "cpf": 1,
-                    "bank_name": 1,
-                    "available_amount": 1,
-                    "error_message": 1,
-                    "success": 1,
-                    "timestamp": 1,
-                },
-            ).sort("timestamp", DESCENDING)
+        return await self.simulations.find(
+            query, SIMULATION_SUMMARY_PROJECTION, sort=[("timestamp", DESCENDING)]
         )
 
-    def get_all_simulations(
+    async def get_all_simulations(
         self,
         page: int = 1,
         per_page: int = 10,
@@ -246,40 +456,52 @@ class SimulationService:
         if cpf:
             query["cpf"] = cpf
 
-        # Calcula o total de documentos e páginas
-        total_docs = self.simulations.count_documents(query)
-        total_pages = ceil(total_docs / per_page)
-
-        # Aplica paginação
-        skip = (page - 1) * per_page
-        cursor = (
+        # Total de documentos e página consultados ao mesmo tempo
+        total_docs, items = await asyncio.gather(
+            self.simulations.count_documents(query),
             self.simulations.find(
                 query,
-                {
-                    "_id": 0,
-                    "cpf": 1,
-                    "bank_name": 1,
-                    "available_amount": 1,
-                    "error_message": 1,
-                    "success": 1,
-                    "timestamp": 1,
-                },
-            )
-            .sort("timestamp", DESCENDING)
-            .skip(skip)
-            .limit(per_page)
+                SIMULATION_SUMMARY_PROJECTION,
+                sort=[("timestamp", DESCENDING)],
+                skip=(page - 1) * per_page,
+                limit=per_page,
+            ),
         )
+        total_pages = ceil(total_docs / per_page)
 
         return {
-            "items": list(cursor),
+            "items": items,
             "page": page,
             "per_page": per_page,
             "total_pages": total_pages,
             "total_items": total_docs,
         }
 
-    def list_banks(self) -> Dict[str, Any]:
+    @staticmethod
+    def _system_status(
+        active_banks: List[Dict[str, Any]], degraded_banks: List[str]
+    ) -> Dict[str, Any]:
+        available = [bank for bank in active_banks if not bank.get("degraded")]
+        if not active_banks:
+            message = "Nenhum banco disponível no momento"
+        elif degraded_banks:
+            message = (
+                "Sistema operacional com bancos degradados: "
+                + ", ".join(degraded_banks)
+                if available
+                else "Todos os bancos ativos estão degradados no momento"
+            )
+        else:
+            message = "Sistema operacional"
+        return {
+            "operational": len(available) > 0,
+            "degraded_banks": degraded_banks,
+            "message": message,
+        }
+
+    async def list_banks(self) -> Dict[str, Any]:
         """Lista todos os bancos disponíveis para simulação com base na configuração"""
+        degraded_banks = [name for name in self._banks if is_upstream_degraded(name)]
         try:
             active_banks = []
             inactive_banks = []
@@ -287,10 +509,12 @@ class SimulationService:
             for bank_name, bank in self._banks.items():
                 bank_info = bank.bank_info
 
-                is_active = self.is_bank_active(bank_name, "simulation")
+                is_active = await self.is_bank_active(bank_name, "simulation")
 
                 bank_dict = bank_info.dict()
                 bank_dict["active"] = is_active
+                # Circuito aberto: o banco está falhando e as chamadas falham na hora
+                bank_dict["degraded"] = bank_name in degraded_banks
 
                 if is_active:
                     active_banks.append(bank_dict)
@@ -301,14 +525,7 @@ class SimulationService:
                 "active_banks": active_banks,
                 "inactive_banks": inactive_banks,
                 "total_active": len(active_banks),
-                "system_status": {
-                    "operational": len(active_banks) > 0,
-                    "message": (
-                        "Sistema operacional"
-                        if active_banks
-                        else "Nenhum banco disponível no momento"
-                    ),
-                },
+                "system_status": self._system_status(active_banks, degraded_banks),
             }
         except Exception as e:
             logger.error(f"Erro ao listar bancos: {str(e)}")
@@ -320,21 +537,16 @@ class SimulationService:
                 "active_banks": active_banks,
                 "inactive_banks": inactive_banks,
                 "total_active": len(active_banks),
-                "system_status": {
-                    "operational": len(active_banks) > 0,
-                    "message": (
-                        "Sistema operacional"
-                        if active_banks
-                        else "Nenhum banco disponível no momento"
-                    ),
-                },
+                "system_status": self._system_status(active_banks, degraded_banks),
             }
 
-    def get_unique_cpfs(self) -> List[str]:
+    async def get_unique_cpfs(self) -> List[str]:
         """Retorna lista de CPFs únicos que têm simulações"""
-        return list(self.simulations.distinct("cpf"))
+        return await self.simulations.distinct("cpf")
 
-    def _save_normalized_result(self, cpf: str, result: NormalizedSimulationResponse):
+    async def _save_normalized_result(
+        self, cpf: str, result: NormalizedSimulationResponse
+    ):
         """Salva resultados normalizados no MongoDB"""
         try:
             simulation_doc = {
@@ -350,21 +562,21 @@ class SimulationService:
                 "raw_response": result.raw_response,
             }
 
-            self.simulations.insert_one(simulation_doc)
+            await self.simulations.insert_one(simulation_doc)
 
             if result.financial_id:
-                self._update_session_with_bank_provider(
+                await self._update_session_with_bank_provider(
                     result.financial_id, result.bank_name
                 )
 
         except Exception as e:
             logger.error(f"Erro ao salvar resultados normalizados: {str(e)}")
 
-    def prepare_proposal_request(
+    async def prepare_proposal_request(
         self, financial_id: str, request_data: NormalizedProposalRequest
     ) -> dict:
         """Prepara o pedido de proposta específico para o banco associado ao financial_id"""
-        bank_name = self.get_bank_provider_for_financial_id(financial_id)
+        bank_name = await self.get_bank_provider_for_financial_id(financial_id)
 
         if not bank_name:
             raise ValueError(f"Banco não encontrado para financial_id: {financial_id}")
@@ -375,7 +587,7 @@ class SimulationService:
         adapter = self._adapters[bank_name]
         return adapter.prepare_proposal_request(request_data)
 
-    def _get_active_table_for_bank(self, bank_name: str) -> Optional[str]:
+    async def _get_active_table_for_bank(self, bank_name: str) -> Optional[str]:
         """
         Retorna o ID da tabela ativa para um banco específico
 
@@ -386,17 +598,8 @@ class SimulationService:
             ID da tabela ativa ou None se não encontrar
         """
         try:
-            config = self.db["table_configs"].find_one({})
-            if not config or "tables" not in config:
-                return None
-
-            for table_id, table_info in config["tables"].items():
-                if table_info.get("bank_name") == bank_name and table_info.get(
-                    "active", True
-                ):
-                    return table_id
-
-            return None
+            active_tables = await self.config_cache.active_tables_async()
+            return active_tables.get(bank_name)
         except Exception as e:
             logger.error(f"Erro ao obter tabela ativa para banco {bank_name}: {str(e)}")
             return None
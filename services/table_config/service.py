@@ -1,5 +1,6 @@
 from pymongo import MongoClient
-import os
+from repositories import TABLE_CONFIGS, ConfigCache, get_config_cache
+from utils.mongo import get_mongo_client
 from typing import Dict, List, Optional
 from datetime import datetime
 import logging
@@ -8,13 +9,19 @@ logger = logging.getLogger(__name__)
 
 
 class TableConfigService:
-    def __init__(self):
-        self.mongo_url = os.getenv("MONGODB_URL")
-        self.client = MongoClient(self.mongo_url)
+    def __init__(
+        self,
+        client: Optional[MongoClient] = None,
+        config_cache: Optional[ConfigCache] = None,
+    ):
+        self.client = client or get_mongo_client()
         self.db = self.client["fgts_agent"]
-        self.collection = self.db["table_configs"]
+        self.collection = self.db[TABLE_CONFIGS]
+        self.config_cache = config_cache or get_config_cache()
 
-        self._ensure_default_config()
+        # Com a configuração em cache não é preciso consultar o banco
+        if self.config_cache.get(TABLE_CONFIGS) is None:
+            self._ensure_default_config()
 
     def _ensure_default_config(self):
         """Cria a configuração padrão se não existir"""
@@ -57,14 +64,15 @@ class TableConfigService:
                 "last_updated": datetime.utcnow(),
             }
             self.collection.insert_one(default_config)
+            self.config_cache.invalidate(TABLE_CONFIGS)
             logger.info("Configuração padrão de tabelas criada")
 
     def get_table_config(self) -> Dict:
         """Obtém a configuração atual das tabelas"""
-        config = self.collection.find_one({})
+        config = self.config_cache.get(TABLE_CONFIGS)
         if not config:
             self._ensure_default_config()
-            config = self.collection.find_one({})
+            config = self.config_cache.get(TABLE_CONFIGS)
 
         if "_id" in config:
             del config["_id"]
@@ -121,26 +129,29 @@ class TableConfigService:
         Returns:
             True se atualizado com sucesso, False caso contrário
         """
-        config = self.get_table_config()
+        # Lê a configuração direto do MongoDB: o cache pode estar desatualizado
+        config = self.collection.find_one({}, {"tables": 1}) or {}
+        tables = config.get("tables", {})
 
-        if table_id not in config["tables"]:
+        if table_id not in tables:
             logger.warning(f"Tentativa de ativar tabela inexistente: {table_id}")
             return False
 
         # Determinar o ID do banco da tabela
-        bank_name = config["tables"][table_id]["bank_name"]
+        bank_name = tables[table_id]["bank_name"]
 
         # Desativar todas as tabelas do mesmo banco
-        for tid, table_info in config["tables"].items():
+        now = datetime.utcnow()
+        fields = {"last_updated": now}
+        for tid, table_info in tables.items():
             if table_info["bank_name"] == bank_name:
-                config["tables"][tid]["active"] = tid == table_id
-                config["tables"][tid]["updated_at"] = datetime.utcnow()
+                fields[f"tables.{tid}.active"] = tid == table_id
+                fields[f"tables.{tid}.updated_at"] = now
                 if updater:
-                    config["tables"][tid]["updated_by"] = updater
+                    fields[f"tables.{tid}.updated_by"] = updater
 
-        config["last_updated"] = datetime.utcnow()
-
-        self.collection.replace_one({}, config)
+        self.collection.update_one({"_id": config["_id"]}, {"$set": fields})
+        self.config_cache.invalidate(TABLE_CONFIGS)
 
         logger.info(f"Tabela {table_id} definida como ativa para o banco {bank_name}")
         return True
@@ -168,27 +179,33 @@ class TableConfigService:
         Returns:
             True se adicionado com sucesso, False caso contrário
         """
-        config = self.get_table_config()
-
-        if table_id in config["tables"]:
+        self._ensure_default_config()
+        now = datetime.utcnow()
+
+        # Adicionar nova tabela; o filtro garante que uma tabela existente
+        # não seja sobrescrita
+        result = self.collection.update_one(
+            {f"tables.{table_id}": {"$exists": False}},
+            {
+                "$set": {
+                    f"tables.{table_id}": {
+                        "table_id": table_id,
+                        "name": name,
+                        "description": description,
+                        "active": False,  # Inicialmente inativa
+                        "bank_name": bank_name,
+                        "updated_at": now,
+                        "updated_by": updater,
+                    },
+                    "last_updated": now,
+                }
+            },
+        )
+        if result.matched_count == 0:
             logger.warning(f"Tabela já existe: {table_id}")
             return False
 
-        # Adicionar nova tabela
-        config["tables"][table_id] = {
-            "table_id": table_id,
-            "name": name,
-            "description": description,
-            "active": False,  # Inicialmente inativa
-            "bank_name": bank_name,
-            "updated_at": datetime.utcnow(),
-            "updated_by": updater,
-        }
-
-        config["last_updated"] = datetime.utcnow()
-
-        # Atualizar no MongoDB
-        self.collection.replace_one({}, config)
+        self.config_cache.invalidate(TABLE_CONFIGS)
 
         logger.info(f"Nova tabela adicionada: {table_id}")
 
@@ -210,19 +227,7 @@ class TableConfigService:
             ID da tabela ativa ou None se não encontrar
         """
         try:
-            mongo_client = MongoClient(os.getenv("MONGODB_URL"))
-            db = mongo_client["fgts_agent"]
-            collection = db["table_configs"]
-
-            config = collection.find_one({})
-            if not config or "tables" not in config:
-                return None
-
-            for table_id, table_info in config["tables"].items():
-                if table_info["bank_name"] == bank_name and table_info["active"]:
-                    return table_id
-
-            return None
+            return get_config_cache().active_tables().get(bank_name)
         except Exception as e:
             logger.error(f"Erro ao obter tabela ativa (static): {str(e)}")
             return None
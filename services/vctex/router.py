@@ -1,5 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from .service import VCTEXService
+from apis.cep_api_client import CepAPIClient
+from apis.prata_apli_client import PrataApi
+from apis.http_clients import api_client_dependency
 from .schemas import SimulationRequest, ProposalRequest, ContractRequest
 from typing import Dict, Any
 import logging
@@ -9,8 +12,11 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/vctex", tags=["vctex"])
 
 
-async def get_vctex_service():
-    return VCTEXService()
+async def get_vctex_service(
+    cep_client: CepAPIClient = Depends(api_client_dependency(CepAPIClient)),
+    prata_client: PrataApi = Depends(api_client_dependency(PrataApi)),
+):
+    return VCTEXService(cep_client, prata_client)
 
 
 @router.post("/simulation", response_model=Dict[str, Any])
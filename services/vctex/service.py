@@ -1,8 +1,10 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
 from apis.cep_api_client import CepAPIClient
 from apis.prata_apli_client import PrataApi
-from memory import MongoDBMemoryManager
+from apis.http_clients import get_api_client
+from datetime import datetime
+from repositories import SessionRepository
 from .schemas import SimulationRequest
 from services.simulations.proposal_service import ProposalService
 from services.simulations.banks.vctex_proposal import VCTEXBankProposal
@@ -14,10 +16,14 @@ logger = logging.getLogger(__name__)
 
 class VCTEXService:
 
-    def __init__(self):
-        self.cep_client = CepAPIClient()
-        self.prata_client = PrataApi()
-        self.memory_manager = MongoDBMemoryManager()
+    def __init__(
+        self,
+        cep_client: Optional[CepAPIClient] = None,
+        prata_client: Optional[PrataApi] = None,
+    ):
+        self.cep_client = cep_client or get_api_client(CepAPIClient)
+        self.prata_client = prata_client or get_api_client(PrataApi)
+        self.sessions = SessionRepository()
 
         # Inicializa o serviço de propostas
         self.proposal_service = ProposalService()
@@ -46,15 +52,21 @@ class VCTEXService:
                 return {"message": result.error_message, "statusCode": 400}
 
             # 4. Armazenar dados da proposta
-            self.memory_manager.store_proposal_data(
-                financial_id,
-                {
-                    "contract_number": result.contract_number,
-                    "bank_provider": result.bank_name,
-                    "proposal_success": True,
-                    "proposal_timestamp": result.timestamp.isoformat(),
-                },
-            )
+            try:
+                await self.sessions.set_fields(
+                    financial_id,
+                    {
+                        "proposal_data": {
+                            "contract_number": result.contract_number,
+                            "bank_provider": result.bank_name,
+                            "proposal_success": True,
+                            "proposal_timestamp": result.timestamp.isoformat(),
+                        },
+                        "proposal_date": datetime.utcnow(),
+                    },
+                )
+            except Exception as e:
+                logger.error(f"Erro ao armazenar proposta FGTS: {e}")
 
             return {
                 "contract_number": result.contract_number,
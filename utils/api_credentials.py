@@ -1,11 +1,22 @@
 import os
-from typing import Dict
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional
 from services.api_credentials.service import APICredentialService
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Validade das credenciais em memória; alterações feitas pelo serviço deste
+# processo recarregam o cache na hora
+CREDENTIAL_CACHE_TTL = float(os.getenv("CREDENTIAL_CACHE_TTL", "300"))
+
 _credential_service = None
+_credential_cache = None
+# api_name -> funções que retornam o callback (ou None se já foi descartado)
+_rotation_subscribers: Dict[str, List[Callable[[], Optional[Callable]]]] = {}
+_subscribers_lock = threading.Lock()
 
 
 def get_api_credential_service() -> APICredentialService:
@@ -16,6 +27,146 @@ def get_api_credential_service() -> APICredentialService:
     return _credential_service
 
 
+class CredentialCache:
+    """
+    Credenciais ativas de todas as APIs em memória, carregadas em uma única
+    consulta e agrupadas por API.
+
+    O cache é recarregado quando o TTL expira ou quando o serviço de
+    credenciais grava uma alteração. A cada recarga, os inscritos das APIs
+    cujas credenciais mudaram (`on_credentials_rotated`) são notificados,
+    por exemplo para descartar tokens obtidos com a credencial antiga.
+    """
+
+    def __init__(
+        self,
+        service: Optional[APICredentialService] = None,
+        ttl: float = CREDENTIAL_CACHE_TTL,
+    ):
+        self.service = service or get_api_credential_service()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_api: Optional[Dict[str, Dict[str, str]]] = None
+        self._by_key: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self.service.add_listener(self._on_credential_change)
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        by_api: Dict[str, Dict[str, str]] = {}
+        for credential in self.service.get_active_credentials():
+            by_api.setdefault(credential.get("api_name"), {})[credential["key"]] = (
+                credential["value"]
+            )
+        return by_api
+
+    def refresh(self):
+        """Recarrega as credenciais e notifica as APIs alteradas"""
+        try:
+            by_api = self._load()
+        except Exception as e:
+            logger.error(f"Erro ao carregar credenciais: {str(e)}")
+            with self._lock:
+                # Mantém as credenciais atuais até a próxima tentativa
+                self._loaded_at = time.monotonic()
+            if self._by_api is None:
+                raise
+            return
+
+        with self._lock:
+            previous = self._by_api
+            self._by_api = by_api
+            self._by_key = {
+                key: value
+                for credentials in by_api.values()
+                for key, value in credentials.items()
+            }
+            self._loaded_at = time.monotonic()
+
+        if previous is not None:
+            for api_name in set(previous) | set(by_api):
+                if previous.get(api_name) != by_api.get(api_name):
+                    logger.info(f"Credenciais da API {api_name} alteradas")
+                    _notify_rotation(api_name)
+
+    def _ensure_fresh(self):
+        if self._by_api is None or time.monotonic() - self._loaded_at >= self.ttl:
+            self.refresh()
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        self._ensure_fresh()
+        value = self._by_key.get(key)
+        if value is None:
+            value = os.getenv(key, default)
+        return value
+
+    def get_api(self, api_name: str) -> Dict[str, str]:
+        self._ensure_fresh()
+        result = dict(self._by_api.get(api_name, {}))
+        if not result:
+            for key, value in os.environ.items():
+                if key.startswith(f"{api_name}_"):
+                    result[key] = value
+        return result
+
+    def invalidate(self):
+        """Força a recarga na próxima leitura"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def _on_credential_change(self, api_name: Optional[str]):
+        self.refresh()
+
+
+def get_credential_cache() -> CredentialCache:
+    """Retorna a instância compartilhada do cache de credenciais"""
+    global _credential_cache
+    if _credential_cache is None:
+        _credential_cache = CredentialCache()
+    return _credential_cache
+
+
+def on_credentials_rotated(api_name: str, callback: Callable[[], None]):
+    """
+    Registra `callback` para ser chamado quando as credenciais da API
+    mudarem. Métodos de instância são guardados por referência fraca, então
+    clientes descartados não ficam presos ao registro (as referências mortas
+    são removidas a cada novo registro).
+    """
+    if hasattr(callback, "__self__"):
+        ref = weakref.WeakMethod(callback)
+    else:
+
+        def ref():
+            return callback
+
+    with _subscribers_lock:
+        subscribers = [
+            alive
+            for alive in _rotation_subscribers.get(api_name, [])
+            if alive() is not None
+        ]
+        subscribers.append(ref)
+        _rotation_subscribers[api_name] = subscribers
+
+
+def _notify_rotation(api_name: str):
+    with _subscribers_lock:
+        alive = [(ref, ref()) for ref in _rotation_subscribers.get(api_name, [])]
+        _rotation_subscribers[api_name] = [
+            ref for ref, callback in alive if callback is not None
+        ]
+
+    for _, callback in alive:
+        if callback is None:
+            continue
+        try:
+            callback()
+        except Exception as e:
+            logger.error(
+                f"Erro ao notificar rotação de credenciais da API {api_name}: {str(e)}"
+            )
+
+
 def get_credential(key: str, default: str = None) -> str:
     """
     Obtém o valor de uma credencial específica
@@ -28,13 +179,7 @@ def get_credential(key: str, default: str = None) -> str:
         Valor da credencial ou o valor padrão
     """
     try:
-        service = get_api_credential_service()
-        value = service.get_credential(key)
-
-        if value is None and default is not None:
-            return default
-
-        return value
+        return get_credential_cache().get(key, default)
     except Exception as e:
         logger.error(f"Erro ao obter credencial {key}: {str(e)}")
         return os.getenv(key, default)
@@ -51,8 +196,7 @@ def get_api_credentials(api_name: str) -> Dict[str, str]:
         Dicionário com todas as credenciais
     """
     try:
-        service = get_api_credential_service()
-        return service.get_all_api_credentials(api_name)
+        return get_credential_cache().get_api(api_name)
     except Exception as e:
         logger.error(f"Erro ao obter credenciais para API {api_name}: {str(e)}")
 
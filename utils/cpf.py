@@ -0,0 +1,84 @@
+import re
+from typing import Any, Dict, Optional
+
+# Campo canônico, indexado, com o CPF normalizado (11 dígitos) da sessão
+CPF_NORMALIZED_FIELD = "cpf_normalized"
+
+# Candidatos a CPF nos documentos de sessão, em ordem de prioridade
+CPF_FIELDS = [
+    "customer_data.customer_info.cpf",
+    "customer_data.borrower.cpf",
+    "cpf",
+    "customer_data.cpf",
+    "personal_info.cpf",
+    "document.cpf",
+    "user.cpf",
+]
+
+
+def normalize_cpf(value: Any) -> Optional[str]:
+    """Retorna o CPF com 11 dígitos ou None se o valor não for um CPF"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, int):
+        return str(value).zfill(11) if 0 < value < 10**11 else None
+    if not isinstance(value, str):
+        return None
+
+    digits = re.sub(r"\D", "", value)
+    return digits if len(digits) == 11 else None
+
+
+def extract_cpf(document: Dict[str, Any]) -> Optional[str]:
+    """Retorna o primeiro CPF válido (normalizado) entre os caminhos candidatos"""
+    for field in CPF_FIELDS:
+        value = document
+        for key in field.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+
+        cpf = normalize_cpf(value)
+        if cpf:
+            return cpf
+
+    return None
+
+
+# Campos lidos para recalcular o CPF canônico de uma sessão
+CPF_PROJECTION = {CPF_NORMALIZED_FIELD: 1, **{field: 1 for field in CPF_FIELDS}}
+
+
+def touches_cpf(key: str) -> bool:
+    """Indica se um `$set` de `key` (caminho com pontos) altera algum CPF"""
+    return any(
+        field == key or field.startswith(f"{key}.") or key.startswith(f"{field}.")
+        for field in CPF_FIELDS
+    )
+
+
+def cpf_normalized_update(document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Update que alinha o CPF canônico ao documento (respeitando a prioridade
+    de CPF_FIELDS), ou None se ele já estiver correto
+    """
+    cpf = extract_cpf(document)
+    if cpf == document.get(CPF_NORMALIZED_FIELD):
+        return None
+    if cpf:
+        return {"$set": {CPF_NORMALIZED_FIELD: cpf}}
+    return {"$unset": {CPF_NORMALIZED_FIELD: ""}}
+
+
+def cpf_search_query(search: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Monta o filtro de busca por CPF no campo canônico
+
+    Usa igualdade para o CPF completo e regex ancorada (prefixo, sensível a
+    maiúsculas) para buscas parciais, ambas resolvidas pelo índice.
+    Retorna None se a busca não tiver dígitos.
+    """
+    digits = re.sub(r"\D", "", search or "")
+    if not digits:
+        return None
+    if len(digits) == 11:
+        return {CPF_NORMALIZED_FIELD: digits}
+    return {CPF_NORMALIZED_FIELD: {"$regex": f"^{digits}"}}
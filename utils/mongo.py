@@ -0,0 +1,175 @@
+import os
+import logging
+import threading
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool de conexões de cada cliente (sync e Motor) do processo
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")
+)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Contadores de uso do pool de conexões de um cliente Mongo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools = 0
+        self.open = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_ms = 0.0
+        self.max_checkout_wait_ms = 0.0
+
+    def pool_created(self, event):
+        with self._lock:
+            self.pools += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = (getattr(event, "duration", None) or 0.0) * 1000
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.checkout_wait_ms += wait_ms
+            self.max_checkout_wait_ms = max(self.max_checkout_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "pools": self.pools,
+                "open_connections": self.open,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "utilization": (
+                    self.in_use / (MONGO_MAX_POOL_SIZE * max(self.pools, 1))
+                ),
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": (
+                    self.checkout_wait_ms / self.checkouts if self.checkouts else 0.0
+                ),
+                "max_checkout_wait_ms": self.max_checkout_wait_ms,
+            }
+
+
+_sync_metrics = PoolMetricsListener()
+_async_metrics = PoolMetricsListener()
+
+_client: Optional[MongoClient] = None
+_async_client: Optional[AsyncIOMotorClient] = None
+
+
+def _client_options(listener: PoolMetricsListener) -> Dict[str, Any]:
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [listener],
+    }
+
+
+def get_mongo_client() -> MongoClient:
+    """Retorna o MongoClient (pymongo) compartilhado pelo processo"""
+    global _client
+    if _client is None:
+        _client = MongoClient(
+            os.getenv("MONGODB_URL"), **_client_options(_sync_metrics)
+        )
+        logger.info("Cliente MongoDB compartilhado criado")
+    return _client
+
+
+def get_async_mongo_client() -> AsyncIOMotorClient:
+    """Retorna o cliente Motor compartilhado pelo processo"""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncIOMotorClient(
+            os.getenv("MONGODB_URL"), **_client_options(_async_metrics)
+        )
+        logger.info("Cliente Motor compartilhado criado")
+    return _async_client
+
+
+def get_database(name: str = "fgts_agent"):
+    return get_mongo_client()[name]
+
+
+def get_async_database(name: str = "fgts_agent"):
+    return get_async_mongo_client()[name]
+
+
+def get_mongo_pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """Uso dos pools de conexões dos clientes sync e Motor"""
+    return {"sync": _sync_metrics.metrics(), "async": _async_metrics.metrics()}
+
+
+def start_mongo_clients():
+    """Cria os clientes no startup da aplicação (no event loop do servidor)"""
+    get_mongo_client()
+    get_async_mongo_client()
+
+
+def close_mongo_clients():
+    global _client, _async_client
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _async_client is not None:
+        _async_client.close()
+        _async_client = None
+    logger.info("Clientes MongoDB fechados")
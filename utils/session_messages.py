@@ -0,0 +1,118 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+
+# Mensagens do chat ficam fora da sessão, em baldes de tamanho fixo:
+# {session_id, bucket, count, first_at, last_at, messages: [...]}
+SESSION_MESSAGES = "session_messages"
+MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "100"))
+MESSAGE_PREVIEW_LENGTH = 200
+
+# Contadores de mensagens por hora (UTC), usados nas métricas do dashboard:
+# {_id: início da hora, hour: 0-23, weekday: 1-7 (domingo = 1), count}
+MESSAGE_ROLLUPS = "message_rollups"
+
+# Campos desnormalizados na sessão, usados pelas listagens do dashboard
+MESSAGE_COUNT_FIELD = "message_count"
+LAST_MESSAGE_AT_FIELD = "last_message_at"
+LAST_MESSAGE_PREVIEW_FIELD = "last_message_preview"
+
+
+def message_type_and_content(message: Dict[str, Any]) -> Tuple[str, Any]:
+    """Tipo e conteúdo da mensagem, no formato do bot ou role/content"""
+    if "type" in message and "data" in message:
+        return message["type"], (message.get("data") or {}).get("content")
+    if "role" in message:
+        return (
+            "human" if message["role"] == "user" else "ai",
+            message.get("content"),
+        )
+    return message.get("type", ""), message.get("content")
+
+
+def message_preview(message: Dict[str, Any]) -> Dict[str, Any]:
+    message_type, content = message_type_and_content(message)
+    if content is not None and not isinstance(content, str):
+        content = str(content)
+    return {
+        "type": message_type,
+        "content": (content or "")[:MESSAGE_PREVIEW_LENGTH],
+        "timestamp": message.get("timestamp"),
+    }
+
+
+def last_message_fields(message: Dict[str, Any]) -> Dict[str, Any]:
+    """`$set` dos campos desnormalizados a partir da última mensagem"""
+    return {
+        LAST_MESSAGE_AT_FIELD: message.get("timestamp"),
+        LAST_MESSAGE_PREVIEW_FIELD: message_preview(message),
+    }
+
+
+def bucket_of(seq: int, bucket_size: int = MESSAGE_BUCKET_SIZE) -> int:
+    return seq // bucket_size
+
+
+def bucket_operations(
+    session_id: str,
+    messages: List[Dict[str, Any]],
+    first_seq: int,
+    bucket_size: int = MESSAGE_BUCKET_SIZE,
+) -> List[UpdateOne]:
+    """
+    Acrescenta as mensagens aos baldes da sessão a partir da posição
+    `first_seq` (reservada no contador `message_count` da sessão). Cada
+    balde guarda no máximo `bucket_size` mensagens, ordenadas por `seq`
+    mesmo com escritas concorrentes.
+    """
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for offset, message in enumerate(messages):
+        seq = first_seq + offset
+        grouped.setdefault(bucket_of(seq, bucket_size), []).append(
+            {**message, "seq": seq}
+        )
+
+    operations = []
+    for bucket, items in grouped.items():
+        timestamps = [m["timestamp"] for m in items if m.get("timestamp")]
+        update: Dict[str, Any] = {
+            "$push": {"messages": {"$each": items, "$sort": {"seq": 1}}},
+            "$inc": {"count": len(items)},
+        }
+        if timestamps:
+            update["$min"] = {"first_at": min(timestamps)}
+            update["$max"] = {"last_at": max(timestamps)}
+        operations.append(
+            UpdateOne({"session_id": session_id, "bucket": bucket}, update, upsert=True)
+        )
+    return operations
+
+
+def join_buckets(
+    legacy: Optional[List[Dict[str, Any]]], buckets: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Histórico completo: mensagens ainda gravadas na sessão (antes da
+    migração) seguidas das mensagens dos baldes, em ordem de balde
+    """
+    messages = list(legacy or [])
+    for bucket in sorted(buckets, key=lambda b: b["bucket"]):
+        messages.extend(bucket.get("messages", []))
+    return messages
+
+
+def rollup_update(timestamp: datetime, count: int) -> Tuple[Dict, Dict]:
+    """Filtro e `$inc` do contador da hora da mensagem em message_rollups"""
+    hour_start = timestamp.replace(minute=0, second=0, microsecond=0)
+    return (
+        {"_id": hour_start},
+        {
+            "$inc": {"count": count},
+            "$setOnInsert": {
+                "hour": hour_start.hour,
+                # Mesma numeração do $dayOfWeek do Mongo
+                "weekday": hour_start.isoweekday() % 7 + 1,
+            },
+        },
+    )